@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import threading
+
+from ranker import (
+    FRONTEND_DIR,
+    OUTPUT_PATH_ROOT,
+    atomic_write,
+    output_fieldnames,
+    rank_lawyers,
+    write_ranked_outputs,
+)
+from ranking_cache import config_fingerprint, file_fingerprint
+from schema import save_schema
+from stream_ranker import read_fieldnames
+
+# Records which inputs the current ranked CSV artifacts were generated from
+STAMP_PATH = OUTPUT_PATH_ROOT + '.stamp'
+
+
+def artifact_stamp(input_file, config_file=None):
+    """Identity of the inputs an artifact set is generated from."""
+    return {
+        'input': list(file_fingerprint(input_file) or ()),
+        'config': config_fingerprint(config_file),
+    }
+
+
+def read_stamp():
+    try:
+        with open(STAMP_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def artifacts_current(stamp):
+    """True if both ranked CSV copies exist and were generated from `stamp`."""
+    frontend_path = os.path.join(FRONTEND_DIR, 'ranked_lawyer_data.csv')
+    return (
+        read_stamp() == stamp
+        and os.path.exists(OUTPUT_PATH_ROOT)
+        and os.path.exists(frontend_path)
+    )
+
+
+def generate_artifacts(input_file='lawyer_data.csv', config_file=None, ranked=None, stamp=None, force=False):
+    """
+    Write `ranked_lawyer_data.csv` and its frontend/public copy for `input_file`.
+
+    Generation is skipped when the existing artifacts were produced from the same
+    input and config fingerprints (unless `force`). `ranked` may be passed to
+    reuse an already computed ranking; `stamp` must then be the `artifact_stamp`
+    taken before that ranking was computed. Returns True if files were written;
+    the stamp is only recorded when every file was.
+    """
+    if stamp is None:
+        stamp = artifact_stamp(input_file, config_file)
+    if not force and artifacts_current(stamp):
+        return False
+
+    if ranked is None:
+        ranked = rank_lawyers(input_file, config_file, write_output=False)
+    if not ranked:
+        return False
+
+    if not write_ranked_outputs(output_fieldnames(read_fieldnames(input_file), ranked), ranked):
+        # no stamp, so the next call writes them again instead of trusting stale or missing files
+        return False
+    # off the request path, so the inferred schema can be persisted for the next process
+    save_schema(input_file)
+    with atomic_write(STAMP_PATH, 'w', encoding='utf-8') as f:
+        json.dump(stamp, f)
+    return True
+
+
+class ArtifactWriter:
+    """
+    Generates artifacts on a single background thread, off the request path.
+
+    Submissions are coalesced: while a job runs, only the most recent pending
+    submission is kept, so bursts of requests lead to at most one extra write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = None
+        self._thread = None
+
+    def submit(self, input_file, config_file=None, ranked=None, stamp=None):
+        with self._lock:
+            self._pending = (input_file, config_file, ranked, stamp)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='artifact-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                job = self._pending
+                self._pending = None
+                if job is None:
+                    self._thread = None
+                    return
+            try:
+                generate_artifacts(*job)
+            except Exception as e:
+                print(f"Warning: artifact generation failed: {e}")
+
+    def wait(self, timeout=None):
+        """Block until the background thread (if any) has drained its work."""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the ranked CSV artifacts.')
+    parser.add_argument('--input', default='lawyer_data.csv')
+    parser.add_argument('--config', default=None, help='JSON weights file')
+    parser.add_argument('--force', action='store_true', help='write even if inputs are unchanged')
+    args = parser.parse_args()
+
+    if generate_artifacts(args.input, args.config, force=args.force):
+        print(f"Wrote {OUTPUT_PATH_ROOT} and {os.path.join(FRONTEND_DIR, 'ranked_lawyer_data.csv')}")
+    else:
+        print("Ranked artifacts are up to date.")
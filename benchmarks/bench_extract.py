@@ -0,0 +1,59 @@
+"""
+Benchmark the HTML extraction backends in `scraper` over the bundled Justia
+fixtures and check they all return identical records.
+
+    python benchmarks/bench_extract.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from scraper import PARSERS, parse_listing  # noqa: E402
+
+FIXTURES = ['justia.html', 'justia_california.html']
+REFERENCE = 'html.parser'
+
+
+def time_backend(html, parser, repeat):
+    """Best-of-`repeat` seconds for one parse of `html`."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_listing(html, parser)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(repeat=5):
+    results = []
+    for name in FIXTURES:
+        with open(os.path.join(REPO_ROOT, name), 'r', encoding='utf-8') as f:
+            html = f.read()
+        expected = parse_listing(html, REFERENCE)
+        baseline = time_backend(html, REFERENCE, repeat)
+        for parser in PARSERS:
+            seconds = baseline if parser == REFERENCE else time_backend(html, parser, repeat)
+            results.append({
+                'fixture': name,
+                'kb': len(html.encode('utf-8')) // 1024,
+                'parser': parser,
+                'cards': len(expected[0]),
+                'ms': seconds * 1000,
+                'speedup': baseline / seconds,
+                'identical': parse_listing(html, parser) == expected,
+            })
+    return results
+
+
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    cli.add_argument('--repeat', type=int, default=5)
+    args = cli.parse_args()
+
+    print(f"{'fixture':<24}{'KB':>6}{'cards':>7}  {'parser':<12}{'ms/page':>9}{'speedup':>9}  identical")
+    for r in run(args.repeat):
+        print(f"{r['fixture']:<24}{r['kb']:>6}{r['cards']:>7}  {r['parser']:<12}{r['ms']:>9.2f}{r['speedup']:>8.1f}x  {r['identical']}")
@@ -0,0 +1,299 @@
+"""
+Benchmark ingestion, scoring, serving and scraping, and compare against a
+previous run.
+
+    python benchmarks/bench_suite.py [--sizes 1000,10000,100000] [--output results.json]
+                                     [--baseline old.json --threshold 0.2]
+
+Datasets are built with `generate_data.generate_synthetic_data` from a fixed
+seed, so runs on different commits rank identical files. The python engine
+is timed per stage (parse, score, sort, write); every engine is timed end to
+end with its peak traced memory. `/api/ranked` is exercised through
+TestClient at several concurrencies, and the HTML extraction backends over
+the bundled fixtures (see `bench_extract`). Results are one flat
+`{metric: value}` map; with `--baseline`, metrics that got worse by more than
+`--threshold` are reported and the exit status is 1.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from generate_data import generate_synthetic_data  # noqa: E402
+from ranker import (  # noqa: E402
+    load_weights,
+    normalize_fieldnames,
+    normalize_row,
+    output_fieldnames,
+    rank_lawyers,
+    score_rows,
+    scoring_weights,
+    write_ranked_csv,
+)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_CONCURRENCY = (1, 4, 16)
+ENGINES = ('python', 'numpy', 'stream', 'parallel')
+
+# /api/ranked requests measured per scenario
+SCENARIOS = {
+    'full': {},
+    'page': {'limit': 100},
+    'sorted': {'sort_by': 'Years PE', 'order': 'desc', 'limit': 100},
+}
+
+# Metrics whose value should go up; everything else (seconds, MB) should go down
+HIGHER_IS_BETTER = ('_rps',)
+
+
+def dataset(size, seed, data_dir):
+    """Path of a seeded synthetic CSV with `size` rows, generated on first use."""
+    path = os.path.join(data_dir, f'lawyers_{size}_{seed}.csv')
+    if not os.path.exists(path):
+        random.seed(seed)
+        rows = generate_synthetic_data(size)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return path
+
+
+def best_of(fn, repeat):
+    """`(best seconds, result of the last call)` over `repeat` calls."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_mb(fn):
+    """Peak memory traced while running `fn`, in MB."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stages(path, repeat, out_dir):
+    """Time the python engine's parse, score, sort and write stages separately."""
+    def parse():
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            rows = [normalize_row(row) for row in reader]
+            return normalize_fieldnames(reader.fieldnames), rows
+
+    def score():
+        from schema import load_schema, numeric_columns
+        weights, use_autodetect = load_weights(None)
+        numeric = numeric_columns(fieldnames, load_schema(path)) if use_autodetect else []
+        pairs = scoring_weights(weights, use_autodetect, numeric)
+        for row, value in zip(lawyers, score_rows(lawyers, pairs)):
+            row['score'] = value
+
+    def sort():
+        return sorted(lawyers, key=lambda x: x.get('score', 0), reverse=True)
+
+    def write():
+        write_ranked_csv(os.path.join(out_dir, 'ranked.csv'), output_fieldnames(fieldnames, ranked), ranked)
+
+    metrics = {}
+    metrics['parse_s'], (fieldnames, lawyers) = best_of(parse, repeat)
+    metrics['score_s'], _ = best_of(score, repeat)
+    metrics['sort_s'], ranked = best_of(sort, repeat)
+    metrics['write_s'], _ = best_of(write, repeat)
+    return metrics
+
+
+def bench_engines(path, repeat):
+    metrics = {}
+    for engine in ENGINES:
+        if engine == 'numpy':
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                continue
+
+        def rank():
+            return rank_lawyers(path, engine=engine, write_output=False)
+
+        metrics[f'{engine}/total_s'], _ = best_of(rank, repeat)
+        metrics[f'{engine}/peak_mb'] = peak_mb(rank)
+    return metrics
+
+
+def bench_serving(path, concurrencies, requests_per_client):
+    """
+    Latency and throughput of `/api/ranked` under concurrent TestClient callers.
+
+    `serve/...` batches start cold and rank inside the requests (precompute
+    off). `serve-warm/...` batches are served from the background-precomputed
+    ranking, so they measure only querying and serialization.
+    """
+    import query
+    import server
+    from fastapi.testclient import TestClient
+
+    metrics = {}
+    cwd = os.getcwd()
+    precompute = server.PRECOMPUTE
+    work_dir = tempfile.mkdtemp(prefix='bench-serve-')
+    shutil.copyfile(path, os.path.join(work_dir, 'lawyer_data.csv'))
+    os.chdir(work_dir)
+    # no background ranking from the app's startup while the cold batches run
+    server.PRECOMPUTE = False
+    try:
+        with TestClient(server.app) as client:
+            for prefix, warm in (('serve', False), ('serve-warm', True)):
+                server.PRECOMPUTE = warm
+                for scenario, params in SCENARIOS.items():
+                    for concurrency in concurrencies:
+                        # every batch starts without cached responses; cold ones also without an index,
+                        # so the first requests rank and the rest coalesce or hit the cache
+                        server.ranking_cache.clear()
+                        query._indexes.clear()
+                        if warm:
+                            server.precomputer.load(os.path.join(os.getcwd(), 'lawyer_data.csv'))
+                        latencies = []
+
+                        def call(_):
+                            start = time.perf_counter()
+                            resp = client.get('/api/ranked', params=params)
+                            resp.raise_for_status()
+                            latencies.append(time.perf_counter() - start)
+
+                        start = time.perf_counter()
+                        with ThreadPoolExecutor(concurrency) as pool:
+                            list(pool.map(call, range(concurrency * requests_per_client)))
+                        elapsed = time.perf_counter() - start
+                        name = f'{prefix}/{scenario}/c{concurrency}'
+                        latencies.sort()
+                        metrics[f'{name}/p50_s'] = statistics.median(latencies)
+                        metrics[f'{name}/p95_s'] = latencies[int(0.95 * (len(latencies) - 1))]
+                        metrics[f'{name}/throughput_rps'] = len(latencies) / elapsed
+    finally:
+        server.PRECOMPUTE = precompute
+        os.chdir(cwd)
+        server.ranking_executor.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return metrics
+
+
+def bench_scraping(repeat):
+    from bench_extract import run as run_extract
+    return {f"scrape/{r['fixture']}/{r['parser']}_s": r['ms'] / 1000 for r in run_extract(repeat)}
+
+
+def run(sizes=DEFAULT_SIZES, seed=0, repeat=3, concurrencies=DEFAULT_CONCURRENCY, serve_rows=10000,
+        requests_per_client=5, data_dir=None):
+    """Run every benchmark and return `{'meta': ..., 'metrics': {name: value}}`."""
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), 'lawyer-bench')
+    os.makedirs(data_dir, exist_ok=True)
+    out_dir = tempfile.mkdtemp(prefix='bench-out-')
+    metrics = {}
+    try:
+        for size in sizes:
+            path = dataset(size, seed, data_dir)
+            for name, value in bench_stages(path, repeat, out_dir).items():
+                metrics[f'rank/{size}/{name}'] = value
+            for name, value in bench_engines(path, repeat).items():
+                metrics[f'rank/{size}/{name}'] = value
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    if concurrencies:
+        metrics.update(bench_serving(dataset(serve_rows, seed, data_dir), concurrencies, requests_per_client))
+    metrics.update(bench_scraping(repeat))
+    return {'meta': meta(sizes, seed, repeat, serve_rows), 'metrics': metrics}
+
+
+def meta(sizes, seed, repeat, serve_rows):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sizes': list(sizes),
+        'seed': seed,
+        'repeat': repeat,
+        'serve_rows': serve_rows,
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Metrics present in both result sets that regressed by more than
+    `threshold` (0.2 = 20% slower, larger or less throughput), as
+    `(name, old, new, change)` tuples sorted by name.
+    """
+    regressions = []
+    old_metrics, new_metrics = baseline['metrics'], current['metrics']
+    for name in sorted(set(old_metrics) & set(new_metrics)):
+        old, new = old_metrics[name], new_metrics[name]
+        if not old or not new:
+            continue
+        change = new / old - 1
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        if worse > threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def _ints(text):
+    return tuple(int(x) for x in text.split(',') if x.strip())
+
+
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    cli.add_argument('--sizes', type=_ints, default=DEFAULT_SIZES, help='rows per dataset, e.g. 1000,1000000')
+    cli.add_argument('--seed', type=int, default=0)
+    cli.add_argument('--repeat', type=int, default=3, help='timings are the best of this many runs')
+    cli.add_argument('--concurrency', type=_ints, default=DEFAULT_CONCURRENCY,
+                     help='concurrent /api/ranked callers; empty to skip serving')
+    cli.add_argument('--serve-rows', type=int, default=10000)
+    cli.add_argument('--requests', type=int, default=5, help='requests per concurrent caller')
+    cli.add_argument('--data-dir', default=None, help='where generated datasets are kept between runs')
+    cli.add_argument('--output', default=None, help='write the results as JSON')
+    cli.add_argument('--baseline', default=None, help='results JSON of an earlier run to compare with')
+    cli.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression')
+    args = cli.parse_args()
+
+    results = run(args.sizes, args.seed, args.repeat, args.concurrency, args.serve_rows, args.requests,
+                  args.data_dir)
+    for name, value in results['metrics'].items():
+        print(f"{name:<48}{value:>14.4f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.4f} -> {new:.4f} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions above {args.threshold:.0%}.")
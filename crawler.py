@@ -0,0 +1,236 @@
+import argparse
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dedup import dedup_rows
+from http_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_AGE, DEFAULT_MAX_BYTES, PageCache
+from scraper import DEFAULT_TIMEOUT, FIELDNAMES, HEADERS, PARSERS, parse_listing, save_lawyers_csv, save_lawyers_db
+
+# Status codes worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to the same host by at least `min_interval` seconds,
+    across all worker threads. Different hosts do not wait on each other.
+    """
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def make_session(pool_size=10):
+    """A `requests.Session` whose connection pool can serve `pool_size` threads per host."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch(session, url, limiter=None, timeout=DEFAULT_TIMEOUT, retries=3, backoff=0.5):
+    """
+    GET `url` and return the response body.
+
+    Connection errors, timeouts and RETRY_STATUSES responses are retried up to
+    `retries` times with exponential backoff (plus jitter), honouring a numeric
+    `Retry-After` header. Other HTTP errors are raised immediately.
+    """
+    return fetch_response(session, url, limiter, timeout, retries, backoff).text
+
+
+def fetch_response(session, url, limiter=None, timeout=DEFAULT_TIMEOUT, retries=3, backoff=0.5, headers=None):
+    """`fetch`, sending extra `headers` and returning the response itself (a 304 is not an error)."""
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.wait(url)
+        try:
+            response = session.get(url, timeout=timeout, headers=headers)
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response
+            error = requests.exceptions.HTTPError(f"{response.status_code} for url: {url}", response=response)
+            retry_after = response.headers.get('Retry-After')
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+            retry_after = None
+
+        if attempt >= retries:
+            raise error
+        delay = backoff * (2 ** attempt) * (1 + random.random() * 0.1)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        time.sleep(delay)
+        attempt += 1
+
+
+class CrawledPage(namedtuple('CrawledPage', 'listing page url records last fetch_seconds parse_seconds')):
+    """
+    One listing page handled by `iter_crawl`: its position (`listing` index
+    into the start URLs, `page` within that listing), its records, whether it
+    is the `last` page of its listing, and the time spent fetching and parsing
+    it. A page that failed, or a repeated start URL, has no records.
+    """
+
+
+def iter_crawl(start_urls, max_pages=None, max_workers=8, min_interval=1.0, timeout=DEFAULT_TIMEOUT,
+               retries=3, backoff=0.5, session=None, parser=None, cache=None):
+    """
+    Crawl like `crawl`, yielding a `CrawledPage` as soon as each page is
+    parsed, in completion order. Every listing yields exactly one page with
+    `last` set, so consumers can restore start-URL and page order. A page's
+    successor is scheduled before the page is yielded, so fetching goes on
+    while the consumer handles it.
+    """
+    session = session or make_session(max_workers)
+    limiter = HostRateLimiter(min_interval)
+    seen = set()
+
+    def work(url):
+        start = time.perf_counter()
+        if cache is not None:
+            fetched = []
+
+            def get(headers):
+                began = time.perf_counter()
+                try:
+                    return fetch_response(session, url, limiter, timeout, retries, backoff, headers)
+                finally:
+                    fetched.append(time.perf_counter() - began)
+
+            records, next_href = cache.listing(url, get, parser)
+            fetch_seconds = sum(fetched)
+        else:
+            html = fetch(session, url, limiter, timeout, retries, backoff)
+            fetch_seconds = time.perf_counter() - start
+            records, next_href = parse_listing(html, parser)
+        return records, next_href, fetch_seconds, time.perf_counter() - start - fetch_seconds
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        for listing, url in enumerate(start_urls):
+            if url in seen:
+                yield CrawledPage(listing, 0, url, [], True, 0.0, 0.0)
+                continue
+            seen.add(url)
+            pending[pool.submit(work, url)] = (listing, 0, url)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                listing, page, url = pending.pop(future)
+                try:
+                    records, next_href, fetch_seconds, parse_seconds = future.result()
+                except Exception as e:
+                    print(f"Error fetching {url}: {e}")
+                    yield CrawledPage(listing, page, url, [], True, 0.0, 0.0)
+                    continue
+
+                last = True
+                if next_href and (max_pages is None or page + 1 < max_pages):
+                    next_url = urljoin(url, next_href)
+                    if next_url not in seen:
+                        seen.add(next_url)
+                        pending[pool.submit(work, next_url)] = (listing, page + 1, next_url)
+                        last = False
+                yield CrawledPage(listing, page, url, records, last, fetch_seconds, parse_seconds)
+
+    if cache is not None:
+        cache.prune()
+
+
+def crawl(start_urls, max_pages=None, max_workers=8, min_interval=1.0, timeout=DEFAULT_TIMEOUT,
+          retries=3, backoff=0.5, session=None, parser=None, cache=None):
+    """
+    Crawl Justia directory listings starting from each of `start_urls`,
+    following "Next" pagination links (up to `max_pages` pages per start URL).
+
+    Pages are fetched by a pool of `max_workers` threads sharing one pooled
+    session, with per-host rate limiting. The next page of a listing is
+    scheduled as soon as the previous one is parsed, so different listings are
+    crawled concurrently. Pages that still fail after retries are reported and
+    skipped. `parser` selects the HTML backend (see `scraper.parse_listing`).
+    With a `http_cache.PageCache`, pages are revalidated with conditional
+    GETs and unchanged pages reuse their previously extracted records; the
+    cache is pruned to its limits at the end. Returns the records in
+    start-URL order, then page order.
+    """
+    results = {}
+    for page in iter_crawl(start_urls, max_pages, max_workers, min_interval, timeout, retries, backoff, session,
+                           parser, cache):
+        results[(page.listing, page.page)] = page.records
+    return [record for key in sorted(results) for record in results[key]]
+
+
+def add_cache_arguments(cli):
+    """Page cache options shared by the crawler and `main` command lines."""
+    cli.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='where fetched pages are cached')
+    cli.add_argument('--no-cache', action='store_true', help='always download and parse every page')
+    cli.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / 2 ** 20)
+    cli.add_argument('--cache-max-age', type=float, default=DEFAULT_MAX_AGE,
+                     help='seconds before a cached page is fetched unconditionally again')
+
+
+def cache_from_args(args):
+    if args.no_cache:
+        return None
+    return PageCache(args.cache_dir, int(args.cache_max_mb * 2 ** 20), args.cache_max_age)
+
+
+def state_url(state, practice_area=None):
+    """Directory URL for a state (and optionally a practice area), e.g. 'new-york'."""
+    url = f"https://www.justia.com/lawyers/{state}"
+    if practice_area:
+        url = f"https://www.justia.com/lawyers/{practice_area}/{state}"
+    return url
+
+
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser(description='Crawl Justia lawyer directories.')
+    cli.add_argument('urls', nargs='*', help='directory URLs to start from')
+    cli.add_argument('--states', nargs='*', default=[], help='state slugs, e.g. maryland california')
+    cli.add_argument('--practice-area', default=None, help='practice area slug, e.g. criminal-law')
+    cli.add_argument('--max-pages', type=int, default=None)
+    cli.add_argument('--workers', type=int, default=8)
+    cli.add_argument('--min-interval', type=float, default=1.0, help='seconds between requests to a host')
+    cli.add_argument('--html-parser', default=None, choices=sorted(PARSERS), help='HTML extraction backend')
+    cli.add_argument('--output', default='lawyers.csv')
+    cli.add_argument('--db', default=None, help='also upsert the records into this SQLite database')
+    cli.add_argument('--dedup', action='store_true', help='merge lawyers listed more than once')
+    add_cache_arguments(cli)
+    args = cli.parse_args()
+
+    urls = args.urls + [state_url(s, args.practice_area) for s in args.states]
+    lawyers = crawl(urls, max_pages=args.max_pages, max_workers=args.workers, min_interval=args.min_interval,
+                    parser=args.html_parser, cache=cache_from_args(args))
+    if args.dedup:
+        crawled = len(lawyers)
+        lawyers, _ = dedup_rows(lawyers, FIELDNAMES)
+        print(f"Merged {crawled} records into {len(lawyers)} lawyers")
+    save_lawyers_csv(lawyers, args.output)
+    print(f"Crawled {len(lawyers)} lawyers from {len(urls)} listings to {args.output}")
+    if args.db:
+        save_lawyers_db(lawyers, args.db)
+        print(f"Upserted them into {args.db}")
@@ -0,0 +1,326 @@
+"""
+Merge duplicate lawyer records, e.g. the same attorney scraped from several
+state listings, or found both in `lawyers.csv` and `lawyer_data.csv`.
+
+Names and firms are normalized (case, accents, punctuation, "Last, First"
+order, honorifics and suffixes like "Esq." or "LLP"). Records with the same
+normalized name, firm and practice areas are grouped exactly; the remaining
+candidates are compared with a sorted-neighborhood pass: distinct keys are
+sorted by (last name, first initial, ...) and each is compared only with the
+WINDOW keys before it in the same block. Work stays near-linear instead of
+comparing every pair.
+
+Two keys match when their last names agree, their first names are equal or
+one is the other's initial, their middle initials do not conflict, their
+firms do not conflict (a blank firm matches any) and, when both list
+practice areas, they share at least one. What a group's members say
+together (fullest name, firm, practice areas) must pass the same test before
+another key joins it, so a chain of matches through a record with blank
+fields cannot join two different firms or practices.
+
+    python dedup.py lawyers.csv lawyer_data.csv -o combined.csv
+"""
+import argparse
+import csv
+import gc
+import re
+import unicodedata
+from contextlib import contextmanager
+from itertools import chain
+from operator import itemgetter
+
+from ranker import atomic_write, convert_column, normalize_fieldnames
+from stream_ranker import iter_rows
+
+# Keys compared with each other in the sorted-neighborhood pass
+WINDOW = 10
+
+# Name tokens that do not identify a person
+NAME_AFFIXES = frozenset({
+    'mr', 'mrs', 'ms', 'miss', 'dr', 'prof', 'hon', 'judge', 'atty', 'attorney',
+    'esq', 'esquire', 'jr', 'sr', 'ii', 'iii', 'iv', 'jd', 'llm', 'phd', 'cpa',
+})
+
+# Firm tokens that do not identify a firm
+FIRM_AFFIXES = frozenset({
+    'the', 'llp', 'llc', 'lllp', 'pllc', 'pc', 'pa', 'plc', 'ltd', 'inc', 'co', 'corp', 'chtd', 'law', 'firm',
+    'office', 'offices', 'of', 'group', 'attorneys', 'lawyers', 'associates',
+})
+
+# Multi-valued text columns (lower case) and the separator their values are listed with;
+# merged records keep every distinct item, in order of first appearance
+LIST_COLUMNS = {'location': '; ', 'practice_areas': ', '}
+
+_NON_WORD = re.compile(r'[^\w\s]+')
+
+
+def _tokens(text):
+    if not text.isascii():
+        # strip accents: 'José' and 'Jose' are the same name
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    # periods only abbreviate: 'J.D.' is 'jd' and 'P.C.' is 'pc'
+    return _NON_WORD.sub(' ', text.replace('.', '').replace('&', ' and ').casefold()).split()
+
+
+def normalize_name(name):
+    """
+    Name tokens in first-to-last order without honorifics and suffixes:
+    'Smith, John A. Jr.' and 'John A Smith' both give ('john', 'a', 'smith').
+    """
+    if not name:
+        return ()
+    if ',' not in name:
+        return tuple(t for t in _tokens(name) if t not in NAME_AFFIXES)
+    parts = [_tokens(part) for part in name.split(',')]
+    parts = [tokens for tokens in parts if any(t not in NAME_AFFIXES for t in tokens)]
+    if len(parts) > 1:
+        # 'Last, First Middle'
+        parts = parts[1:] + parts[:1]
+    return tuple(t for tokens in parts for t in tokens if t not in NAME_AFFIXES)
+
+
+def normalize_firm(firm):
+    """Firm name without case, punctuation and legal-form words: 'The Smith Law Firm, LLP' gives 'smith'."""
+    if not firm:
+        return ''
+    tokens = _tokens(firm)
+    return ' '.join(t for t in tokens if t not in FIRM_AFFIXES) or ' '.join(tokens)
+
+
+def _areas(value):
+    if not value:
+        return frozenset()
+    return frozenset(a for a in (' '.join(_tokens(item)) for item in value.split(',')) if a)
+
+
+def _ranked(rows, column, fn, sort_key=None):
+    """
+    Normalize a column once per distinct cell: returns the distinct
+    normalized values in `sort_key` order and, per row, the position of its
+    value in that list.
+    """
+    cells = [row.get(column) for row in rows] if column is not None else [None] * len(rows)
+    normalized = {cell: fn(cell) for cell in set(cells)}
+    values = sorted(set(normalized.values()), key=sort_key)
+    rank = {value: r for r, value in enumerate(values)}
+    lookup = {cell: rank[value] for cell, value in normalized.items()}
+    return values, list(map(lookup.__getitem__, cells))
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Suspend cyclic garbage collection: the passes below allocate millions of
+    small lists and tuples while every row dict is alive, and each collection
+    would rescan them all. Nothing allocated here forms reference cycles.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _column(fieldnames, name):
+    return next((f for f in fieldnames if f.lower() == name), None)
+
+
+def _name_order(name):
+    # sorting by last name, then first name keeps each block (last name, first initial) contiguous
+    return (name[-1], name[0], name) if name else ()
+
+
+def _compatible(a, b):
+    (name_a, firm_a, areas_a), (name_b, firm_b, areas_b) = a, b
+    first_a, first_b = name_a[0], name_b[0]
+    if first_a != first_b and len(first_a) > 1 and len(first_b) > 1:
+        return False
+    middle_a, middle_b = ''.join(t[0] for t in name_a[1:-1]), ''.join(t[0] for t in name_b[1:-1])
+    if middle_a and middle_b and middle_a != middle_b:
+        return False
+    if firm_a and firm_b and firm_a != firm_b:
+        return False
+    return not (areas_a and areas_b and not areas_a & areas_b)
+
+
+def _agreement(a, b):
+    """How much two compatible keys have in common beyond their name block; a shared firm counts double."""
+    (name_a, firm_a, areas_a), (name_b, firm_b, areas_b) = a, b
+    return (2 * (firm_a != '' and firm_a == firm_b) + bool(areas_a & areas_b)
+            + (name_a[0] == name_b[0]) + (name_a[1:-1] == name_b[1:-1] != ()))
+
+
+def _combine(a, b):
+    """What two matched keys say together: the fuller first and middle names, the firm, all practice areas."""
+    (name_a, firm_a, areas_a), (name_b, firm_b, areas_b) = a, b
+    first = name_a[0] if len(name_a[0]) > 1 else name_b[0]
+    middle = name_a[1:-1] or name_b[1:-1]
+    return (first,) + middle + name_a[-1:], firm_a or firm_b, areas_a | areas_b
+
+
+def find_duplicates(rows, fieldnames, window=WINDOW):
+    """
+    Group the indices of `rows` that describe the same lawyer. Returns one
+    ascending list of indices per lawyer, ordered by first index; every row
+    appears in exactly one list. Rows without a name are never grouped.
+    """
+    with _gc_paused():
+        return _find_duplicates(rows, fieldnames, window)
+
+
+def _find_duplicates(rows, fieldnames, window):
+    name_col = _column(fieldnames, 'name')
+    if name_col is None:
+        return [[i] for i in range(len(rows))]
+    firm_col = _column(fieldnames, 'firm')
+    areas_col = _column(fieldnames, 'practice_areas')
+
+    names, name_ranks = _ranked(rows, name_col, normalize_name, _name_order)
+    firms, firm_ranks = _ranked(rows, firm_col, normalize_firm)
+    areas, area_ranks = _ranked(rows, areas_col, _areas, sorted)
+
+    # exact stage: rows with identical normalized keys, found by one stable sort of integer codes;
+    # the sort also lays the keys out in sorted-neighborhood order
+    named = [i for i, r in enumerate(name_ranks) if names[r]]
+    code = [(n * len(firms) + f) * len(areas) + a for n, f, a in zip(name_ranks, firm_ranks, area_ranks)]
+    named.sort(key=code.__getitem__)
+    codes = [code[i] for i in named]
+    cuts = [0] + [k for k in range(1, len(codes)) if codes[k] != codes[k - 1]] + [len(codes)]
+    groups = [named[a:b] for a, b in zip(cuts, cuts[1:]) if b > a]
+    keys = [(names[name_ranks[g[0]]], firms[firm_ranks[g[0]]], areas[area_ranks[g[0]]]) for g in groups]
+
+    # sorted-neighborhood stage over the distinct keys
+    parent = list(range(len(keys)))
+    # per group root, the combined key of its members; merges must be compatible with it too,
+    # so 'A (tax)' ~ 'A' ~ 'A (family law)' cannot chain two different lawyers together
+    profile = list(keys)
+
+    def find(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    # candidate pairs within the window, united strongest agreement first, so a key with blank
+    # fields joins the cluster it agrees with most rather than whichever neighbour came first
+    pairs = []
+    for k in range(1, len(keys)):
+        name = keys[k][0]
+        for j in range(k - 1, max(k - window, 0) - 1, -1):
+            other = keys[j][0]
+            if other[-1] != name[-1] or other[0][0] != name[0][0]:
+                break  # left the block
+            if _compatible(keys[j], keys[k]):
+                pairs.append((-_agreement(keys[j], keys[k]), j, k))
+    pairs.sort()
+
+    for _, j, k in pairs:
+        a, b = find(j), find(k)
+        if a == b or not _compatible(profile[a], profile[b]):
+            continue
+        a, b = min(a, b), max(a, b)
+        parent[b] = a
+        profile[a] = _combine(profile[a], profile[b])
+
+    clusters = {}
+    for k, indices in enumerate(groups):
+        clusters.setdefault(find(k), []).append(indices)
+    result = [parts[0] if len(parts) == 1 else sorted(chain.from_iterable(parts)) for parts in clusters.values()]
+    result += [[i] for i, r in enumerate(name_ranks) if not names[r]]
+    result.sort(key=itemgetter(0))
+    return result
+
+
+def merge_rows(rows, fieldnames):
+    """
+    One record from several records of the same lawyer, listed in input
+    order. Per column: the most complete name; every distinct item of
+    LIST_COLUMNS (ignoring case); the largest number of numeric columns (the
+    ranker scores larger values higher), kept as written; otherwise the first
+    non-blank cell. Ties go to the earliest record.
+    """
+    merged = {}
+    for field in fieldnames:
+        cells = [row.get(field) for row in rows]
+        present = [c for c in cells if c is not None and c != '']
+        if not present:
+            merged[field] = cells[0]
+            continue
+        lower = field.lower()
+        if lower == 'name':
+            merged[field] = max(present, key=lambda cell: len(normalize_name(cell)))
+        elif lower in LIST_COLUMNS:
+            separator = LIST_COLUMNS[lower]
+            items = {}
+            for cell in present:
+                for item in str(cell).split(separator.strip()):
+                    item = item.strip()
+                    if item:
+                        items.setdefault(item.casefold(), item)
+            merged[field] = separator.join(items.values())
+        else:
+            parsed = convert_column(present)
+            # NaN never wins
+            numbers = [x for x in parsed.values() if x is not None and x == x]
+            if numbers:
+                best = max(numbers)
+                merged[field] = next(c for c in present if parsed[c] == best)
+            else:
+                merged[field] = present[0]
+    return merged
+
+
+def dedup_rows(rows, fieldnames, window=WINDOW):
+    """
+    `rows` with each group of duplicates (see `find_duplicates`) replaced by
+    its merged record (see `merge_rows`) at the place of its first row.
+    Returns `(rows, groups)`.
+    """
+    groups = find_duplicates(rows, fieldnames, window)
+    with _gc_paused():
+        deduped = [rows[g[0]] if len(g) == 1 else merge_rows([rows[i] for i in g], fieldnames) for g in groups]
+    return deduped, groups
+
+
+def read_records(paths):
+    """
+    Rows of several lawyer CSVs as one table. Headers are normalized, and
+    columns whose names differ only in case ('name' and 'Name') are one
+    column, spelled as first seen. Returns `(fieldnames, rows)`.
+    """
+    spelling = {}
+    rows = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            header = normalize_fieldnames(next(csv.reader(f), []))
+        rename = {name: spelling.setdefault(name.lower(), name) for name in header}
+        for row in iter_rows(path):
+            rows.append({rename[k]: v for k, v in row.items()})
+    return list(spelling.values()), rows
+
+
+def dedup_files(paths, output_path, window=WINDOW):
+    """Combine lawyer CSVs, merge duplicates and write the result; returns `(records read, records written)`."""
+    fieldnames, rows = read_records(paths)
+    deduped, _ = dedup_rows(rows, fieldnames, window)
+    with atomic_write(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(deduped)
+    return len(rows), len(deduped)
+
+
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser(description='Combine lawyer CSVs and merge duplicate lawyers.')
+    cli.add_argument('inputs', nargs='+')
+    cli.add_argument('-o', '--output', default=None, help='default: overwrite the single input')
+    cli.add_argument('--window', type=int, default=WINDOW, help='keys compared in the sorted-neighborhood pass')
+    args = cli.parse_args()
+    if args.output is None and len(args.inputs) > 1:
+        cli.error('-o is required with several inputs')
+
+    output = args.output or args.inputs[0]
+    read, written = dedup_files(args.inputs, output, args.window)
+    print(f"Merged {read} records into {written} lawyers in {output}")
@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import json
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+from metrics import inc, stage
+from ranker import atomic_write
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; streams fall back to the stdlib encoder
+    orjson = None
+
+# Compression settings for variants produced once and served many times; higher
+# levels gain little on CSV/JSON but slow down generation of large rankings a lot
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Bodies smaller than this are only served uncompressed
+MIN_COMPRESS_SIZE = 512
+
+# File suffix of the precompressed copy for each content coding
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Rows encoded into each chunk of a streamed response
+STREAM_BATCH_ROWS = 500
+
+_row_encoder = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+
+
+def available_encodings():
+    """Content codings this process can produce, most preferred first."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        # mtime=0 keeps the output (and so its ETag) identical for identical input
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported encoding {encoding!r}")
+
+
+def encode_variants(body):
+    """
+    Return `{encoding: bytes}` for a response body: 'identity' plus every
+    available compressed coding that actually makes it smaller.
+    """
+    variants = {'identity': body}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        with stage('compress'):
+            for encoding in available_encodings():
+                compressed = compress(body, encoding)
+                if len(compressed) < len(body):
+                    variants[encoding] = compressed
+    return variants
+
+
+def variants_size(variants):
+    return sum(len(v) for v in variants.values())
+
+
+def make_etag(*parts):
+    """A strong ETag derived from `parts` (fingerprints, query parameters...)."""
+    return '"' + hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def variant_etag(etag, encoding):
+    """Each content coding is a distinct representation, so it gets its own strong ETag."""
+    return etag if encoding == 'identity' else etag[:-1] + '-' + SUFFIXES[encoding][1:] + '"'
+
+
+def choose_encoding(accept_encoding, offered):
+    """
+    Pick the best of `offered` codings for an Accept-Encoding header, in
+    available_encodings() order, honoring q-values (q=0 refuses a coding).
+    Returns 'identity' when nothing compressed is acceptable.
+    """
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = 'identity', 0.0
+    for encoding in available_encodings():
+        if encoding not in offered:
+            continue
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def not_modified(headers, etag, last_modified=None):
+    """
+    True if a conditional request can be answered with 304: If-None-Match
+    matches `etag` (or is '*'), or, without If-None-Match, If-Modified-Since is
+    not older than `last_modified` (a POSIX timestamp).
+    """
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # If-None-Match uses weak comparison
+        return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def write_compressed_variants(path):
+    """
+    Write the precompressed copies of a file next to it (`<path>.gz`, and
+    `<path>.br` when brotli is installed) and remove copies in codings that
+    are no longer produced. Returns the paths written.
+    """
+    with open(path, 'rb') as f:
+        body = f.read()
+    written = []
+    for encoding, suffix in SUFFIXES.items():
+        variant_path = path + suffix
+        if encoding in available_encodings():
+            with stage('compress'):
+                with atomic_write(variant_path, 'wb') as f:
+                    f.write(compress(body, encoding))
+            inc('lawyer_bytes_written_total', os.path.getsize(variant_path), kind=encoding)
+            written.append(variant_path)
+        elif os.path.exists(variant_path):
+            os.remove(variant_path)
+    return written
+
+
+def precompressed_path(path, encoding):
+    """The precompressed copy of `path` in `encoding`, if present and not older than the file."""
+    if encoding == 'identity':
+        return path
+    variant_path = path + SUFFIXES[encoding]
+    try:
+        if os.stat(variant_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+            return variant_path
+    except OSError:
+        pass
+    return None
+
+
+def encode_row(row):
+    """One row as compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(row)
+    return _row_encoder.encode(row).encode('utf-8')
+
+
+def _project(rows, fields):
+    if not fields:
+        return rows
+    return ({f: row.get(f) for f in fields} for row in rows)
+
+
+def iter_ndjson(rows, fields=None, batch_rows=STREAM_BATCH_ROWS):
+    """Encode rows as newline-delimited JSON, yielding a chunk every `batch_rows` rows."""
+    batch = []
+    for row in _project(rows, fields):
+        batch.append(encode_row(row))
+        if len(batch) >= batch_rows:
+            yield b'\n'.join(batch) + b'\n'
+            batch = []
+    if batch:
+        yield b'\n'.join(batch) + b'\n'
+
+
+def iter_json_array(rows, fields=None, batch_rows=STREAM_BATCH_ROWS):
+    """Encode rows as one JSON array, yielding it in chunks of `batch_rows` rows."""
+    yield b'['
+    separator = b''
+    batch = []
+    for row in _project(rows, fields):
+        batch.append(encode_row(row))
+        if len(batch) >= batch_rows:
+            yield separator + b','.join(batch)
+            separator, batch = b',', []
+    if batch:
+        yield separator + b','.join(batch)
+    yield b']'
@@ -1,83 +1,64 @@
-import React, { useEffect, useState, useMemo } from 'react'
-import Papa from 'papaparse'
+import React, { useEffect, useState } from 'react'
 
-function parseNumber(v) {
-  const n = Number(String(v).replace(/[^0-9.-]+/g, ''))
-  return Number.isFinite(n) ? n : 0
-}
+// Rows fetched and rendered per page; sorting and filtering happen on the server
+const PAGE_SIZE = 100
+
+// Milliseconds the Firm filter waits after the last keystroke before querying
+const FILTER_DELAY = 300
 
 export default function App() {
-  const [data, setData] = useState([])
+  const [page, setPage] = useState({ total: 0, items: [] })
+  const [columns, setColumns] = useState([])
   const [loading, setLoading] = useState(true)
   const [sortBy, setSortBy] = useState('')
   const [desc, setDesc] = useState(true)
+  const [firmInput, setFirmInput] = useState('')
+  const [firm, setFirm] = useState('')
+  const [offset, setOffset] = useState(0)
+
+  useEffect(() => {
+    // query once typing pauses, not on every keystroke
+    const timer = setTimeout(() => {
+      setFirm(firmInput)
+      setOffset(0)
+    }, FILTER_DELAY)
+    return () => clearTimeout(timer)
+  }, [firmInput])
 
   useEffect(() => {
-    // Fetch the generated CSV file which includes a 'score' column
-    // Add a timestamp query to avoid cached responses from Vite/browser
-    fetch('/ranked_lawyer_data.csv?t=' + Date.now())
+    // The server answers from prebuilt sort indexes and only returns the visible slice
+    const params = new URLSearchParams({ offset: String(offset), limit: String(PAGE_SIZE) })
+    // "(rank)" descending is the ranking itself; reversed, it is the ranking sorted by score ascending
+    if (sortBy || !desc) {
+      params.set('sort_by', sortBy || 'score')
+      params.set('order', desc ? 'desc' : 'asc')
+    }
+    if (firm) params.append('filter', `Firm=${firm}`)
+
+    // a newer query aborts this one, so a late response can never replace newer results
+    const controller = new AbortController()
+    setLoading(true)
+    fetch('/api/ranked?' + params.toString(), { signal: controller.signal })
       .then(r => {
-        if (!r.ok) throw new Error('CSV not found')
-        return r.text()
+        if (!r.ok) throw new Error('ranking request failed: ' + r.status)
+        return r.json()
       })
-      .then(text => {
-        const parsed = Papa.parse(text, { header: true, skipEmptyLines: true })
-        if (parsed.errors && parsed.errors.length) {
-          console.warn('CSV parse warnings/errors', parsed.errors)
+      .then(result => {
+        setPage(result)
+        // every row has the same keys, so the first row defines the columns
+        if (result.items.length) {
+          const keys = Object.keys(result.items[0])
+          setColumns(keys.includes('score') ? keys : [...keys, 'score'])
         }
-
-        // Normalize keys (trim whitespace) to ensure columns like 'score' are recognized
-        const rows = parsed.data.map(row => {
-          const norm = {}
-          Object.entries(row).forEach(([k, v]) => {
-            const key = String(k).trim()
-            norm[key] = v
-          })
-          return norm
-        })
-
-        setData(rows)
       })
       .catch(err => {
-        console.error('CSV fetch/parse failed:', err)
-        // fallback: try the API endpoint
-        fetch('/api/ranked')
-          .then(r => r.json())
-          .then(setData)
-          .catch(console.error)
+        if (err.name !== 'AbortError') console.error('ranking fetch failed:', err)
       })
-      .finally(() => setLoading(false))
-  }, [])
-
-  const sorted = useMemo(() => {
-    if (!sortBy) return data
-    const arr = [...data]
-    arr.sort((a, b) => {
-      const av = parseNumber(a[sortBy])
-      const bv = parseNumber(b[sortBy])
-      return desc ? bv - av : av - bv
-    })
-    return arr
-  }, [data, sortBy, desc])
-
-  if (loading) return <div className="center">Loading ranked data…</div>
-  if (!data.length) return <div className="center">No data found.</div>
-
-  // Build columns as the union of keys across all rows so we don't rely on the first row
-  const columns = (() => {
-    const set = new Set()
-    data.forEach(row => {
-      Object.keys(row).forEach(k => {
-        if (k === null || k === undefined) return
-        const key = String(k).trim()
-        if (key === '') return
-        set.add(key)
+      .finally(() => {
+        if (!controller.signal.aborted) setLoading(false)
       })
-    })
-    // Ensure 'score' column is present
-    if (!set.has('score')) set.add('score')
-    return Array.from(set)
-  })()
+    return () => controller.abort()
+  }, [sortBy, desc, firm, offset])
 
   function formatValue(v, col) {
     if (v === null || v === undefined) return ''
@@ -89,17 +70,26 @@ export default function App() {
     return v
   }
 
+  if (loading && !columns.length) return <div className="center">Loading ranked data…</div>
+  if (!loading && !page.total && !firm) return <div className="center">No data found.</div>
+
+  const lastRow = Math.min(offset + PAGE_SIZE, page.total)
+
   return (
     <div className="container">
       <h1>Lawyer Ranking (API)</h1>
-      <p>Rows: {data.length}</p>
+      <p>Rows: {page.total ? `${offset + 1}–${lastRow} of ${page.total}` : 0}</p>
       <div className="controls">
         <label>Sort by: </label>
-        <select value={sortBy} onChange={e => setSortBy(e.target.value)}>
-          <option value="">(none)</option>
+        <select value={sortBy} onChange={e => { setSortBy(e.target.value); setOffset(0) }}>
+          <option value="">(rank)</option>
           {columns.map(c => <option key={c} value={c}>{c}</option>)}
         </select>
-        <button onClick={() => setDesc(d => !d)}>{desc ? 'desc' : 'asc'}</button>
+        <button onClick={() => { setDesc(d => !d); setOffset(0) }}>{desc ? 'desc' : 'asc'}</button>
+        <label> Firm: </label>
+        <input value={firmInput} onChange={e => setFirmInput(e.target.value)} placeholder="exact firm name" />
+        <button disabled={offset === 0} onClick={() => setOffset(o => Math.max(0, o - PAGE_SIZE))}>prev</button>
+        <button disabled={lastRow >= page.total} onClick={() => setOffset(o => o + PAGE_SIZE)}>next</button>
       </div>
 
       <div className="table-wrap">
@@ -110,8 +100,8 @@ export default function App() {
             </tr>
           </thead>
           <tbody>
-            {sorted.map((row, i) => (
-              <tr key={i}>
+            {page.items.map((row, i) => (
+              <tr key={offset + i}>
                 {columns.map(c => <td key={c}>{formatValue(row[c], c)}</td>)}
               </tr>
             ))}
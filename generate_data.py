@@ -1,19 +1,57 @@
+"""
+Synthetic lawyer data.
+
+`generate_synthetic_data` builds a small list of row dicts. For scale testing,
+`write_dataset` generates columns in vectorized, seeded chunks and streams
+them to a CSV, a binary snapshot (see `snapshot`) or a SQLite database (see
+`lawyer_db`), optionally on several processes:
+
+    python generate_data.py                                   # append 19995 rows to lawyer_data.csv
+    python generate_data.py -o big.csv --rows 10000000 --seed 1 --processes 4
+    python generate_data.py -o big.lrsnap --rows 10000000
+    python generate_data.py -o lawyers.db --rows 1000000
+"""
+import argparse
 import csv
+import multiprocessing
 import random
 
+from ranker import DB_SUFFIXES, SNAPSHOT_SUFFIX, atomic_write
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed by the vectorized generator
+    np = None
+
+# These must match the headers in the existing CSV file
+FIELDNAMES = [
+    'Name', 'Firm', 'Chambers Rank', 'Years PE', 'Chambers PE Rank',
+    'LinkedIn Presence', 'Law360 News', 'Law360 Cases', 'Google News',
+    'Speaking Engagements (2024/2025)', 'Thought Pieces (2025)',
+    'Firm PR Pieces', 'PE Brand Rank', 'PE Practice Band Rank'
+]
+
+FIRST_NAMES = ['John', 'Jane', 'Peter', 'Susan', 'Michael', 'Emily']
+LAST_NAMES = ['Smith', 'Jones', 'Williams', 'Brown', 'Davis', 'Miller']
+LAW_FIRMS = ['Kirkland & Ellis', 'Latham & Watkins', 'DLA Piper', 'Baker McKenzie', 'Skadden']
+
+# Share of lawyers at each firm, and how much each firm's brand lifts its lawyers' profile
+FIRM_SHARES = [0.3, 0.25, 0.2, 0.15, 0.1]
+FIRM_PRESTIGE = [0.6, 0.5, -0.2, 0.0, 0.4]
+
+# Rows generated per chunk; each chunk is seeded on its own, so output does not depend on `processes`
+CHUNK_ROWS = 100000
+
+
 def generate_synthetic_data(num_rows):
     """
     Generates a specified number of rows of synthetic lawyer data.
     """
-    first_names = ['John', 'Jane', 'Peter', 'Susan', 'Michael', 'Emily']
-    last_names = ['Smith', 'Jones', 'Williams', 'Brown', 'Davis', 'Miller']
-    law_firms = ['Kirkland & Ellis', 'Latham & Watkins', 'DLA Piper', 'Baker McKenzie', 'Skadden']
-
     data = []
     for i in range(num_rows):
         row = {
-            'Name': f"{random.choice(first_names)} {random.choice(last_names)} {i}",
-            'Firm': random.choice(law_firms),
+            'Name': f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)} {i}",
+            'Firm': random.choice(LAW_FIRMS),
             'Chambers Rank': random.randint(1, 5),
             'Years PE': random.randint(1, 20),
             'Chambers PE Rank': random.randint(1, 5),
@@ -30,6 +68,116 @@ def generate_synthetic_data(num_rows):
         data.append(row)
     return data
 
+
+def generate_columns(seed, start, num_rows):
+    """
+    Rows `start` to `start + num_rows` of the dataset for `seed`, as
+    `{column: values}`: numpy int64 arrays for the numeric columns and lists
+    of strings for Name and Firm. Values stay within the ranges of
+    `generate_synthetic_data`, but are correlated the way real profiles are:
+    seniority and a latent "standing" drive the Chambers bands, press and
+    speaking activity, and the firm drives brand rank and firm PR.
+    """
+    rng = np.random.default_rng([seed, start])
+    index = np.arange(start, start + num_rows)
+    first = rng.integers(0, len(FIRST_NAMES), num_rows)
+    last = rng.integers(0, len(LAST_NAMES), num_rows)
+    firm = rng.choice(len(LAW_FIRMS), num_rows, p=FIRM_SHARES)
+    prestige = np.asarray(FIRM_PRESTIGE)[firm]
+
+    years = np.clip(np.rint(rng.gamma(2.0, 4.0, num_rows)), 1, 20).astype(np.int64)
+    standing = 0.12 * (years - 8) + prestige + rng.normal(0.0, 1.0, num_rows)
+    activity = 1 / (1 + np.exp(-standing))
+
+    def band(latent, noise):
+        # 1 is the top band, so higher standing means a lower number
+        return np.clip(np.rint(3 - latent + rng.normal(0.0, noise, num_rows)), 1, 5).astype(np.int64)
+
+    def count(lam, high):
+        return np.minimum(rng.poisson(lam), high).astype(np.int64)
+
+    chambers = band(standing, 0.5)
+    news = count(4 + 40 * activity ** 2, 100)
+    columns = {
+        'Name': [f"{FIRST_NAMES[a]} {LAST_NAMES[b]} {i}"
+                 for a, b, i in zip(first.tolist(), last.tolist(), index.tolist())],
+        'Firm': [LAW_FIRMS[f] for f in firm.tolist()],
+        'Chambers Rank': chambers,
+        'Years PE': years,
+        'Chambers PE Rank': np.clip(chambers + rng.integers(-1, 2, num_rows), 1, 5),
+        'LinkedIn Presence': (rng.random(num_rows) < 0.4 + 0.5 * activity).astype(np.int64),
+        'Law360 News': news,
+        'Law360 Cases': count(1 + 0.3 * news + 0.5 * years, 50),
+        'Google News': count(0.5 + 0.15 * news, 20),
+        'Speaking Engagements (2024/2025)': count(0.3 + 3 * activity, 5),
+        'Thought Pieces (2025)': count(0.5 + 5 * activity, 10),
+        'Firm PR Pieces': count(1 + 2 * (prestige + 0.2), 5),
+        'PE Brand Rank': band(2 * prestige, 0.7),
+        'PE Practice Band Rank': band(standing, 0.8),
+    }
+    return columns
+
+
+def _chunks(num_rows, chunk_rows):
+    return [(start, min(chunk_rows, num_rows - start)) for start in range(0, num_rows, chunk_rows)]
+
+
+def _csv_chunk(task):
+    """One chunk as CSV text. No generated value contains a comma, quote or newline, so nothing is quoted."""
+    seed, start, num_rows = task
+    columns = generate_columns(seed, start, num_rows)
+    cells = [values if isinstance(values, list) else values.astype(str).tolist() for values in columns.values()]
+    return '\n'.join(map(','.join, zip(*cells))) + '\n'
+
+
+def _columns_chunk(task):
+    return generate_columns(*task)
+
+
+def _map(fn, tasks, processes):
+    """`fn` over `tasks` in order, on a pool of `processes` when more than one."""
+    if processes <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield fn(task)
+        return
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        # imap keeps chunks in order while at most a few are held in memory per worker
+        yield from pool.imap(fn, tasks)
+
+
+def write_dataset(path, num_rows, seed=0, chunk_rows=CHUNK_ROWS, processes=1):
+    """
+    Write `num_rows` generated rows to `path`: a binary snapshot if it ends in
+    SNAPSHOT_SUFFIX, a database if it ends in one of DB_SUFFIXES, else a CSV.
+    Chunks are seeded from `(seed, first row)`, so a given seed and
+    `chunk_rows` give the same file whatever `processes`. Databases are
+    upserted on Name (unique per generated row), so regenerating into one
+    rewrites the same rows instead of duplicating them. Returns the path.
+    """
+    if np is None:
+        raise RuntimeError("The vectorized generator requires numpy")
+    tasks = [(seed, start, n) for start, n in _chunks(num_rows, chunk_rows)]
+    if str(path).endswith(DB_SUFFIXES):
+        from lawyer_db import LawyerStore
+        with LawyerStore(path, FIELDNAMES, ['Name']) as store:
+            for columns in _map(_columns_chunk, tasks, processes):
+                cells = [values if isinstance(values, list) else values.astype(str).tolist()
+                         for values in columns.values()]
+                store.upsert(dict(zip(FIELDNAMES, row)) for row in zip(*cells))
+        return path
+    if str(path).endswith(SNAPSHOT_SUFFIX):
+        from snapshot import SnapshotWriter
+        with SnapshotWriter(path, FIELDNAMES) as writer:
+            for columns in _map(_columns_chunk, tasks, processes):
+                writer.append(columns)
+        return path
+    with atomic_write(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(','.join(FIELDNAMES) + '\n')
+        for text in _map(_csv_chunk, tasks, processes):
+            f.write(text)
+    return path
+
+
 def append_to_csv(file_path, data, fieldnames):
     """
     Appends generated data to a CSV file.
@@ -38,22 +186,29 @@ def append_to_csv(file_path, data, fieldnames):
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writerows(data)
 
-if __name__ == '__main__':
-    NUM_ROWS_TO_GENERATE = 19995
-    CSV_FILE = 'lawyer_data.csv'
 
-    # These must match the headers in the existing CSV file
-    FIELDNAMES = [
-        'Name', 'Firm', 'Chambers Rank', 'Years PE', 'Chambers PE Rank',
-        'LinkedIn Presence', 'Law360 News', 'Law360 Cases', 'Google News',
-        'Speaking Engagements (2024/2025)', 'Thought Pieces (2025)',
-        'Firm PR Pieces', 'PE Brand Rank', 'PE Practice Band Rank'
-    ]
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser(description='Generate synthetic lawyer data.')
+    cli.add_argument('--rows', type=int, default=19995)
+    cli.add_argument('-o', '--output', default=None,
+                     help=f'write a new .csv or {SNAPSHOT_SUFFIX} file, or upsert into a .db, with the '
+                          'vectorized generator '
+                          '(default: append to lawyer_data.csv)')
+    cli.add_argument('--seed', type=int, default=0)
+    cli.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    cli.add_argument('--processes', type=int, default=1)
+    args = cli.parse_args()
 
-    print(f"Generating {NUM_ROWS_TO_GENERATE} rows of synthetic data...")
-    synthetic_data = generate_synthetic_data(NUM_ROWS_TO_GENERATE)
+    if args.output:
+        print(f"Generating {args.rows} rows of synthetic data...")
+        write_dataset(args.output, args.rows, args.seed, args.chunk_rows, args.processes)
+        print(f"Wrote {args.output}")
+    else:
+        CSV_FILE = 'lawyer_data.csv'
+        print(f"Generating {args.rows} rows of synthetic data...")
+        synthetic_data = generate_synthetic_data(args.rows)
 
-    print(f"Appending data to {CSV_FILE}...")
-    append_to_csv(CSV_FILE, synthetic_data, FIELDNAMES)
+        print(f"Appending data to {CSV_FILE}...")
+        append_to_csv(CSV_FILE, synthetic_data, FIELDNAMES)
 
-    print("Data generation complete.")
\ No newline at end of file
+        print("Data generation complete.")
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from metrics import inc
+from ranker import atomic_write
+from scraper import DEFAULT_PARSER, parse_listing
+
+# Where the scraper keeps fetched pages between runs
+DEFAULT_CACHE_DIR = '.scrape_cache'
+
+# Total bytes of cached bodies and extracted records kept by `prune`
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+# Seconds after which an entry is dropped and its page fetched unconditionally again
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+# Bump when extraction in `scraper` changes, so records parsed by older code are not reused
+EXTRACT_VERSION = 1
+
+
+def body_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+class PageCache:
+    """
+    On-disk cache of fetched directory pages.
+
+    Bodies are content-addressed (`bodies/<sha256>`), so identical pages are
+    stored once. Each URL has an entry (`entries/<sha1 of url>.json`) with the
+    body's hash, encoding, ETag and Last-Modified, which `listing` sends back
+    as If-None-Match / If-Modified-Since. The records extracted from a body are
+    kept under its hash (`parsed/<sha256>-<parser>-v<EXTRACT_VERSION>.json`),
+    so a page answered with 304, or with the same bytes as last time, is not
+    parsed again.
+
+    `prune` drops entries older than `max_age` seconds, then the least
+    recently used ones until the bodies and records still referenced fit in
+    `max_bytes`. Safe to share between crawler threads.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.stats = {'fetched': 0, 'not_modified': 0, 'unchanged': 0, 'parsed': 0, 'reused': 0}
+        self._lock = threading.Lock()
+        for sub in ('entries', 'bodies', 'parsed'):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+
+    def _entry_path(self, url):
+        return os.path.join(self.directory, 'entries', hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _body_path(self, digest):
+        return os.path.join(self.directory, 'bodies', digest)
+
+    def _parsed_path(self, digest, parser):
+        return os.path.join(self.directory, 'parsed', f'{digest}-{parser}-v{EXTRACT_VERSION}.json')
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+        inc('lawyer_scrape_cache_total', result=name)
+
+    def entry(self, url):
+        """The stored entry for `url`, or None if missing, expired or without its body."""
+        try:
+            with open(self._entry_path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('stored_at', 0) > self.max_age:
+            return None
+        if not os.path.exists(self._body_path(entry['sha256'])):
+            return None
+        return entry
+
+    def _save_entry(self, entry):
+        entry['used_at'] = time.time()
+        with atomic_write(self._entry_path(entry['url']), 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, response, previous=None):
+        """Record a 200 response for `url`; returns its entry."""
+        body = response.content
+        digest = body_hash(body)
+        path = self._body_path(digest)
+        if not os.path.exists(path):
+            with atomic_write(path, 'wb') as f:
+                f.write(body)
+        if previous is not None and previous['sha256'] == digest:
+            self._count('unchanged')
+        entry = {
+            'url': url,
+            'sha256': digest,
+            # as `response.text` would decode it
+            'encoding': response.encoding or response.apparent_encoding,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'stored_at': time.time(),
+        }
+        self._save_entry(entry)
+        return entry
+
+    def text(self, entry):
+        with open(self._body_path(entry['sha256']), 'rb') as f:
+            return f.read().decode(entry['encoding'] or 'utf-8', errors='replace')
+
+    def parse(self, entry, parser=None):
+        """`scraper.parse_listing` of an entry's body, reusing the records extracted from the same bytes before."""
+        path = self._parsed_path(entry['sha256'], parser or DEFAULT_PARSER)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                parsed = json.load(f)
+        except (OSError, ValueError):
+            parsed = None
+        if parsed is not None:
+            self._count('reused')
+            return parsed['records'], parsed['next_href']
+        records, next_href = parse_listing(self.text(entry), parser)
+        self._count('parsed')
+        with atomic_write(path, 'w', encoding='utf-8') as f:
+            json.dump({'records': records, 'next_href': next_href}, f)
+        return records, next_href
+
+    def listing(self, url, get, parser=None):
+        """
+        Fetch and parse a listing page through the cache. `get(headers)` must
+        perform the GET with the given extra headers and return the
+        `requests` response (a 304 is not an error). Returns `(records,
+        next_href)` like `scraper.parse_listing`.
+        """
+        previous = self.entry(url)
+        response = get(self.conditional_headers(previous))
+        if response.status_code == 304 and previous is not None:
+            self._count('not_modified')
+            self._save_entry(previous)
+            entry = previous
+        else:
+            if response.status_code == 304:
+                # a validator we did not send (or whose body was pruned meanwhile); fetch it for real
+                response = get({})
+            response.raise_for_status()
+            self._count('fetched')
+            entry = self.store(url, response, previous)
+        return self.parse(entry, parser)
+
+    def prune(self):
+        """Apply the age and size limits; returns the number of bytes removed."""
+        now = time.time()
+        entries = []
+        for name in os.listdir(os.path.join(self.directory, 'entries')):
+            path = os.path.join(self.directory, 'entries', name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+            if entry is None or now - entry.get('stored_at', 0) > self.max_age:
+                _remove(path)
+                continue
+            entries.append((entry.get('used_at', 0), path, entry['sha256']))
+
+        sizes = {}
+        for sub in ('bodies', 'parsed'):
+            for name in os.listdir(os.path.join(self.directory, sub)):
+                path = os.path.join(self.directory, sub, name)
+                digest = name.split('-', 1)[0]
+                try:
+                    sizes.setdefault(digest, []).append((path, os.path.getsize(path)))
+                except OSError:
+                    pass
+
+        # keep the most recently used entries whose files fit in the budget
+        kept = set()
+        used = 0
+        for _, path, digest in sorted(entries, reverse=True):
+            if digest not in kept:
+                size = sum(s for _, s in sizes.get(digest, ()))
+                if used + size > self.max_bytes:
+                    _remove(path)
+                    continue
+                kept.add(digest)
+                used += size
+        removed = 0
+        for digest, files in sizes.items():
+            if digest not in kept:
+                for path, size in files:
+                    _remove(path)
+                    removed += size
+        return removed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,324 @@
+import bisect
+import csv
+import hashlib
+import json
+import os
+import struct
+import sys
+from array import array
+from collections import deque
+
+from ranker import (
+    atomic_write,
+    build_page,
+    header_positions,
+    load_weights,
+    normalize_fieldnames,
+    page_size,
+    score_lawyer,
+    scoring_weights,
+)
+from ranking_cache import config_fingerprint
+from schema import SAMPLE_ROWS, load_schema, numeric_columns as schema_numeric_columns
+
+# Bump when the layout of the persisted state changes
+STATE_VERSION = 3
+
+# Bytes read at a time while verifying the already-ranked prefix
+READ_CHUNK = 1024 * 1024
+
+# Persisted state: magic | header length (uint32 LE) | JSON header | row_offsets
+# (int64) | scores (float64) | order (int64), arrays little-endian. Plain data
+# only, so loading a state file can never run code.
+STATE_MAGIC = b'LRSTATE\x00'
+_LENGTH = struct.Struct('<I')
+
+# Persisted arrays, in file order, with their typecodes
+_ARRAYS = (('row_offsets', 'q'), ('scores', 'd'), ('order', 'q'))
+
+
+def state_path(input_file, config_file=None):
+    """Where the ranking state for `input_file` under a given config is persisted."""
+    config_key = hashlib.sha1(config_fingerprint(config_file).encode('utf-8')).hexdigest()[:12]
+    return f"{input_file}.{config_key}.rankstate"
+
+
+def _read_state(f):
+    if f.read(len(STATE_MAGIC)) != STATE_MAGIC:
+        return None
+    (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+    state = json.loads(f.read(length).decode('utf-8'))
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        return None
+    rows = state.pop('rows')
+    for name, typecode in _ARRAYS:
+        values = array(typecode)
+        data = f.read(rows * values.itemsize)
+        if len(data) != rows * values.itemsize:
+            return None
+        values.frombytes(data)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        state[name] = values
+    if state['pairs'] is not None:
+        state['pairs'] = [(column, weight) for column, weight in state['pairs']]
+    return state
+
+
+def load_state(path):
+    try:
+        with open(path, 'rb') as f:
+            return _read_state(f)
+    except (OSError, struct.error, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_state(path, state):
+    header = {k: v for k, v in state.items() if k not in dict(_ARRAYS)}
+    header['rows'] = len(state['scores'])
+    header = json.dumps(header).encode('utf-8')
+    with atomic_write(path, 'wb') as f:
+        f.write(STATE_MAGIC)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        for name, _ in _ARRAYS:
+            values = state[name]
+            if sys.byteorder != 'little':
+                values = array(values.typecode, values)
+                values.byteswap()
+            f.write(values.tobytes())
+
+
+def _new_state(config_fp):
+    return {
+        'version': STATE_VERSION,
+        'config': config_fp,
+        'offset': 0,                 # bytes of the file already ranked (at a record boundary)
+        'digest': None,              # sha1 of those bytes
+        'header': None,              # raw CSV header
+        'schema': None,              # inferred column types (see `schema`), when autodetecting
+        'pairs': None,               # (column, weight) pairs the scores were computed with
+        'row_offsets': array('q'),   # byte offset of each row, in file order
+        'scores': array('d'),        # score of each row
+        'order': array('q'),         # row indices in rank order
+    }
+
+
+def iter_records(f, start=0):
+    """
+    Yield `(byte_offset, values)` for each CSV record of the binary file `f`
+    from byte `start`, skipping blank lines like `csv.DictReader` does.
+
+    Records may span several physical lines (quoted newlines); a record ends at
+    the first newline outside quotes. Lines must end in '\\n' or '\\r\\n'.
+    """
+    offsets = deque()
+
+    def texts():
+        f.seek(start)
+        pos = start
+        lines = []
+        quotes = 0
+        for line in f:
+            if not lines:
+                record_start = pos
+            pos += len(line)
+            lines.append(line)
+            quotes += line.count(b'"')
+            if quotes % 2:
+                continue  # inside a quoted field
+            offsets.append(record_start)
+            yield b''.join(lines).decode('utf-8')
+            lines = []
+            quotes = 0
+        if lines:
+            offsets.append(record_start)
+            yield b''.join(lines).decode('utf-8')
+
+    # one reader over all records; every record text yields exactly one row
+    for row in csv.reader(texts()):
+        offset = offsets.popleft()
+        if row:
+            yield offset, row
+
+
+def _pad(row, width):
+    if len(row) < width:
+        row = row + [None] * (width - len(row))
+    return row
+
+
+def _verified_prefix(f, state, size):
+    """
+    Hash the first `state['offset']` bytes of the file and compare them with the
+    stored digest. Returns the running hasher if the prefix is unchanged (so it
+    can continue over the appended tail), or None if the file was truncated or
+    rewritten.
+    """
+    offset = state['offset']
+    if size < offset:
+        return None
+    hasher = hashlib.sha1()
+    f.seek(0)
+    remaining = offset
+    while remaining:
+        chunk = f.read(min(READ_CHUNK, remaining))
+        if not chunk:
+            return None
+        hasher.update(chunk)
+        remaining -= len(chunk)
+    return hasher if hasher.hexdigest() == state['digest'] else None
+
+
+def _rank_key(scores):
+    return lambda i: (-scores[i], i)
+
+
+def _merge_order(order, added, key):
+    """
+    Merge `added` (sorted by `key`) into `order` (sorted by `key`). Each new row
+    is placed with a binary search and the untouched runs are copied in bulk, so
+    a small append costs O(k log n) comparisons plus one array copy.
+    """
+    merged = array('q')
+    prev = 0
+    for i in added:
+        pos = bisect.bisect_left(order, key(i), lo=prev, key=key)
+        merged.extend(order[prev:pos])
+        merged.append(i)
+        prev = pos
+    merged.extend(order[prev:])
+    return merged
+
+
+def update_state(input_file, config_file=None, state=None):
+    """
+    Bring a ranking state up to date with `input_file`.
+
+    If the bytes ranked last time are unchanged, only the appended tail is
+    parsed and scored, and the new rows are merged into the existing order. If
+    the file was truncated or rewritten (or there is no usable state) the
+    ranking is rebuilt from scratch. Returns `(state, complete)`; `complete` is
+    False when the file does not end at a line boundary, in which case the
+    state must not be persisted (its last row may still be growing).
+    """
+    weights, use_autodetect = load_weights(config_file)
+    config_fp = config_fingerprint(config_file)
+
+    with open(input_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        hasher = None
+        if state is not None and state['config'] == config_fp:
+            hasher = _verified_prefix(f, state, size)
+        if hasher is None:
+            state = _new_state(config_fp)
+            hasher = hashlib.sha1()
+
+        start = state['offset']
+        f.seek(start)
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            last = chunk
+        complete = size == start or last.endswith(b'\n')
+
+        records = iter_records(f, start)
+        if state['header'] is None:
+            state['header'] = next(records, (0, []))[1]
+        header = state['header']
+        width = len(header)
+        names = list(header_positions(header))
+        positions = list(header_positions(header).values())
+
+        row_offsets = state['row_offsets']
+        first_new = len(row_offsets)
+        new_rows = []
+        for offset, row in records:
+            row_offsets.append(offset)
+            row = _pad(row, width)
+            new_rows.append(dict(zip(names, (row[i] for i in positions))))
+
+    state['offset'] = size
+    state['digest'] = hasher.hexdigest()
+
+    numeric_columns = []
+    if use_autodetect:
+        # Types are inferred from the leading SAMPLE_ROWS rows; once the verified
+        # prefix covers them, appended rows cannot change the schema.
+        if state['schema'] is None or first_new < SAMPLE_ROWS:
+            state['schema'] = load_schema(input_file)
+        numeric_columns = schema_numeric_columns(normalize_fieldnames(header), state['schema'])
+    pairs = scoring_weights(weights, use_autodetect, numeric_columns)
+
+    scores = state['scores']
+    key = _rank_key(scores)
+    if state['pairs'] is None or pairs == state['pairs']:
+        scores.extend(score_lawyer(row, pairs) for row in new_rows)
+        added = sorted(range(first_new, len(scores)), key=key)
+        state['order'] = _merge_order(state['order'], added, key)
+    else:
+        # the scoring columns changed (e.g. appended rows turned a column
+        # numeric): rescore every row from the file
+        scores[:] = array('d', (score_lawyer(row, pairs) for row in iter_rows_at(input_file, state)))
+        state['order'] = array('q', sorted(range(len(scores)), key=key))
+    state['pairs'] = pairs
+    return state, complete
+
+
+def iter_rows_at(input_file, state, indices=None):
+    """
+    Yield normalized row dicts for the given row indices (all rows, in file
+    order, when `indices` is None), reading them back from the CSV by offset.
+    """
+    header = state['header']
+    width = len(header)
+    items = list(header_positions(header).items())
+    row_offsets = state['row_offsets']
+    with open(input_file, 'rb') as f:
+        if indices is None:
+            start = row_offsets[0] if row_offsets else state['offset']
+            for _, row in iter_records(f, start):
+                row = _pad(row, width)
+                yield {name: row[i] for name, i in items}
+            return
+        for index in indices:
+            _, row = next(iter_records(f, row_offsets[index]))
+            row = _pad(row, width)
+            yield {name: row[i] for name, i in items}
+
+
+def rank_file_incremental(input_file, config_file=None, top_k=None, offset=0, limit=None, after=None,
+                          state_file=None):
+    """
+    Incremental counterpart of the row-wise ranking in `ranker`: returns the same
+    `(page, fieldnames)` pair. The persisted state (processed byte offset,
+    header, column types, per-row offsets, scores and rank order) is reused, so
+    only rows appended since the last run are parsed. Rows of a page are read
+    back by offset; a full ranking re-reads the file once.
+    """
+    state_file = state_file or state_path(input_file, config_file)
+    state, complete = update_state(input_file, config_file, load_state(state_file))
+    if complete:
+        save_state(state_file, state)
+
+    scores, order = state['scores'], state['order']
+    start = 0
+    if after is not None:
+        start = bisect.bisect_right(order, (-after[0], after[1]), key=_rank_key(scores))
+    count = page_size(top_k, offset, limit, after)
+    stop = len(order) if count is None else min(len(order), start + count)
+    selected = order[start + offset:stop].tolist()
+
+    if len(selected) == len(order):
+        rows = list(iter_rows_at(input_file, state))
+        items = [rows[i] for i in selected]
+    else:
+        items = list(iter_rows_at(input_file, state, selected))
+    for i, item in zip(selected, items):
+        item['score'] = scores[i]
+
+    page = build_page(items, len(order), len(order) - start, top_k, offset, limit, after,
+                      selected[-1] if selected else None)
+    return page, normalize_fieldnames(state['header'])
@@ -0,0 +1,482 @@
+"""
+SQLite storage for lawyer records.
+
+A database holds the same table as a lawyer CSV, plus the scores of every
+weighting it has been ranked with, so rankings, filters and sorts are answered
+by indexed queries instead of parsing the whole file:
+
+  * `lawyers` has one row per lawyer. `row_id` keeps insertion (file) order,
+    which breaks score ties. Field `i` is stored as text in `c<i>`, exactly
+    as read, and as its parsed number in `n<i>` (NULL when blank or not
+    numeric). An optional `key` built from the key columns makes writes
+    upserts: a record with a known key replaces the stored one in place.
+  * `scores` holds one score per row for each weighting (`score_sets`),
+    indexed on (weighting, score DESC, row_id), i.e. in rank order. A
+    weighting is scored in one pass the first time it is used; after that
+    every write re-scores just the rows it touched.
+
+The name and firm columns are indexed, and so is every weighted column.
+
+    python lawyer_db.py import lawyer_data.csv lawyers.db [--key Name]
+    python lawyer_db.py export lawyers.db -o lawyers.csv
+    python lawyer_db.py rank lawyers.db --config config.json --top-k 10
+"""
+import argparse
+import csv
+import errno
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from itertools import islice
+
+from metrics import stage
+from ranker import (
+    DB_SUFFIXES,
+    atomic_write,
+    build_page,
+    convert_column,
+    load_weights,
+    normalize_fieldnames,
+    page_size,
+    parse_cell,
+    scoring_weights,
+)
+from schema import SAMPLE_ROWS, infer_schema, numeric_columns
+from stream_ranker import row_dicts
+
+# Rows written per transaction by `LawyerStore.upsert`
+BATCH_ROWS = 10000
+
+# Columns (case-insensitive) indexed for lookups; weighted columns are indexed as they are used
+LOOKUP_COLUMNS = ('name', 'firm')
+
+# Seconds a connection waits for another process's write to finish
+BUSY_TIMEOUT = 30.0
+
+# Rows fetched from SQLite at a time while streaming
+FETCH_ROWS = 1024
+
+
+def _casefold(value):
+    # text sort key of `query.RankedIndex`: blank cells have none and sort last
+    return None if value is None or value == '' else value.casefold()
+
+
+class LawyerStore:
+    """
+    One open lawyer database. Creating one needs `fieldnames` (and, for
+    upserts, the `key_columns` identifying a lawyer); an existing database
+    keeps the ones it was created with, gaining columns as records bring new
+    ones. Use as a context manager, or call `close`.
+    """
+
+    def __init__(self, path, fieldnames=None, key_columns=None, batch_rows=BATCH_ROWS):
+        if fieldnames is None and not os.path.exists(path):
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        self.path = path
+        self.batch_rows = batch_rows
+        # transactions are explicit (see `_transaction`)
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.create_function('casefold', 1, _casefold, deterministic=True)
+        meta = self._read_meta()
+        if meta is None:
+            if fieldnames is None:
+                raise ValueError(f"{path} is not a lawyer database")
+            with self._transaction():
+                # another process may have created it meanwhile
+                meta = self._read_meta() or self._create(list(dict.fromkeys(normalize_fieldnames(fieldnames))),
+                                                         list(key_columns or []))
+        if key_columns is not None and list(key_columns) != meta['key_columns']:
+            raise ValueError(f"{path} is keyed on {meta['key_columns']}, not {list(key_columns)}")
+        self.fieldnames = meta['fieldnames']
+        self.key_columns = meta['key_columns']
+        self._positions = {name: i for i, name in enumerate(self.fieldnames)}
+        self._insert_sql = None
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so check-then-write sequences cannot interleave
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    def _read_meta(self):
+        try:
+            rows = self.conn.execute('SELECT name, value FROM meta').fetchall()
+        except sqlite3.OperationalError:
+            return None
+        return {name: json.loads(value) for name, value in rows}
+
+    def _write_meta(self, **values):
+        self.conn.executemany('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+                              [(name, json.dumps(value)) for name, value in values.items()])
+
+    def _create(self, fieldnames, key_columns):
+        columns = ''.join(f', c{i} TEXT, n{i} REAL' for i in range(len(fieldnames)))
+        self.conn.execute('CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.conn.execute(f'CREATE TABLE lawyers (row_id INTEGER PRIMARY KEY, key TEXT UNIQUE{columns})')
+        self.conn.execute('CREATE TABLE score_sets (set_id INTEGER PRIMARY KEY, pairs TEXT UNIQUE NOT NULL)')
+        self.conn.execute('CREATE TABLE scores (set_id INTEGER NOT NULL, row_id INTEGER NOT NULL, score REAL, '
+                          'PRIMARY KEY (set_id, row_id)) WITHOUT ROWID')
+        self.conn.execute('CREATE INDEX scores_rank ON scores (set_id, score DESC, row_id)')
+        for i, name in enumerate(fieldnames):
+            if name.lower() in LOOKUP_COLUMNS:
+                self.conn.execute(f'CREATE INDEX lawyers_c{i} ON lawyers (c{i})')
+        meta = {'fieldnames': fieldnames, 'key_columns': key_columns}
+        self._write_meta(**meta)
+        return meta
+
+    def _add_columns(self, names):
+        """Add fields first seen in written records (inside the write transaction)."""
+        for name in names:
+            i = len(self.fieldnames)
+            self.conn.execute(f'ALTER TABLE lawyers ADD COLUMN c{i} TEXT')
+            self.conn.execute(f'ALTER TABLE lawyers ADD COLUMN n{i} REAL')
+            if name.lower() in LOOKUP_COLUMNS:
+                self.conn.execute(f'CREATE INDEX lawyers_c{i} ON lawyers (c{i})')
+            self._positions[name] = i
+            self.fieldnames.append(name)
+        self._write_meta(fieldnames=self.fieldnames)
+        self._insert_sql = None
+
+    def _insert(self):
+        if self._insert_sql is None:
+            fields = range(len(self.fieldnames))
+            names = ['row_id', 'key'] + [f'c{i}, n{i}' for i in fields]
+            updates = [f'c{i} = excluded.c{i}, n{i} = excluded.n{i}' for i in fields] or ['key = excluded.key']
+            self._insert_sql = (
+                f"INSERT INTO lawyers ({', '.join(names)}) VALUES (?, ?{', ?, ?' * len(self.fieldnames)}) "
+                f"ON CONFLICT (key) DO UPDATE SET {', '.join(updates)}")
+        return self._insert_sql
+
+    def _key(self, row):
+        if not self.key_columns:
+            return None
+        return json.dumps([row.get(name) for name in self.key_columns], ensure_ascii=False)
+
+    def upsert(self, rows):
+        """
+        Write records (dicts keyed by field name) in transactions of
+        `batch_rows`. Without key columns every record is appended; otherwise a
+        record whose key is stored replaces that row, keeping its place in
+        file order. Stored scores of the touched rows are updated in the same
+        transaction. Returns the number of records written.
+        """
+        written = 0
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_rows))
+            if not batch:
+                return written
+            with stage('write'):
+                self._write_batch(batch)
+            written += len(batch)
+
+    def _write_batch(self, batch):
+        with self._transaction():
+            seen = set().union(*batch)
+            if not seen.issubset(self._positions):
+                self._add_columns([name for name in dict.fromkeys(name for row in batch for name in row)
+                                   if name and name not in self._positions])
+            first = self.conn.execute('SELECT COALESCE(MAX(row_id) + 1, 0) FROM lawyers').fetchone()[0]
+            keys = [self._key(row) for row in batch]
+            columns = [range(first, first + len(batch)), keys]
+            for name in self.fieldnames:
+                # column by column, so each distinct cell is parsed once
+                cells = [row.get(name) for row in batch]
+                parsed = convert_column(cells)
+                columns.append([v if v is None or type(v) is str else str(v) for v in cells])
+                columns.append(list(map(parsed.__getitem__, cells)))
+            self.conn.executemany(self._insert(), zip(*columns))
+
+            # appended rows got ids from `first` on; replaced rows are found by key
+            keys = json.dumps([key for key in keys if key is not None], ensure_ascii=False)
+            for set_id, pairs in self.conn.execute('SELECT set_id, pairs FROM score_sets').fetchall():
+                expression, weights = self._score_sql(json.loads(pairs))
+                self.conn.execute(
+                    f'INSERT OR REPLACE INTO scores (set_id, row_id, score) SELECT ?, row_id, {expression} '
+                    f'FROM lawyers WHERE row_id >= ? OR key IN (SELECT value FROM json_each(?))',
+                    [set_id] + weights + [first, keys])
+
+    def _score_sql(self, pairs):
+        """
+        SQL for `ranker.score_lawyer` over the stored numbers, and its
+        parameters: contributions are added to 0.0 in pair order, and a blank
+        cell (NULL) contributes exactly 0.0, so the floats are identical.
+        """
+        terms = ['0.0']
+        weights = []
+        for column, weight in pairs:
+            if column in self._positions:
+                terms.append(f'COALESCE(n{self._positions[column]} * ?, 0.0)')
+                weights.append(weight)
+        return ' + '.join(terms), weights
+
+    def schema(self):
+        """Inferred types of the first SAMPLE_ROWS rows in file order, as for a CSV (see `schema`)."""
+        cells = ', '.join(f'c{i}' for i in range(len(self.fieldnames))) or 'NULL'
+        rows = self.conn.execute(f'SELECT {cells} FROM lawyers ORDER BY row_id LIMIT ?', (SAMPLE_ROWS,)).fetchall()
+        return infer_schema({name: [row[i] for row in rows] for i, name in enumerate(self.fieldnames)})
+
+    def weight_pairs(self, config_file=None):
+        """The `(column, weight)` pairs `ranker` would score this data with."""
+        weights, use_autodetect = load_weights(config_file)
+        numeric = numeric_columns(self.fieldnames, self.schema()) if use_autodetect else []
+        return scoring_weights(weights, use_autodetect, numeric)
+
+    def score_set(self, pairs):
+        """Id of the stored scores for `pairs`, scoring every row (and indexing the weighted columns) on first use."""
+        pairs = [[column, weight] for column, weight in pairs]
+        key = json.dumps(pairs)
+        found = self.conn.execute('SELECT set_id FROM score_sets WHERE pairs = ?', (key,)).fetchone()
+        if found is not None:
+            return found[0]
+        with stage('score'), self._transaction():
+            found = self.conn.execute('SELECT set_id FROM score_sets WHERE pairs = ?', (key,)).fetchone()
+            if found is not None:
+                return found[0]
+            set_id = self.conn.execute('INSERT INTO score_sets (pairs) VALUES (?)', (key,)).lastrowid
+            expression, weights = self._score_sql(pairs)
+            self.conn.execute(f'INSERT INTO scores (set_id, row_id, score) SELECT ?, row_id, {expression} '
+                              f'FROM lawyers', [set_id] + weights)
+            for column, _ in pairs:
+                if column in self._positions:
+                    i = self._positions[column]
+                    self.conn.execute(f'CREATE INDEX IF NOT EXISTS lawyers_n{i} ON lawyers (n{i})')
+        return set_id
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM lawyers').fetchone()[0]
+
+    def _cells(self, alias='l'):
+        return ', '.join(f'{alias}.c{i}' for i in range(len(self.fieldnames))) or 'NULL'
+
+    def _row(self, cells, score):
+        row = dict(zip(self.fieldnames, cells))
+        row['score'] = score
+        return row
+
+    def iter_rows(self):
+        """Stored records in file order, as `stream_ranker.iter_rows` reads them from a CSV."""
+        cursor = self.conn.execute(f'SELECT {self._cells()} FROM lawyers l ORDER BY l.row_id')
+        for rows in iter(lambda: cursor.fetchmany(FETCH_ROWS), []):
+            for cells in rows:
+                yield dict(zip(self.fieldnames, cells))
+
+    def iter_ranked(self, pairs, after=None, count=None, offset=0):
+        """
+        Yield `(row_id, row)` in rank order (descending score, ties in file
+        order), walking the rank index: after the cursor `after`, skipping
+        `offset` rows and stopping after `count` rows counted from the cursor.
+        """
+        set_id = self.score_set(pairs)
+        where, params = 's.set_id = ?', [set_id]
+        if after is not None:
+            where += ' AND (s.score < ? OR (s.score = ? AND s.row_id > ?))'
+            params += [after[0], after[0], after[1]]
+        params += [-1 if count is None else max(count - offset, 0), offset]
+        cursor = self.conn.execute(
+            f'SELECT s.row_id, s.score, {self._cells()} FROM scores s JOIN lawyers l ON l.row_id = s.row_id '
+            f'WHERE {where} ORDER BY s.score DESC, s.row_id LIMIT ? OFFSET ?', params)
+        for rows in iter(lambda: cursor.fetchmany(FETCH_ROWS), []):
+            for row_id, score, *cells in rows:
+                yield row_id, self._row(cells, score)
+
+    def rank(self, pairs, top_k=None, offset=0, limit=None, after=None):
+        """One page of the ranking under `pairs`, shaped like `ranker.build_page`."""
+        total = remaining = self.count()
+        if after is not None:
+            remaining = self.conn.execute(
+                'SELECT COUNT(*) FROM scores WHERE set_id = ? AND (score < ? OR (score = ? AND row_id > ?))',
+                (self.score_set(pairs), after[0], after[0], after[1])).fetchone()[0]
+        with stage('sort'):
+            selected = list(self.iter_ranked(pairs, after, page_size(top_k, offset, limit, after), offset))
+        items = [row for _, row in selected]
+        last_index = selected[-1][0] if selected else None
+        return build_page(items, total, remaining, top_k, offset, limit, after, last_index)
+
+    def query(self, pairs, sort_by=None, descending=True, filters=(), top_k=None, offset=0, limit=None,
+              fields=None):
+        """
+        `query.RankedIndex.query` answered in SQL: the same page of the
+        ranking under `pairs`, filtered by `query.parse_filter` expressions
+        and sorted by `sort_by` (ties in rank order, blanks last), with the
+        same errors for unknown or non-numeric columns.
+        """
+        known = self.fieldnames + ['score']
+        for column in ([sort_by] if sort_by else []) + list(fields or []) + [f[0] for f in filters]:
+            if column not in known:
+                raise ValueError(f"Unknown column {column!r}")
+        numeric = set(numeric_columns(self.fieldnames, self.schema())) | {'score'}
+        set_id = self.score_set(pairs)
+
+        params = []
+        source = 'scores s'
+        if top_k is not None:
+            # only rows ranked within top_k can match
+            source = '(SELECT set_id, row_id, score FROM scores WHERE set_id = ? ' \
+                     'ORDER BY score DESC, row_id LIMIT ?) s'
+            params += [set_id, top_k]
+        conditions = ['s.set_id = ?']
+        params.append(set_id)
+        equals = {}
+        for column, op, value in filters:
+            if op == '=':
+                equals.setdefault(column, []).append(value)
+                continue
+            if column not in numeric:
+                raise ValueError(f"Column {column!r} is not numeric")
+            conditions.append(f'{self._number(column)} {op} ?')
+            params.append(value)
+        for column, values in equals.items():
+            condition, values = self._equals(column, list(dict.fromkeys(values)))
+            conditions.append(condition)
+            params += values
+
+        if sort_by is None or (sort_by == 'score' and descending):
+            order = 's.score DESC, s.row_id'
+        elif sort_by == 'score':
+            order = 's.score, s.row_id'
+        else:
+            key = self._number(sort_by) if sort_by in numeric else f'casefold(l.c{self._positions[sort_by]})'
+            order = f"{key} IS NULL, {key} {'DESC' if descending else 'ASC'}, s.score DESC, s.row_id"
+
+        body = f"FROM {source} JOIN lawyers l ON l.row_id = s.row_id WHERE {' AND '.join(conditions)}"
+        total = self.conn.execute(f'SELECT COUNT(*) {body}', params).fetchone()[0]
+        rows = self.conn.execute(
+            f'SELECT s.score, {self._cells()} {body} ORDER BY {order} LIMIT ? OFFSET ?',
+            params + [-1 if limit is None else limit, offset]).fetchall()
+        items = [self._row(cells, score) for score, *cells in rows]
+        if fields:
+            items = [{f: row.get(f) for f in fields} for row in items]
+        return {
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'next_cursor': None,
+            'items': items,
+        }
+
+    def _number(self, column):
+        return 's.score' if column == 'score' else f'l.n{self._positions[column]}'
+
+    def _equals(self, column, values):
+        """Condition matching cells equal to any of `values` as text (a missing cell equals '')."""
+        if column == 'score':
+            # scores are compared as the text of the float, as `RankedIndex` does
+            matches = []
+            for value in values:
+                number = parse_cell(value)
+                if number is not None and str(number) == value:
+                    matches.append(number)
+            return f"s.score IN ({', '.join('?' * len(matches))})", matches
+        cell = f'l.c{self._positions[column]}'
+        condition = f"{cell} IN ({', '.join('?' * len(values))})"
+        if '' in values:
+            condition = f'({condition} OR {cell} IS NULL)'
+        return condition, values
+
+
+def is_database(path):
+    return str(path).endswith(DB_SUFFIXES)
+
+
+def read_fieldnames(path):
+    """The field names of a database, like `stream_ranker.read_fieldnames` for a CSV."""
+    with LawyerStore(path) as store:
+        return list(store.fieldnames)
+
+
+def import_csv(csv_path, db_path, key_columns=None, batch_rows=BATCH_ROWS):
+    """
+    Upsert the rows of a lawyer CSV into a database (created if needed),
+    normalized as the ranker reads them. Returns the number of rows written.
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, [])
+        with LawyerStore(db_path, normalize_fieldnames(header), key_columns, batch_rows) as store:
+            return store.upsert(row_dicts(reader, header))
+
+
+def export_csv(db_path, csv_path):
+    """Write the records of a database to a CSV in file order; returns the number of rows."""
+    with LawyerStore(db_path) as store:
+        with atomic_write(csv_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(store.fieldnames)
+            written = 0
+            for row in store.iter_rows():
+                writer.writerow(row.values())
+                written += 1
+    return written
+
+
+def rank_file_db(input_file, config_file=None, top_k=None, offset=0, limit=None, after=None):
+    """
+    Rank a database with its stored scores; returns the same `(page,
+    fieldnames)` pair as the CSV engines, with identical scores and tie
+    order. Only the requested page is read.
+    """
+    with LawyerStore(input_file) as store:
+        pairs = store.weight_pairs(config_file)
+        return store.rank(pairs, top_k, offset, limit, after), list(store.fieldnames)
+
+
+def query_file(input_file, config_file=None, sort_by=None, descending=True, filters=(), top_k=None, offset=0,
+               limit=None, fields=None):
+    """`LawyerStore.query` of a database under the weights of `config_file`."""
+    with LawyerStore(input_file) as store:
+        return store.query(store.weight_pairs(config_file), sort_by, descending, filters, top_k, offset, limit,
+                           fields)
+
+
+def iter_ranked(input_file, config_file=None, top_k=None, offset=0, limit=None):
+    """Ranked rows one at a time, like `stream_ranker.iter_ranked` for a CSV."""
+    with LawyerStore(input_file) as store:
+        pairs = store.weight_pairs(config_file)
+        for _, row in store.iter_ranked(pairs, None, page_size(top_k, offset, limit), offset):
+            yield row
+
+
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser(description='Store lawyer records in SQLite and rank them there.')
+    commands = cli.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help='upsert a lawyer CSV into a database')
+    importer.add_argument('csv_path')
+    importer.add_argument('db_path')
+    importer.add_argument('--key', nargs='*', default=None, help='columns identifying a lawyer (default: append)')
+    exporter = commands.add_parser('export', help='write a database back to CSV')
+    exporter.add_argument('db_path')
+    exporter.add_argument('-o', '--output', default=None)
+    ranking = commands.add_parser('rank', help='print the top of the ranking')
+    ranking.add_argument('db_path')
+    ranking.add_argument('--config', default=None, help='JSON weights file')
+    ranking.add_argument('--top-k', type=int, default=20)
+    args = cli.parse_args()
+
+    if args.command == 'import':
+        n = import_csv(args.csv_path, args.db_path, args.key)
+        print(f"Wrote {n} rows to {args.db_path}")
+    elif args.command == 'export':
+        output = args.output or os.path.splitext(args.db_path)[0] + '.csv'
+        n = export_csv(args.db_path, output)
+        print(f"Wrote {n} rows to {output}")
+    else:
+        page, _ = rank_file_db(args.db_path, args.config, top_k=args.top_k)
+        for i, lawyer in enumerate(page['items']):
+            print(f"{i+1}. {lawyer.get('Name', lawyer.get('name', ''))} (Score: {lawyer['score']})")
@@ -1,19 +1,62 @@
-from scraper import scrape_lawyers
+import argparse
+from crawler import add_cache_arguments, cache_from_args, crawl, state_url
+from dedup import dedup_files
+from pipeline import DEFAULT_TOP_K, run_pipeline
+from scraper import save_lawyers_csv, scrape_lawyers
 from ranker import rank_lawyers
 
-def main():
+DEFAULT_URL = "https://www.justia.com/lawyers/maryland"
+
+
+def scrape_then_rank(states=None, max_pages=None, workers=8, cache=None, dedup=False):
+    """Scrape everything to lawyers.csv (merging duplicate lawyers if `dedup`), then rank that file."""
+    # Step 1: Scrape the data
+    if states:
+        lawyers = crawl([state_url(state) for state in states], max_pages=max_pages, max_workers=workers,
+                        cache=cache)
+        save_lawyers_csv(lawyers)
+        print(f"Crawled {len(lawyers)} lawyers from {len(states)} states")
+    else:
+        scrape_lawyers(DEFAULT_URL, cache)
+
+    input_csv_file = "lawyers.csv"
+    if dedup:
+        read, written = dedup_files([input_csv_file], input_csv_file)
+        print(f"Merged {read} records into {written} lawyers")
+
+    # Step 2: Rank the data
+    return rank_lawyers(input_csv_file)
+
+
+def main(states=None, max_pages=None, workers=8, cache=None, pipeline=False, top_k=DEFAULT_TOP_K,
+         write_csv=True, dedup=False):
     """
     Main function to orchestrate the scraping and ranking.
+
+    By default a single Maryland listing page is scraped. With `states`, every
+    listed state directory is crawled concurrently, following pagination up to
+    `max_pages` pages each. A `http_cache.PageCache` makes repeated runs
+    revalidate pages instead of downloading and parsing them again.
+
+    With `pipeline`, records are ranked while pages are still being fetched
+    (see `pipeline`), the progress output shows a running top-`top_k`, and
+    lawyers.csv is only written if `write_csv` is true. The ranking is the same.
+
+    With `dedup`, the same lawyer listed more than once (e.g. under several
+    states) is merged into one record before ranking (see `dedup`). It needs
+    every record first, so it cannot be combined with `pipeline`.
     """
+    if pipeline and dedup:
+        raise ValueError("dedup needs the whole crawl and cannot be combined with pipeline")
     print("Starting the lawyer ranking process...")
 
-    # Step 1: Scrape the data
-    target_url = "https://www.justia.com/lawyers/maryland"
-    scrape_lawyers(target_url)
-
-    # Step 2: Rank the data
-    input_csv_file = "lawyers.csv"
-    ranked_lawyers = rank_lawyers(input_csv_file)
+    if pipeline:
+        urls = [state_url(state) for state in states] if states else [DEFAULT_URL]
+        # without states only the first listing page is scraped, as scrape_lawyers does
+        ranked_lawyers = run_pipeline(urls, max_pages=max_pages if states else 1, workers=workers, top_k=top_k,
+                                      csv_path="lawyers.csv" if write_csv else None, cache=cache)
+    else:
+        ranked_lawyers = scrape_then_rank(states, max_pages, workers, cache, dedup)
 
     # Step 3: Display the results
     if ranked_lawyers:
@@ -31,4 +74,17 @@ def main():
     print("Lawyer ranking process complete.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Scrape and rank lawyers.')
+    parser.add_argument('--states', nargs='*', default=None, help='state slugs to crawl, e.g. maryland california')
+    parser.add_argument('--max-pages', type=int, default=None, help='pages to follow per state')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--pipeline', action='store_true', help='rank pages while they are being fetched')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='lawyers shown in pipeline progress')
+    parser.add_argument('--skip-csv', action='store_true', help='with --pipeline, do not write lawyers.csv')
+    parser.add_argument('--dedup', action='store_true', help='merge duplicate lawyers before ranking')
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    if args.dedup and args.pipeline:
+        parser.error('--dedup cannot be combined with --pipeline')
+    main(args.states, args.max_pages, args.workers, cache_from_args(args), args.pipeline, args.top_k,
+         not args.skip_csv, args.dedup)
@@ -0,0 +1,215 @@
+import contextvars
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+# Histogram buckets (seconds) for ranking stages and HTTP requests
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Seconds between stack samples taken by `Sampler`
+SAMPLE_INTERVAL = 0.005
+
+HELP = {
+    'lawyer_rank_stage_seconds': 'Time spent in each ranking stage.',
+    'lawyer_rows_ranked_total': 'Rows scored by rankings, by engine.',
+    'lawyer_bytes_written_total': 'Bytes of ranked artifacts written, by kind.',
+    'lawyer_http_request_seconds': 'HTTP request latency, by route and status.',
+    'lawyer_scrape_cache_total': 'Scraper page cache outcomes (fetched, not_modified, unchanged, parsed, reused).',
+}
+
+
+class Registry:
+    """
+    Thread-safe counters and histograms, rendered in the Prometheus text
+    exposition format. Series are identified by a name and sorted label pairs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(DURATION_BUCKETS), 0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def value(self, name, **labels):
+        """Current value of a counter, or `(count, sum)` of a histogram; 0 when unset."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key in self._histograms:
+                _, total, count = self._histograms[key]
+                return count, total
+            return self._counters.get(key, 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """The registry in Prometheus text format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._histograms.items())
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# HELP {name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), (buckets, total, count) in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# HELP {name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} histogram')
+            for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", repr(bound)),))} {bucket_count}')
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+REGISTRY = Registry()
+
+# Events recorded while capturing (see `capture`), instead of updating the registry
+_captured = contextvars.ContextVar('metrics_captured', default=None)
+
+# `(stage, seconds)` pairs of the current HTTP request, for its Server-Timing header
+_timings = contextvars.ContextVar('metrics_timings', default=None)
+
+
+def inc(name, value=1, **labels):
+    """Add to a counter (or to the events being captured)."""
+    events = _captured.get()
+    if events is not None:
+        events.append(('inc', name, value, labels))
+    else:
+        REGISTRY.inc(name, value, **labels)
+
+
+def observe_stage(name, seconds):
+    """Record the duration of one ranking stage."""
+    events = _captured.get()
+    if events is not None:
+        events.append(('stage', name, seconds, None))
+        return
+    REGISTRY.observe('lawyer_rank_stage_seconds', seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as ranking stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def capture():
+    """
+    Collect the metrics recorded in the enclosed block as a picklable list of
+    events instead of applying them, so work done in another process can be
+    `replay`ed into this one.
+    """
+    events = []
+    token = _captured.set(events)
+    try:
+        yield events
+    finally:
+        _captured.reset(token)
+
+
+def replay(events):
+    for kind, name, value, labels in events:
+        if kind == 'inc':
+            inc(name, value, **labels)
+        else:
+            observe_stage(name, value)
+
+
+@contextmanager
+def request_timings():
+    """Collect the stage timings of the enclosed request."""
+    timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def server_timing(timings, total=None):
+    """Format `(stage, seconds)` pairs as a Server-Timing header value; repeated stages are summed."""
+    summed = {}
+    for name, seconds in timings:
+        summed[name] = summed.get(name, 0.0) + seconds
+    if total is not None:
+        summed['total'] = total
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in summed.items())
+
+
+class Sampler:
+    """
+    Samples the stack of one thread every `interval` seconds from a
+    background thread, and reports the samples as collapsed stacks
+    (`frame;frame;frame count` lines, the input of flamegraph tools).
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            self.stacks[';'.join(f'{f.name} ({f.filename.rsplit("/", 1)[-1]}:{f.lineno})' for f in stack)] += 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
@@ -0,0 +1,211 @@
+import csv
+
+import numpy as np
+
+from metrics import stage
+from ranker import (
+    build_page,
+    header_positions,
+    load_weights,
+    normalize_fieldnames,
+    page_size,
+    scoring_weights,
+)
+
+
+def _to_float(value):
+    """Parse one cell the way the row-wise ranker does; blanks and junk are 0.0."""
+    if value is None or value == '':
+        return 0.0
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def column_to_array(values):
+    """
+    Convert a column of CSV cells to a float64 array.
+
+    Clean columns go through a single C-level conversion; columns containing
+    blanks, missing cells or non-numeric text fall back to a memoized per-value
+    conversion (metric columns have few distinct values, so this stays cheap).
+    """
+    try:
+        return np.fromiter(map(float, values), dtype=np.float64, count=len(values))
+    except (ValueError, TypeError):
+        pass
+    memo = {}
+    out = np.empty(len(values), dtype=np.float64)
+    for i, v in enumerate(values):
+        x = memo.get(v)
+        if x is None:
+            x = memo[v] = _to_float(v)
+        out[i] = x
+    return out
+
+
+class LawyerTable:
+    """
+    A lawyer CSV held column-wise, with numeric columns converted to a
+    contiguous float matrix on demand.
+
+    Column values keep the exact strings read from the file (or None for cells
+    missing from short rows, matching `csv.DictReader`), so rows rebuilt from the
+    table are identical to the dicts produced by `ranker.rank_lawyers`.
+    """
+
+    def __init__(self, fieldnames, columns, n_rows, source=None):
+        self.fieldnames = fieldnames
+        self.columns = columns
+        self.n_rows = n_rows
+        self.source = source
+        self._arrays = {}
+
+    @classmethod
+    def from_csv(cls, input_file):
+        with open(input_file, 'r', encoding='utf-8', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader, [])
+            # csv.DictReader skips blank lines; do the same
+            rows = [row for row in reader if row]
+
+        width = len(header)
+        for i, row in enumerate(rows):
+            if len(row) < width:
+                rows[i] = row + [None] * (width - len(row))
+
+        # Normalize headers once: trim whitespace and skip empty header columns
+        positions = header_positions(header)
+        fieldnames = normalize_fieldnames(header)
+
+        transposed = list(zip(*rows)) if rows else [() for _ in header]
+        columns = {name: list(transposed[i]) if rows else [] for name, i in positions.items()}
+        return cls(fieldnames, columns, len(rows), input_file)
+
+    def detect_numeric_columns(self):
+        """Numeric columns per the (cached) inferred schema of the source file."""
+        from schema import infer_schema, load_schema, numeric_columns
+        schema = load_schema(self.source, self.columns) if self.source else infer_schema(self.columns)
+        return numeric_columns(self.fieldnames, schema)
+
+    def column_array(self, name):
+        """Return (and cache) the float64 array for a column; unknown columns are all zero."""
+        arr = self._arrays.get(name)
+        if arr is None:
+            values = self.columns.get(name)
+            arr = column_to_array(values) if values is not None else np.zeros(self.n_rows)
+            self._arrays[name] = arr
+        return arr
+
+    def feature_matrix(self, names):
+        """Stack the requested columns into a column-contiguous (n_rows, len(names)) matrix."""
+        matrix = np.empty((self.n_rows, len(names)), dtype=np.float64, order='F')
+        for j, name in enumerate(names):
+            matrix[:, j] = self.column_array(name)
+        return matrix
+
+    def rows(self, order, scores):
+        """Rebuild normalized row dicts (plus `score`) in the given index order."""
+        names = list(self.columns)
+        cols = [self.columns[name] for name in names]
+        out = []
+        for i, score in zip(order.tolist(), scores[order].tolist()):
+            row = {name: col[i] for name, col in zip(names, cols)}
+            row['score'] = score
+            out.append(row)
+        return out
+
+
+def compute_scores(matrix, weights):
+    """
+    Matrix-weight-vector product `matrix @ weights`.
+
+    Contributions are accumulated column by column in configuration order,
+    which is the same sequence of float operations the row-wise ranker performs,
+    so scores (and therefore tie order) match it exactly.
+    """
+    scores = np.zeros(matrix.shape[0], dtype=np.float64)
+    for j, w in enumerate(weights):
+        scores += matrix[:, j] * w
+    return scores
+
+
+def rank_indices(scores, top_k=None):
+    """
+    Return row indices ordered by descending score, ties in original row order
+    (the order a stable `sorted(..., reverse=True)` produces).
+
+    With `top_k`, only the best `top_k` rows are selected with `argpartition`
+    and just those are sorted.
+    """
+    keys = -scores
+    n = len(keys)
+    if top_k is None or top_k >= n:
+        return np.argsort(keys, kind='stable')
+    if top_k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth = keys[np.argpartition(keys, top_k - 1)[top_k - 1]]
+    if np.isnan(kth):
+        candidates = np.arange(n)
+    else:
+        # everything strictly better than the k-th key plus every row tied with it,
+        # so ties at the boundary are resolved by row order
+        candidates = np.flatnonzero(keys <= kth)
+    order = candidates[np.argsort(keys[candidates], kind='stable')]
+    return order[:top_k]
+
+
+def score_table(table, weights, use_autodetect):
+    """Score every row of a loaded table."""
+    numeric_columns = table.detect_numeric_columns() if use_autodetect else []
+    pairs = scoring_weights(weights, use_autodetect, numeric_columns)
+    matrix = table.feature_matrix([col for col, _ in pairs])
+    return compute_scores(matrix, [w for _, w in pairs])
+
+
+def rank_table(table, weights, use_autodetect, top_k=None):
+    """Score a loaded table and return `(order, scores)` arrays."""
+    scores = score_table(table, weights, use_autodetect)
+    return rank_indices(scores, top_k), scores
+
+
+def select_page(scores, top_k=None, offset=0, limit=None, after=None):
+    """
+    Vectorized counterpart of `ranker.select_ranked`: returns the row indices of
+    one page and the number of rows ranked after the cursor.
+    """
+    candidates = None
+    if after is not None:
+        keys = -scores
+        after_key = -after[0]
+        rows = np.arange(len(scores))
+        candidates = np.flatnonzero((keys > after_key) | ((keys == after_key) & (rows > after[1])))
+        scores = scores[candidates]
+    order = rank_indices(scores, page_size(top_k, offset, limit, after))
+    if candidates is not None:
+        order = candidates[order]
+    return order[offset:], len(scores)
+
+
+def rank_table_page(table, weights, use_autodetect, top_k=None, offset=0, limit=None, after=None):
+    """Score a loaded table and return one page as built by `ranker.build_page`."""
+    with stage('score'):
+        scores = score_table(table, weights, use_autodetect)
+    with stage('sort'):
+        order, remaining = select_page(scores, top_k, offset, limit, after)
+    items = table.rows(order, scores)
+    last_index = int(order[-1]) if len(order) else None
+    return build_page(items, table.n_rows, remaining, top_k, offset, limit, after, last_index)
+
+
+def rank_file_numpy(input_file, config_file=None, top_k=None, offset=0, limit=None, after=None):
+    """
+    Columnar equivalent of the row-wise ranking in `ranker`: returns the same
+    `(page, fieldnames)` pair, building row dicts only for the selected page.
+    """
+    weights, use_autodetect = load_weights(config_file)
+    with stage('parse'):
+        table = LawyerTable.from_csv(input_file)
+    page = rank_table_page(table, weights, use_autodetect, top_k, offset, limit, after)
+    return page, table.fieldnames
@@ -0,0 +1,216 @@
+import argparse
+import csv
+import heapq
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from operator import itemgetter
+
+from metrics import capture, replay, stage
+from ranker import build_page, page_size, score_lawyer
+from stream_ranker import read_fieldnames, row_dicts, stream_weight_pairs
+
+# Worker processes for sharded rankings (1 ranks in-process)
+PARALLEL_WORKERS = int(os.environ.get('RANK_PARALLEL_WORKERS', os.cpu_count() or 1))
+
+# Shards smaller than this are not worth a process of their own
+MIN_SHARD_BYTES = 4 * 2 ** 20
+
+# Bytes read at a time while scanning for shard boundaries
+SCAN_BLOCK = 2 ** 20
+
+
+def _next_line_start(f, pos, quoted):
+    """
+    Offset just past the first newline at or after `pos` that ends a record
+    (is outside a quoted field), or the end of the file. `quoted` is the
+    quoting state at `pos`; every '"' toggles it, which also holds for
+    doubled quotes inside a quoted field.
+    """
+    f.seek(pos)
+    while True:
+        block = f.read(SCAN_BLOCK)
+        if not block:
+            return pos
+        i = 0
+        while True:
+            nl = block.find(b'\n', i)
+            if nl < 0:
+                quoted ^= block.count(b'"', i) & 1
+                break
+            quoted ^= block.count(b'"', i, nl) & 1
+            if not quoted:
+                return pos + nl + 1
+            i = nl + 1
+        pos += len(block)
+
+
+def _quote_parity(f, start, end):
+    """Parity of the '"' bytes in `[start, end)`."""
+    f.seek(start)
+    parity = 0
+    while start < end:
+        block = f.read(min(SCAN_BLOCK, end - start))
+        if not block:
+            break
+        parity ^= block.count(b'"') & 1
+        start += len(block)
+    return parity
+
+
+def shard_ranges(input_file, shards):
+    """
+    Split the rows of a CSV into at most `shards` byte ranges `(start, end)`
+    of roughly equal size, each starting on a record boundary, so every
+    shard parses on its own exactly as it would inside the whole file.
+    The header line is excluded.
+    """
+    size = os.path.getsize(input_file)
+    with open(input_file, 'rb') as f:
+        data_start = _next_line_start(f, 0, False)
+        cuts = [data_start]
+        quoted = False
+        for k in range(1, shards):
+            target = data_start + (size - data_start) * k // shards
+            if target <= cuts[-1]:
+                continue
+            quoted ^= _quote_parity(f, cuts[-1], target)
+            cut = _next_line_start(f, target, quoted)
+            if cut >= size:
+                break
+            # the record ending at `cut` closed every open quote
+            quoted = False
+            cuts.append(cut)
+    cuts.append(size)
+    return [(start, end) for start, end in zip(cuts, cuts[1:]) if end > start]
+
+
+def rank_shard(input_file, header, start, end, weight_pairs, count=None, after_score=None):
+    """
+    Parse and score the rows in one byte range of a CSV. Returns `(rows,
+    below, run)`: the number of rows in the shard, how many of them score
+    below `after_score`, and the shard's ranking.
+
+    Without a page size or cursor the run is every row dict, sorted by
+    descending score with ties in file order. Otherwise it is a list of
+    `(-score, local_index, row)` in rank order: the best `count` rows or,
+    with `after_score`, the best `count` rows scoring below it plus every row
+    scoring exactly `after_score`, since whether those follow the cursor
+    depends on their position in the whole file.
+    """
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    reader = csv.reader(io.StringIO(text, newline=''))
+    with stage('parse'):
+        rows = list(row_dicts(reader, header))
+    with stage('score'):
+        for row in rows:
+            row['score'] = score_lawyer(row, weight_pairs)
+    total = len(rows)
+    if count is None and after_score is None:
+        with stage('sort'):
+            rows.sort(key=itemgetter('score'), reverse=True)
+        return total, total, rows
+
+    items = [(-row['score'], i, row) for i, row in enumerate(rows)]
+    ties = []
+    if after_score is not None:
+        ties = [item for item in items if -item[0] == after_score]
+        items = [item for item in items if -item[0] < after_score]
+    key = itemgetter(0, 1)
+    with stage('sort'):
+        run = heapq.nsmallest(count, items, key=key) if count is not None else sorted(items, key=key)
+    return total, len(items), ties + run
+
+
+def _captured_shard(*task):
+    with capture() as events:
+        result = rank_shard(*task)
+    return result, events
+
+
+def _map_shards(tasks, workers):
+    """`rank_shard(*task)` for every task, on a process pool unless there is a single worker or task."""
+    if workers <= 1 or len(tasks) <= 1:
+        return [rank_shard(*task) for task in tasks]
+    # spawn, not fork: callers such as the server run threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(min(workers, len(tasks)), mp_context=context) as pool:
+        outcomes = list(pool.map(_captured_shard, *zip(*tasks)))
+    results = []
+    for result, events in outcomes:
+        # stage timings recorded in the workers count in this process
+        replay(events)
+        results.append(result)
+    return results
+
+
+def rank_file_parallel(input_file, config_file=None, top_k=None, offset=0, limit=None, after=None,
+                       workers=None):
+    """
+    Sharded counterpart of the row-wise ranking in `ranker`: returns the same
+    `(page, fieldnames)` pair, with identical scores and tie order. The file
+    is cut into byte-range shards (see `shard_ranges`) that `workers`
+    processes parse and score independently, each returning a sorted run (or
+    its local top rows). The runs are k-way merged on score and file-wide row
+    index, so ties keep their original file order.
+    """
+    workers = workers or PARALLEL_WORKERS
+    with open(input_file, 'r', encoding='utf-8', newline='') as csvfile:
+        header = next(csv.reader(csvfile), [])
+    fieldnames = read_fieldnames(input_file)
+    pairs = stream_weight_pairs(input_file, config_file)
+    shards = max(1, min(workers, os.path.getsize(input_file) // MIN_SHARD_BYTES))
+    ranges = shard_ranges(input_file, shards)
+
+    count = page_size(top_k, offset, limit, after)
+    after_score = after[0] if after is not None else None
+    results = _map_shards([(input_file, header, start, end, pairs, count, after_score) for start, end in ranges],
+                          workers)
+
+    if count is None and after is None:
+        total = sum(rows for rows, _, _ in results)
+        # each run is sorted; timsort merges presorted runs, and its stability keeps ties in shard order
+        with stage('sort'):
+            ranked = sorted(chain.from_iterable(run for _, _, run in results), key=itemgetter('score'),
+                            reverse=True)
+        return build_page(ranked, total, total), fieldnames
+
+    runs = []
+    total = remaining = 0
+    for rows, below, run in results:
+        # local indices become file-wide row indices, which break ties
+        run = [(neg_score, total + i, row) for neg_score, i, row in run]
+        if after is not None:
+            # rows tied with the cursor's score follow it only if they come later in the file
+            run = [item for item in run if -item[0] < after_score or item[1] > after[1]]
+            remaining += below + sum(1 for item in run if -item[0] == after_score)
+        else:
+            remaining += rows
+        total += rows
+        runs.append(run)
+
+    merged = heapq.merge(*runs, key=itemgetter(0, 1))
+    selected = list(islice(merged, count)) if count is not None else list(merged)
+    selected = selected[offset:]
+
+    items = [row for _, _, row in selected]
+    last_index = selected[-1][1] if selected else None
+    page = build_page(items, total, remaining, top_k, offset, limit, after, last_index)
+    return page, fieldnames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rank a lawyer CSV on several processes.')
+    parser.add_argument('input_file')
+    parser.add_argument('--config', default=None, help='JSON weights file')
+    parser.add_argument('--top-k', type=int, default=None, help='only rank the best K lawyers')
+    parser.add_argument('--workers', type=int, default=PARALLEL_WORKERS)
+    args = parser.parse_args()
+
+    page, _ = rank_file_parallel(args.input_file, args.config, top_k=args.top_k, workers=args.workers)
+    for i, lawyer in enumerate(page['items'][:20]):
+        print(f"{i+1}. {lawyer.get('Name', lawyer.get('name', ''))} (Score: {lawyer['score']})")
@@ -0,0 +1,209 @@
+"""
+Scrape and rank in one pass.
+
+`run_pipeline` ranks records while the crawler is still fetching: parsed pages
+flow from the crawler threads to the ranker through a bounded queue, a running
+top-K is kept as records arrive, and the intermediate CSV is written (if at
+all) on the way. The result is the same as crawling to `lawyers.csv` and
+ranking that file:
+
+    python main.py --pipeline --states maryland california --top-k 10 [--skip-csv]
+"""
+import csv
+import heapq
+import queue
+import threading
+import time
+from contextlib import ExitStack
+
+from crawler import iter_crawl
+from ranker import atomic_write, load_weights, output_fieldnames, score_lawyer, scoring_weights, write_ranked_outputs
+from schema import infer_schema, numeric_columns
+from scraper import FIELDNAMES
+
+# Parsed pages held between the crawler and the ranker; the crawler waits while it is full
+QUEUE_PAGES = 16
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+
+DEFAULT_TOP_K = 10
+
+_DONE = object()
+
+
+class StageStats:
+    """Items handled by one pipeline stage and the seconds it was busy."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.seconds = 0.0
+
+    def add(self, items, seconds):
+        self.items += items
+        self.seconds += seconds
+
+    def rate(self):
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return f"{self.name}: {self.items} {self.unit} in {self.seconds:.2f}s ({self.rate():.1f} {self.unit}/s)"
+
+
+class CrawlOrder:
+    """
+    Releases pages in start-URL and page order (the order `crawler.crawl`
+    returns records in), holding back pages that complete early.
+    """
+
+    def __init__(self):
+        self._next = (0, 0)
+        self._held = {}
+
+    def push(self, page):
+        """Add a completed page; returns the pages that can now be released, in order."""
+        self._held[(page.listing, page.page)] = page
+        ready = []
+        while self._next in self._held:
+            page = self._held.pop(self._next)
+            ready.append(page)
+            self._next = (page.listing + 1, 0) if page.last else (page.listing, page.page + 1)
+        return ready
+
+
+def _produce(pages, out, stop):
+    """Move crawled pages into the bounded queue `out`, ending with `_DONE` (or the exception raised)."""
+    try:
+        for page in pages:
+            while not stop.is_set():
+                try:
+                    out.put(page, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+        out.put(_DONE)
+    except Exception as e:
+        out.put(e)
+    finally:
+        pages.close()
+
+
+def run_pipeline(start_urls, max_pages=None, workers=8, top_k=DEFAULT_TOP_K, csv_path='lawyers.csv',
+                 config_file=None, cache=None, write_output=True, progress=print, min_interval=1.0):
+    """
+    Crawl `start_urls` (see `crawler.iter_crawl`) and rank the records as
+    pages arrive. Returns the full ranking, identical to `rank_lawyers` on the
+    CSV that `crawl` + `save_lawyers_csv` would have written: values are the
+    same strings, and ties keep crawl order. That CSV is still written to
+    `csv_path` unless it is None, and the ranked artifacts are written when
+    `write_output` is true.
+
+    `progress` receives a line every PROGRESS_INTERVAL seconds with the
+    running top-`top_k`, and a throughput summary per stage at the end;
+    pass None for silence. Without a config, the autodetected score columns
+    are inferred from the first page with records, which for scraper output
+    (fixed columns, integer `description_length`) matches inferring them
+    from the file.
+    """
+    weights, use_autodetect = load_weights(config_file)
+    pairs = None
+    stats = {
+        'fetch': StageStats('fetch', 'pages'),
+        'parse': StageStats('parse', 'records'),
+        'rank': StageStats('rank', 'records'),
+        'write': StageStats('write', 'rows'),
+    }
+    ranked = []
+    top = []
+    fieldnames = None
+    order = CrawlOrder()
+    pages = queue.Queue(QUEUE_PAGES)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce, name='pipeline-crawl', daemon=True,
+        args=(iter_crawl(start_urls, max_pages, workers, min_interval, cache=cache), pages, stop))
+
+    started = last_report = time.perf_counter()
+    writer = None
+    with ExitStack() as stack:
+        if csv_path:
+            writer = csv.DictWriter(stack.enter_context(atomic_write(csv_path, 'w', newline='', encoding='utf-8')),
+                                    fieldnames=FIELDNAMES)
+            writer.writeheader()
+        producer.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is _DONE:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                stats['fetch'].add(1, page.fetch_seconds)
+                stats['parse'].add(len(page.records), page.parse_seconds)
+
+                began = time.perf_counter()
+                if page.records and pairs is None:
+                    fieldnames = list(page.records[0])
+                    columns = {name: [_cell(r.get(name)) for r in page.records] for name in fieldnames}
+                    numeric = numeric_columns(fieldnames, infer_schema(columns)) if use_autodetect else []
+                    pairs = scoring_weights(weights, use_autodetect, numeric)
+                for i, record in enumerate(page.records):
+                    # the values `rank_lawyers` would read back from the CSV
+                    row = {name: _cell(value) for name, value in record.items()}
+                    row['score'] = score_lawyer(row, pairs)
+                    key = (page.listing, page.page, i)
+                    ranked.append((key, row))
+                    # min-heap of the best `top_k`: lowest score, then latest in crawl order, on top
+                    entry = (row['score'], (-key[0], -key[1], -key[2]), row)
+                    if len(top) < top_k:
+                        heapq.heappush(top, entry)
+                    elif top_k and entry[:2] > top[0][:2]:
+                        heapq.heapreplace(top, entry)
+                stats['rank'].add(len(page.records), time.perf_counter() - began)
+
+                if writer is not None:
+                    began = time.perf_counter()
+                    rows = 0
+                    for ready in order.push(page):
+                        writer.writerows(ready.records)
+                        rows += len(ready.records)
+                    stats['write'].add(rows, time.perf_counter() - began)
+
+                now = time.perf_counter()
+                if progress is not None and now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    progress(_progress_line(stats, top, now - started))
+        finally:
+            stop.set()
+            producer.join()
+
+    began = time.perf_counter()
+    ranked.sort(key=lambda item: (-item[1]['score'], item[0]))
+    ranked = [row for _, row in ranked]
+    stats['rank'].add(0, time.perf_counter() - began)
+    if write_output and ranked:
+        write_ranked_outputs(output_fieldnames(fieldnames, ranked), ranked)
+
+    if progress is not None:
+        progress(_progress_line(stats, top, time.perf_counter() - started))
+        for stage in stats.values():
+            progress(f"  {stage}")
+    return ranked
+
+
+def _cell(value):
+    return '' if value is None else str(value)
+
+
+def _progress_line(stats, top, elapsed):
+    """Throughput so far, then one line per entry of the running top-K, best first."""
+    records = stats['rank'].items
+    lines = [f"[{elapsed:6.1f}s] {stats['fetch'].items} pages, {records} records ranked "
+             f"({records / elapsed if elapsed else 0.0:.1f} records/s)"]
+    for place, (score, _, row) in enumerate(sorted(top, key=lambda entry: entry[:2], reverse=True), start=1):
+        lines.append(f"  #{place:<3} {row.get('name', '')} ({score})")
+    return '\n'.join(lines)
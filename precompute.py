@@ -0,0 +1,240 @@
+import bisect
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import inc, stage
+from query import RankedIndex
+from ranker import build_page, output_fieldnames, page_size, score_file, select_ranked
+from ranking_cache import config_fingerprint, file_fingerprint
+from schema import save_schema
+
+# Seconds between checks of the watched files for changes
+POLL_INTERVAL = float(os.environ.get('PRECOMPUTE_INTERVAL', 2))
+
+# (file, config) pairs kept precomputed; the least recently served one is dropped first
+MAX_WATCHED = 8
+
+
+def _pair(input_file, config_file=None):
+    return os.path.abspath(input_file), os.path.abspath(config_file) if config_file else None
+
+
+def _source(input_file, config_file=None):
+    return file_fingerprint(input_file), config_fingerprint(config_file)
+
+
+def _last_modified(input_file, config_file=None):
+    """Latest mtime of the file and config (missing ones are ignored), or None."""
+    mtimes = []
+    for path in (input_file, config_file):
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except (OSError, TypeError):
+            continue
+    return max(mtimes) if mtimes else None
+
+
+class Ranking:
+    """
+    One precomputed version of the full ranking of a file under a config: the
+    rows in rank order, indexed for queries (see `query.RankedIndex`), and the
+    file position of each row, so pages and cursors match the other engines.
+
+    `source` holds the file and config fingerprints taken before the file was
+    read, `as_of` the time they were taken and `last_modified` the files'
+    latest mtime then; `version` is a short hash of `source`.
+    """
+
+    def __init__(self, source, as_of, last_modified, index, order):
+        self.source = source
+        self.as_of = as_of
+        self.last_modified = last_modified
+        self.version = hashlib.sha1(repr(source).encode('utf-8')).hexdigest()[:16]
+        self.index = index
+        self.order = order
+
+    @property
+    def rows(self):
+        return self.index.rows
+
+    @property
+    def fieldnames(self):
+        return self.index.fieldnames
+
+    @property
+    def stamp(self):
+        """The `artifacts.artifact_stamp` of the inputs this ranking was built from."""
+        return {'input': list(self.source[0] or ()), 'config': self.source[1]}
+
+    def _key(self, position):
+        return -self.rows[position]['score'], self.order[position]
+
+    def page(self, top_k=None, offset=0, limit=None, after=None):
+        """One page, exactly as `ranker.rank_page` would return it for the same data."""
+        n = len(self.rows)
+        start = 0
+        if after is not None:
+            # rank order is ascending (-score, row index), the order cursors resume in
+            start = bisect.bisect_right(range(n), (-after[0], after[1]), key=self._key)
+        count = page_size(top_k, offset, limit, after)
+        stop = n if count is None else min(start + count, n)
+        positions = range(min(start + offset, stop), stop)
+        items = [self.rows[p] for p in positions]
+        return build_page(items, n, n - start, top_k, offset, limit, after,
+                          self.order[positions[-1]] if items else None)
+
+    def iter_rows(self, top_k=None, offset=0, limit=None):
+        """Rows of one page in rank order, like `stream_ranker.iter_ranked`."""
+        count = page_size(top_k, offset, limit)
+        stop = len(self.rows) if count is None else min(count, len(self.rows))
+        for position in range(offset, stop):
+            yield self.rows[position]
+
+
+def build_ranking(input_file, config_file=None):
+    """Rank `input_file` in full with the row-wise engine and index the result."""
+    from schema import load_schema, numeric_columns
+    as_of = time.time()
+    source = _source(input_file, config_file)
+    last_modified = _last_modified(input_file, config_file)
+    fieldnames, lawyers = score_file(input_file, config_file)
+    with stage('sort'):
+        order, _ = select_ranked([lawyer['score'] for lawyer in lawyers])
+    rows = [lawyers[i] for i in order]
+    inc('lawyer_rows_ranked_total', len(rows), engine='python')
+    fieldnames = output_fieldnames(fieldnames, rows) if rows else []
+    numeric = numeric_columns(fieldnames, load_schema(input_file)) if rows else []
+    return Ranking(source, as_of, last_modified, RankedIndex(rows, fieldnames, numeric).precompute(), order)
+
+
+class Precomputer:
+    """
+    Keeps the rankings of recently served (file, config) pairs precomputed.
+
+    A background thread polls the fingerprints of the watched files every
+    `interval` seconds and, when one changed, re-ranks that pair and swaps
+    the new `Ranking` in with a single assignment. Until then `current`
+    keeps returning the previous ranking (stale-while-revalidate), so
+    requests never wait for ranking work except the very first one for a
+    pair (see `load`).
+    """
+
+    def __init__(self, interval=POLL_INTERVAL, max_watched=MAX_WATCHED):
+        self.interval = interval
+        self.max_watched = max_watched
+        self._lock = threading.Lock()
+        # one build at a time, so an older build can never be swapped in over a newer one
+        self._build_lock = threading.Lock()
+        self._rankings = OrderedDict()
+        self._failed = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._stop = None
+
+    def current(self, input_file, config_file=None):
+        """The ranking to serve for the pair now (possibly stale), or None if it has none yet."""
+        pair = _pair(input_file, config_file)
+        with self._lock:
+            ranking = self._rankings.get(pair)
+            if ranking is not None:
+                self._rankings.move_to_end(pair)
+            return ranking
+
+    def load(self, input_file, config_file=None):
+        """`current`, ranking the pair here first if it has no ranking yet; the pair is then watched."""
+        ranking = self.current(input_file, config_file)
+        if ranking is not None:
+            return ranking
+        with self._build_lock:
+            ranking = self.current(input_file, config_file)
+            if ranking is None:
+                ranking = build_ranking(*_pair(input_file, config_file))
+                self._install(_pair(input_file, config_file), ranking)
+            return ranking
+
+    def watch(self, input_file, config_file=None):
+        """Have the background thread rank the pair as soon as possible, without waiting for it."""
+        pair = _pair(input_file, config_file)
+        with self._lock:
+            self._rankings.setdefault(pair, None)
+        self._start()
+        self._wake.set()
+
+    def staleness(self, ranking, input_file, config_file=None):
+        """
+        Seconds for which `ranking` has been older than the files (0.0 while it
+        is current). A stale ranking wakes the background thread right away.
+        """
+        if _source(input_file, config_file) == ranking.source:
+            return 0.0
+        self._wake.set()
+        changed = max(_last_modified(input_file, config_file) or 0.0, ranking.as_of)
+        return max(time.time() - changed, 0.0)
+
+    def refresh(self, input_file, config_file=None):
+        """Re-rank the pair if its files changed since its ranking was built; True if a new one was swapped in."""
+        pair = _pair(input_file, config_file)
+        with self._build_lock:
+            source = _source(*pair)
+            with self._lock:
+                ranking = self._rankings.get(pair)
+            if source[0] is None or self._failed.get(pair) == source or (ranking and ranking.source == source):
+                return False
+            try:
+                ranking = build_ranking(*pair)
+            except Exception as e:
+                # keep serving the previous ranking; retry once the files change again
+                self._failed[pair] = source
+                print(f"Warning: precomputing the ranking of {pair[0]} failed: {e}")
+                return False
+            self._failed.pop(pair, None)
+            if _source(*pair) != source:
+                # the files changed while they were read, e.g. mid-write; the next poll ranks them again
+                return False
+            self._install(pair, ranking)
+        # in the background, so the inferred schema can be persisted for the next process
+        save_schema(pair[0])
+        return True
+
+    def _install(self, pair, ranking):
+        with self._lock:
+            self._rankings[pair] = ranking
+            self._rankings.move_to_end(pair)
+            while len(self._rankings) > self.max_watched:
+                self._rankings.popitem(last=False)
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name='ranking-precompute',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self, stop):
+        while not stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                pairs = list(self._rankings)
+            for pair in pairs:
+                if stop.is_set():
+                    return
+                self.refresh(*pair)
+
+    def close(self):
+        """
+        Stop the background thread, after the ranking it is building if any.
+        Rankings are kept; the next `load` or `watch` starts a new thread.
+        """
+        with self._lock:
+            thread, stop = self._thread, self._stop
+            self._thread = self._stop = None
+        if thread is not None:
+            stop.set()
+            self._wake.set()
+            thread.join()
@@ -0,0 +1,353 @@
+import bisect
+import threading
+from collections import OrderedDict
+from itertools import islice
+
+from ranker import convert_column, output_fieldnames, rank_lawyers
+from ranking_cache import config_fingerprint, file_fingerprint
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; permutations are then plain lists
+    np = None
+
+# Comparison operators accepted in filter expressions; longer ones are matched first
+FILTER_OPERATORS = ('>=', '<=', '=', '>', '<')
+
+# Below this share of all rows, filtered matches are sorted directly instead of
+# scanning the column permutation for them
+SPARSE_MATCH_RATIO = 1 / 8
+
+# Columns (case-insensitive) whose value -> rows index is built when data loads
+INDEXED_COLUMNS = ('firm',)
+
+
+def parse_filter(expression):
+    """
+    Parse a filter expression into `(column, operator, value)`.
+
+    `column=value` keeps rows whose cell equals `value` exactly (several
+    equality filters on one column are OR-ed); `column>=x`, `column<=x`,
+    `column>x` and `column<x` are numeric bounds. Raises ValueError.
+    """
+    best = None
+    for op in FILTER_OPERATORS:
+        i = expression.find(op)
+        if i > 0 and (best is None or i < best[0]):
+            best = (i, op)
+    if best is None:
+        raise ValueError(f"Invalid filter {expression!r}; expected e.g. 'Firm=Name' or 'Years PE>=5'")
+    i, op = best
+    column, value = expression[:i].strip(), expression[i + len(op):].strip()
+    if op != '=':
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f"Filter {expression!r} needs a numeric bound")
+    return column, op, value
+
+
+class RankedIndex:
+    """
+    Query structures over one full ranking (rows in rank order), so sorting by
+    another column, filtering and paging are answered by slicing instead of
+    re-sorting row dicts.
+
+    Rows are addressed by rank position. `precompute` builds the sort
+    permutations (both directions) of every numeric column and the value ->
+    positions index of INDEXED_COLUMNS up front; other columns get theirs on
+    first use. Ties and blank cells keep rank order; blanks always sort last.
+    With numpy, positions are int32 arrays and numeric permutations come from
+    a stable argsort; without it everything falls back to lists.
+    """
+
+    def __init__(self, rows, fieldnames, numeric_columns=()):
+        self.rows = rows
+        self.fieldnames = list(fieldnames)
+        self.numeric = set(numeric_columns) | {'score'}
+        self._ascending = {}
+        self._keys = {}
+        self._permutations = {}
+        self._inverses = {}
+        self._inverted = {}
+        self._lock = threading.Lock()
+
+    def _check_column(self, column):
+        if column not in self.fieldnames:
+            raise ValueError(f"Unknown column {column!r}")
+
+    def _values(self, column):
+        """Sort keys of a column in rank order: floats for numeric columns, casefolded text otherwise."""
+        cells = [row.get(column) for row in self.rows]
+        if column in self.numeric:
+            parsed = convert_column(cells)
+            return list(map(parsed.__getitem__, cells))
+        return [None if v is None or v == '' else str(v).casefold() for v in cells]
+
+    def _sorted(self, column):
+        """`(positions, keys, blanks)`: non-blank positions by ascending key, their keys, blank positions."""
+        with self._lock:
+            entry = self._ascending.get(column)
+            if entry is None:
+                values = self._values(column)
+                positions = [p for p, v in enumerate(values) if v is not None]
+                positions.sort(key=values.__getitem__)
+                blanks = [p for p, v in enumerate(values) if v is None]
+                entry = self._ascending[column] = (positions, [values[p] for p in positions], blanks)
+            return entry
+
+    def _numeric_keys(self, column):
+        """Float64 keys of a numeric column in rank order, NaN for blanks (numpy only)."""
+        keys = self._keys.get(column)
+        if keys is None:
+            cells = [row.get(column) for row in self.rows]
+            lookup = {v: np.nan if x is None else x for v, x in convert_column(cells).items()}
+            keys = np.fromiter(map(lookup.__getitem__, cells), dtype=np.float64, count=len(cells))
+            self._keys[column] = keys
+        return keys
+
+    def _vectorized(self, column):
+        return np is not None and column in self.numeric
+
+    def permutation(self, column, descending=False):
+        """Rank positions ordered by `column`; ties keep rank order, blanks come last."""
+        key = (column, descending)
+        perm = self._permutations.get(key)
+        if perm is not None:
+            return perm
+        if self._vectorized(column):
+            keys = self._numeric_keys(column)
+            # stable argsort keeps ties in rank order and puts NaN (blank) last in both directions
+            perm = np.argsort(-keys if descending else keys, kind='stable')
+        else:
+            positions, keys, blanks = self._sorted(column)
+            if descending:
+                # a stable reverse sort of the rank-ordered positions keeps ties in rank order
+                by_key = dict(zip(positions, keys))
+                positions = sorted(sorted(positions), key=by_key.__getitem__, reverse=True)
+            perm = positions + blanks
+        perm = self._permutations[key] = _positions(perm)
+        return perm
+
+    def _inverse(self, column, descending):
+        """Place of each rank position in the column's permutation."""
+        key = (column, descending)
+        inverse = self._inverses.get(key)
+        if inverse is None:
+            perm = self.permutation(column, descending)
+            if np is not None:
+                inverse = np.empty_like(perm)
+                inverse[perm] = np.arange(len(perm), dtype=perm.dtype)
+            else:
+                inverse = [0] * len(perm)
+                for place, p in enumerate(perm):
+                    inverse[p] = place
+            self._inverses[key] = inverse
+        return inverse
+
+    def precompute(self):
+        """Build the permutations of every numeric column and the INDEXED_COLUMNS indexes now."""
+        for column in self.fieldnames:
+            if column in self.numeric:
+                self.permutation(column, False)
+                self.permutation(column, True)
+            if column.lower() in INDEXED_COLUMNS:
+                self.inverted_index(column)
+        return self
+
+    def inverted_index(self, column):
+        """Map each cell value of `column` (as text) to its rank positions, ascending."""
+        with self._lock:
+            index = self._inverted.get(column)
+            if index is None:
+                index = {}
+                for p, row in enumerate(self.rows):
+                    v = row.get(column)
+                    index.setdefault('' if v is None else str(v), []).append(p)
+                index = self._inverted[column] = {v: _positions(ps) for v, ps in index.items()}
+            return index
+
+    def _range(self, column, op, bound):
+        """Rank positions (ascending) whose numeric cell satisfies `op bound`."""
+        if column not in self.numeric:
+            raise ValueError(f"Column {column!r} is not numeric")
+        if self._vectorized(column):
+            keys = self._numeric_keys(column)
+            ascending = self.permutation(column, False)
+            present = ascending[:len(keys) - int(np.isnan(keys).sum())]
+            sorted_keys = keys[present]
+            if op in ('>=', '>'):
+                start = np.searchsorted(sorted_keys, bound, side='left' if op == '>=' else 'right')
+                return np.sort(present[start:])
+            stop = np.searchsorted(sorted_keys, bound, side='right' if op == '<=' else 'left')
+            return np.sort(present[:stop])
+        positions, keys, _ = self._sorted(column)
+        if op in ('>=', '>'):
+            start = (bisect.bisect_left if op == '>=' else bisect.bisect_right)(keys, bound)
+            return sorted(positions[start:])
+        stop = (bisect.bisect_right if op == '<=' else bisect.bisect_left)(keys, bound)
+        return sorted(positions[:stop])
+
+    def match(self, filters=(), top_k=None):
+        """
+        Rank positions (ascending) of rows passing every filter and ranked within
+        `top_k`, or a `range` when nothing is filtered out.
+        """
+        n = len(self.rows) if top_k is None else min(top_k, len(self.rows))
+        candidates = []
+        equals = {}
+        for column, op, value in filters:
+            self._check_column(column)
+            if op == '=':
+                equals.setdefault(column, []).append(value)
+            else:
+                candidates.append(self._range(column, op, value))
+        for column, values in equals.items():
+            index = self.inverted_index(column)
+            found = [index.get(v, _positions([])) for v in dict.fromkeys(values)]
+            if len(found) == 1:
+                candidates.append(found[0])
+            elif np is not None:
+                candidates.append(np.sort(np.concatenate(found)))
+            else:
+                candidates.append(sorted(set().union(*found)))
+        if not candidates:
+            return range(n)
+
+        candidates.sort(key=len)
+        if np is not None:
+            result = candidates[0]
+            for other in candidates[1:]:
+                result = np.intersect1d(result, other, assume_unique=True)
+            return result[:np.searchsorted(result, n)]
+        base, others = candidates[0], [set(c) for c in candidates[1:]]
+        base = base[:bisect.bisect_left(base, n)]
+        return [p for p in base if all(p in other for other in others)]
+
+    def _order(self, matches, sort_by, descending, offset, stop):
+        """Slice `[offset:stop]` of the matching rank positions ordered by `sort_by`."""
+        perm = self.permutation(sort_by, descending)
+        if isinstance(matches, range) and len(matches) == len(self.rows):
+            return perm[offset:stop]
+        if len(matches) < len(self.rows) * SPARSE_MATCH_RATIO:
+            # few matches: sort them by their place in the permutation
+            inverse = self._inverse(sort_by, descending)
+            if np is not None:
+                matches = np.asarray(matches)
+                return matches[np.argsort(inverse[matches], kind='stable')][offset:stop]
+            return sorted(matches, key=inverse.__getitem__)[offset:stop]
+        # many matches: walk the permutation and keep the matching rows
+        if np is not None:
+            mask = np.zeros(len(self.rows), dtype=bool)
+            mask[matches] = True
+            return perm[mask[perm]][offset:stop]
+        wanted = matches if isinstance(matches, range) else set(matches)
+        return list(islice((p for p in perm if p in wanted), offset, stop))
+
+    def query(self, sort_by=None, descending=True, filters=(), top_k=None, offset=0, limit=None, fields=None):
+        """
+        Answer one page of a sorted/filtered view of the ranking, shaped like
+        `ranker.build_page` (`next_cursor` is always None; page with `offset`).
+
+        Without `sort_by` rows stay in rank order. `fields` projects each row
+        onto the given columns.
+        """
+        for column in ([sort_by] if sort_by else []) + list(fields or []):
+            self._check_column(column)
+        matches = self.match(filters, top_k)
+        stop = None if limit is None else offset + limit
+
+        if sort_by is None or (sort_by == 'score' and descending):
+            # rank order is already descending score with ties in file order
+            ordered = matches[offset:stop]
+        else:
+            ordered = self._order(matches, sort_by, descending, offset, stop)
+        ordered = _as_list(ordered)
+
+        if fields:
+            items = [{f: self.rows[p].get(f) for f in fields} for p in ordered]
+        else:
+            items = [self.rows[p] for p in ordered]
+        return {
+            'total': len(matches),
+            'offset': offset,
+            'limit': limit,
+            'next_cursor': None,
+            'items': items,
+        }
+
+
+def _positions(positions):
+    """Store rank positions compactly: an int32 array with numpy, else a list."""
+    if np is None:
+        return list(positions)
+    return np.asarray(positions, dtype=np.int64 if len(positions) >= 2 ** 31 else np.int32)
+
+
+def _as_list(positions):
+    return positions.tolist() if np is not None and isinstance(positions, np.ndarray) else positions
+
+
+def build_index(input_file, config_file=None):
+    """Rank a file and index the full ranking for queries, precomputing its sort structures."""
+    from schema import load_schema, numeric_columns
+    rows = rank_lawyers(input_file, config_file, write_output=False)
+    fieldnames = output_fieldnames([], rows) if rows else []
+    numeric = numeric_columns(fieldnames, load_schema(input_file)) if rows else []
+    return RankedIndex(rows, fieldnames, numeric).precompute()
+
+
+# Indexes kept, one per (file, config); the least recently used one is dropped first
+MAX_INDEXES = 8
+
+# (file, config) -> (source fingerprints, index), most recently used last; an
+# entry is replaced when the file or config fingerprint changes
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+# (file, config) -> [build lock, callers using it], while an index for it is loaded
+_building = {}
+
+
+def _cached_index(slot, source):
+    with _indexes_lock:
+        cached = _indexes.get(slot)
+        if cached is None or cached[0] != source:
+            return None
+        _indexes.move_to_end(slot)
+        return cached[1]
+
+
+def load_index(input_file, config_file=None):
+    """
+    The index of the current ranking of `input_file`. It is built when the data
+    is first loaded and reused until the file or config fingerprint changes;
+    the stale index is then dropped and rebuilt.
+
+    Builds run outside the global lock, so other files stay servable while one
+    is indexed; concurrent callers for the same file wait for its single build.
+    """
+    source = (file_fingerprint(input_file), config_fingerprint(config_file))
+    slot = (source[0][0], config_file)
+    index = _cached_index(slot, source)
+    if index is not None:
+        return index
+    with _indexes_lock:
+        building = _building.setdefault(slot, [threading.Lock(), 0])
+        building[1] += 1
+    try:
+        with building[0]:
+            # a caller that held the lock before us may have built it already
+            index = _cached_index(slot, source)
+            if index is None:
+                index = build_index(input_file, config_file)
+                with _indexes_lock:
+                    _indexes[slot] = (source, index)
+                    _indexes.move_to_end(slot)
+                    while len(_indexes) > MAX_INDEXES:
+                        _indexes.popitem(last=False)
+            return index
+    finally:
+        with _indexes_lock:
+            building[1] -= 1
+            if not building[1]:
+                del _building[slot]
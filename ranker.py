@@ -1,148 +1,502 @@
+import base64
 import csv
+import heapq
 import json
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 
+from metrics import inc, stage
 
-def rank_lawyers(input_file, config_file=None):
+
+DEFAULT_WEIGHTS = {"description_length": 1.0}
+
+# Columns that are never treated as numeric when autodetecting
+TEXT_COLUMNS = ('name', 'firm', 'location', 'practice_areas')
+
+# Where the ranked CSV artifacts are written
+OUTPUT_PATH_ROOT = 'ranked_lawyer_data.csv'
+FRONTEND_DIR = os.path.join('frontend', 'public')
+
+# Input files with this suffix are binary columnar snapshots (see `snapshot`)
+SNAPSHOT_SUFFIX = '.lrsnap'
+
+# Input files with these suffixes are SQLite databases (see `lawyer_db`)
+DB_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+
+def load_weights(config_file):
     """
-    Ranks lawyers based on weighted criteria from a CSV file and an optional JSON config file.
+    Load the weights mapping from a JSON config file.
 
-    If `config_file` is not provided or cannot be read, a sensible default is used
-    (weighting `description_length` by 1.0) so callers that only supply a CSV
-    (like the tests) still get a meaningful ranking.
+    Returns a `(weights, use_autodetect)` tuple. When no config is given, or the
+    config is missing/invalid and the defaults are used instead, `use_autodetect`
+    is True and numeric columns are discovered from the data.
     """
-    # Default weights: prefer longer descriptions if no config is provided
-    default_weights = {"description_length": 1.0}
+    if config_file:
+        try:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                weights = json.load(f)
+        except FileNotFoundError:
+            # Fall back to defaults if config file is missing
+            weights = DEFAULT_WEIGHTS
+        except json.JSONDecodeError:
+            # Fall back to defaults if config file is invalid
+            weights = DEFAULT_WEIGHTS
+    else:
+        weights = DEFAULT_WEIGHTS
+
+    # if config_file was provided but weights didn't match any columns, fallback to autodetect
+    use_autodetect = not config_file or weights == DEFAULT_WEIGHTS
+    return weights, use_autodetect
+
+
+def normalize_fieldnames(fieldnames):
+    """Trim whitespace from headers and drop empty header names."""
+    return [fn.strip() for fn in (fieldnames or []) if fn and fn.strip() != '']
+
+
+def normalize_row(row):
+    """Map trimmed headers to values, skipping empty header columns."""
+    norm = {}
+    for k, v in row.items():
+        nk = (k or '').strip()
+        if nk == '':
+            # skip empty header columns
+            continue
+        norm[nk] = v
+    return norm
+
 
+def header_positions(header):
+    """
+    Normalize a raw CSV header once: map each trimmed, non-empty column name to
+    the position its value is read from.
+
+    Duplicate names keep their first position but the last value, exactly as
+    `csv.DictReader` followed by `normalize_row` would.
+    """
+    positions = {}
+    for i, name in enumerate(header):
+        name = (name or '').strip()
+        if name:
+            positions[name] = i
+    return positions
+
+
+def scoring_weights(weights, use_autodetect, numeric_columns):
+    """
+    Return the ordered list of `(column, weight)` pairs used to compute scores.
+
+    Autodetected numeric columns are summed with weight 1.0; otherwise the
+    configured weights are used. Weights that are not numeric contribute nothing
+    and are dropped.
+    """
+    if use_autodetect and numeric_columns:
+        return [(col, 1.0) for col in numeric_columns]
+    pairs = []
+    for column, weight in weights.items():
+        try:
+            pairs.append((column, float(weight)))
+        except (ValueError, TypeError):
+            continue
+    return pairs
+
+
+def score_lawyer(lawyer, weight_pairs):
+    """Compute the weighted score of one lawyer; blank or non-numeric cells count as zero."""
+    score = 0.0
+    for column, weight in weight_pairs:
+        val = lawyer.get(column)
+        if val is None or val == '':
+            continue
+        try:
+            score += float(val) * weight
+        except (ValueError, TypeError):
+            # If conversion fails, treat the contribution as zero
+            continue
+    return score
+
+
+def parse_cell(value):
+    """A cell as a float, or None when it is blank or not numeric."""
+    if value is None or value == '':
+        return None
     try:
-        if config_file:
-            try:
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    weights = json.load(f)
-            except FileNotFoundError:
-                # Fall back to defaults if config file is missing
-                weights = default_weights
-            except json.JSONDecodeError:
-                # Fall back to defaults if config file is invalid
-                weights = default_weights
-        else:
-            weights = default_weights
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def convert_column(values):
+    """
+    Parse a column of cells to floats ahead of scoring: returns a mapping from
+    each distinct cell to its float, or None for blank and non-numeric cells.
+    Each distinct cell is parsed once.
+    """
+    return {v: parse_cell(v) for v in set(values)}
+
+
+def score_rows(lawyers, weight_pairs):
+    """
+    Scores of many lawyers; same result as `score_lawyer` on each row. Only the
+    weighted columns are converted, once per distinct cell, so the accumulation
+    loop does no string parsing. Contributions are added in `weight_pairs` order.
+    """
+    scores = [0.0] * len(lawyers)
+    for column, weight in weight_pairs:
+        values = [lawyer.get(column) for lawyer in lawyers]
+        parsed = convert_column(values)
+        if not any(x is not None for x in parsed.values()):
+            continue
+        scores = [s if x is None else s + x * weight for s, x in zip(scores, map(parsed.__getitem__, values))]
+    return scores
+
+
+def output_fieldnames(normalized_fieldnames, lawyers):
+    """
+    Field order for the ranked CSV: normalized headers (or the first row's keys
+    if normalization produced nothing) followed by `score`.
+    """
+    fieldnames = list(normalized_fieldnames if normalized_fieldnames else lawyers[0].keys())
+    if 'score' not in fieldnames:
+        fieldnames.append('score')
+    return fieldnames
+
+
+@contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    """
+    Open a temporary file next to `path` and rename it over `path` once the
+    block completes, so readers never see a partially written file. On error
+    the temporary file is removed and `path` is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        # mkstemp creates files readable only by the owner; published files should not be
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def link_or_copy(src, dst):
+    """
+    Atomically make `dst` a hard link to `src`, falling back to a copy where
+    links are not supported (e.g. across filesystems).
+    """
+    directory = os.path.dirname(os.path.abspath(dst))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(dst) + '.', suffix='.tmp', dir=directory)
+    os.close(fd)
+    os.remove(tmp_path)
+    try:
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_ranked_csv(path, fieldnames, ranked_lawyers):
+    """Atomically write ranked rows to `path`, filling missing fields with ''."""
+    with stage('write'):
+        with atomic_write(path, 'w', encoding='utf-8', newline='') as outcsv:
+            writer = csv.DictWriter(outcsv, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in ranked_lawyers:
+                out_row = {k: row.get(k, '') for k in fieldnames}
+                writer.writerow(out_row)
+    inc('lawyer_bytes_written_total', os.path.getsize(path), kind='csv')
+
+
+def write_ranked_outputs(fieldnames, ranked_lawyers):
+    """
+    Write the repo-root and frontend/public copies of the ranked CSV so frontends
+    can load it directly. The rows are serialized once; the frontend copy is a
+    link to (or copy of) the root file. Gzip/brotli copies (`.gz`/`.br`) are
+    written alongside for the server to send as-is. Failures are reported but
+    not raised; returns True only if every copy was written.
+    """
+    output_path_frontend = os.path.join(FRONTEND_DIR, 'ranked_lawyer_data.csv')
+
+    try:
+        # write repo-root copy (backwards compatibility)
+        write_ranked_csv(OUTPUT_PATH_ROOT, fieldnames, ranked_lawyers)
+    except Exception as e:
+        print(f"Warning: failed to write {OUTPUT_PATH_ROOT}: {e}")
+        return False
+
+    try:
+        # ensure frontend public directory exists
+        os.makedirs(FRONTEND_DIR, exist_ok=True)
+        # expose the same file where Vite can serve it from frontend/public
+        link_or_copy(OUTPUT_PATH_ROOT, output_path_frontend)
+    except Exception as e:
+        print(f"Warning: failed to write {output_path_frontend}: {e}")
+        return False
+
+    try:
+        # precompressed copies, so the server never compresses the CSV per request
+        from delivery import SUFFIXES, write_compressed_variants
+        written = write_compressed_variants(OUTPUT_PATH_ROOT)
+        for suffix in SUFFIXES.values():
+            variant_path = OUTPUT_PATH_ROOT + suffix
+            if variant_path in written:
+                link_or_copy(variant_path, output_path_frontend + suffix)
+            elif os.path.exists(output_path_frontend + suffix):
+                os.remove(output_path_frontend + suffix)
+    except Exception as e:
+        print(f"Warning: failed to write compressed copies of {OUTPUT_PATH_ROOT}: {e}")
+        return False
+    return True
+
+
+def encode_cursor(score, index, position):
+    """
+    Encode where the next page starts as an opaque cursor.
+
+    Rows are ordered by (descending score, row index), so the score and row index
+    of the last returned row are enough to resume right after it; `position` is
+    the number of ranked rows before the next page, used to keep enforcing `top_k`.
+    """
+    raw = json.dumps([score, index, position], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of `encode_cursor`; raises ValueError for malformed cursors."""
+    try:
+        score, index, position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(score), int(index), int(position)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
 
+
+def page_size(top_k=None, offset=0, limit=None, after=None):
+    """
+    Number of leading ranked rows (counted from the cursor, if any) needed to
+    answer a request, or None when the whole ranking is needed.
+    """
+    count = offset + limit if limit is not None else None
+    if top_k is not None:
+        top_k = max(top_k - (after[2] if after else 0), 0)
+        count = min(count, top_k) if count is not None else top_k
+    return count
+
+
+def is_full_ranking(top_k=None, offset=0, limit=None, after=None):
+    """True when no paging parameter restricts the ranking."""
+    return top_k is None and not offset and limit is None and after is None
+
+
+def select_ranked(scores, top_k=None, offset=0, limit=None, after=None):
+    """
+    Pick the row indices of one page of the ranking without sorting everything.
+
+    Rows are ordered by descending score with ties in original row order (the
+    order of a stable `sorted(..., reverse=True)`). `after` is a decoded cursor;
+    only rows ranked after it are considered. When a page size is known, a
+    bounded heap selects it in O(n log k). Returns `(indices, remaining)` where
+    `remaining` is the number of rows ranked after the cursor (all rows if none).
+    """
+    candidates = range(len(scores))
+    if after is not None:
+        after_key = (-after[0], after[1])
+        candidates = [i for i in candidates if (-scores[i], i) > after_key]
+    remaining = len(candidates)
+
+    def key(i):
+        return (-scores[i], i)
+
+    count = page_size(top_k, offset, limit, after)
+    if count is None:
+        selected = sorted(candidates, key=key)
+    else:
+        selected = heapq.nsmallest(count, candidates, key=key)
+    return selected[offset:], remaining
+
+
+def score_file(input_file, config_file=None):
+    """
+    Read, normalize and score a CSV with the row-wise engine. Returns
+    `(fieldnames, lawyers)`: the lawyers in file order, each with its `score`.
+    """
+    weights, use_autodetect = load_weights(config_file)
+
+    with stage('parse'):
         with open(input_file, 'r', encoding='utf-8', newline='') as csvfile:
             reader = csv.DictReader(csvfile)
             raw_lawyers = list(reader)
 
             # Normalize headers: trim whitespace and remove empty header names
-            original_fieldnames = reader.fieldnames or []
-            normalized_fieldnames = [fn.strip() for fn in original_fieldnames if fn and fn.strip() != '']
-
-            # Build normalized lawyer dicts (map trimmed headers to values)
-            lawyers = []
-            for row in raw_lawyers:
-                norm = {}
-                for k, v in (row.items()):
-                    nk = (k or '').strip()
-                    if nk == '':
-                        # skip empty header columns
-                        continue
-                    norm[nk] = v
-                lawyers.append(norm)
-
-            # Determine scoring strategy: if a config with weights provided, use it.
-            # Otherwise autodetect numeric columns and compute score as the sum of numeric fields.
-            use_autodetect = False
-            if not config_file:
-                use_autodetect = True
-            else:
-                # if config_file was provided but weights didn't match any columns, fallback to autodetect
-                if weights == default_weights:
-                    use_autodetect = True
-
-            numeric_columns = []
-            if use_autodetect:
-                # detect columns that look numeric by scanning the first few rows
-                for col in normalized_fieldnames:
-                    if col.lower() in ('name', 'firm', 'location', 'practice_areas'):
-                        continue
-                    found_numeric = False
-                    for r in lawyers:
-                        v = r.get(col, '')
-                        if v is None or v == '':
-                            continue
-                        try:
-                            float(str(v))
-                            found_numeric = True
-                            break
-                        except (ValueError, TypeError):
-                            break
-                    if found_numeric:
-                        numeric_columns.append(col)
-
-            # Compute scores
-            for lawyer in lawyers:
-                score = 0.0
-                if use_autodetect and numeric_columns:
-                    for col in numeric_columns:
-                        try:
-                            val = lawyer.get(col, '')
-                            if val is None or val == '':
-                                continue
-                            score += float(str(val))
-                        except (ValueError, TypeError):
-                            continue
-                else:
-                    for column, weight in weights.items():
-                        try:
-                            # Ensure the column exists and the value is numeric
-                            if column in lawyer and lawyer[column] is not None and lawyer[column] != '':
-                                score += float(lawyer[column]) * float(weight)
-                        except (ValueError, TypeError):
-                            # If conversion fails, treat the contribution as zero
-                            pass
-                lawyer['score'] = score
-
-            # Sort the lawyers by score in descending order
+            normalized_fieldnames = normalize_fieldnames(reader.fieldnames)
+
+        # Build normalized lawyer dicts (map trimmed headers to values)
+        lawyers = [normalize_row(row) for row in raw_lawyers]
+
+    # Determine scoring strategy: if a config with weights provided, use it.
+    # Otherwise autodetect numeric columns and compute score as the sum of numeric fields.
+    with stage('score'):
+        numeric_columns = []
+        if use_autodetect:
+            # column types are inferred once per version of the file and cached
+            from schema import load_schema, numeric_columns as schema_numeric_columns
+            numeric_columns = schema_numeric_columns(normalized_fieldnames, load_schema(input_file))
+        weight_pairs = scoring_weights(weights, use_autodetect, numeric_columns)
+
+        # Compute scores
+        for lawyer, score in zip(lawyers, score_rows(lawyers, weight_pairs)):
+            lawyer['score'] = score
+
+    return normalized_fieldnames, lawyers
+
+
+def build_page(items, total, remaining, top_k=None, offset=0, limit=None, after=None, last_index=None):
+    """
+    Wrap one page of ranked rows with the total row count and, for `limit`ed
+    pages that are not the last one, a cursor for the next page.
+    """
+    start = after[2] if after else 0
+    consumed = offset + len(items)
+    next_cursor = None
+    if limit is not None and items and consumed < remaining and (top_k is None or start + consumed < top_k):
+        next_cursor = encode_cursor(items[-1]['score'], last_index, start + consumed)
+    return {
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'items': items,
+    }
+
+
+def _rank(input_file, config_file, engine, top_k=None, offset=0, limit=None, after=None):
+    """
+    Rank a file and return `(page, fieldnames)`, where `page` is the dict
+    described in `rank_page`.
+    """
+    page, fieldnames = _rank_engine(input_file, config_file, engine, top_k, offset, limit, after)
+    inc('lawyer_rows_ranked_total', page['total'], engine=engine)
+    return page, fieldnames
+
+
+def _rank_engine(input_file, config_file, engine, top_k=None, offset=0, limit=None, after=None):
+    if str(input_file).endswith(SNAPSHOT_SUFFIX):
+        # snapshots are already columnar; every engine reads them the same way
+        from snapshot import rank_file_snapshot
+        return rank_file_snapshot(input_file, config_file, top_k, offset, limit, after)
+    if str(input_file).endswith(DB_SUFFIXES):
+        # scores are stored in the database and pages are read through its rank index
+        from lawyer_db import rank_file_db
+        with stage('rank'):
+            return rank_file_db(input_file, config_file, top_k, offset, limit, after)
+    if engine == 'numpy':
+        try:
+            from numpy_ranker import rank_file_numpy
+        except ImportError:
+            print("Warning: numpy is not installed; falling back to the python engine")
+        else:
+            return rank_file_numpy(input_file, config_file, top_k, offset, limit, after)
+    elif engine == 'stream':
+        from stream_ranker import rank_file_stream
+        with stage('rank'):
+            return rank_file_stream(input_file, config_file, top_k, offset, limit, after)
+    elif engine == 'parallel':
+        from parallel_ranker import rank_file_parallel
+        with stage('rank'):
+            return rank_file_parallel(input_file, config_file, top_k, offset, limit, after)
+    elif engine == 'incremental':
+        from incremental import rank_file_incremental
+        with stage('rank'):
+            return rank_file_incremental(input_file, config_file, top_k, offset, limit, after)
+
+    fieldnames, lawyers = score_file(input_file, config_file)
+    if is_full_ranking(top_k, offset, limit, after):
+        # Sort the lawyers by score in descending order
+        with stage('sort'):
             ranked_lawyers = sorted(lawyers, key=lambda x: x.get('score', 0), reverse=True)
+        return build_page(ranked_lawyers, len(lawyers), len(lawyers)), fieldnames
+
+    scores = [lawyer['score'] for lawyer in lawyers]
+    with stage('sort'):
+        indices, remaining = select_ranked(scores, top_k, offset, limit, after)
+    items = [lawyers[i] for i in indices]
+    page = build_page(items, len(lawyers), remaining, top_k, offset, limit, after,
+                      indices[-1] if indices else None)
+    return page, fieldnames
+
+
+def rank_page(input_file, config_file=None, engine='python', top_k=None, offset=0, limit=None, cursor=None):
+    """
+    Rank lawyers and return a single page of the result as a dict with keys
+    `total` (rows in the file), `offset`, `limit`, `next_cursor` and `items`.
+
+    `top_k` caps how many ranked rows are considered, `offset`/`limit` slice the
+    page and `cursor` (from a previous page's `next_cursor`) resumes after the
+    last row of that page. Only the requested rows are selected and sorted.
+    Unlike `rank_lawyers`, no CSV artifacts are written.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        page, _ = _rank(input_file, config_file, engine, top_k, offset, limit, after)
+        return page
+    except FileNotFoundError as e:
+        print(f"Error: The file {e.filename} was not found.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    return build_page([], 0, 0, top_k, offset, limit)
+
+
+def rank_lawyers(input_file, config_file=None, engine='python', top_k=None, offset=0, limit=None, cursor=None,
+                 write_output=True):
+    """
+    Ranks lawyers based on weighted criteria from a CSV file and an optional JSON config file.
+
+    If `config_file` is not provided or cannot be read, a sensible default is used
+    (weighting `description_length` by 1.0) so callers that only supply a CSV
+    (like the tests) still get a meaningful ranking.
+
+    `engine` selects the scoring implementation: 'python' scores row by row,
+    'numpy' loads the numeric columns into a float matrix and scores them in one
+    vectorized pass (see `numpy_ranker`), and 'stream' scores rows as they are
+    read, keeping only a bounded heap or spilling sorted runs to disk (see
+    `stream_ranker`), 'parallel' parses and scores byte-range shards of the file
+    on a process pool and merges them (see `parallel_ranker`), and 'incremental'
+    persists its ranking next to the CSV and only parses rows appended since the
+    previous run (see `incremental`). All
+    produce identical output. A `.lrsnap` input is a memory-mapped binary
+    snapshot (see `snapshot`) and is ranked without any CSV parsing; a `.db`
+    input is a SQLite database (see `lawyer_db`) whose stored scores are read
+    in rank order, only as far as the requested page.
+
+    `top_k`, `offset`/`limit` and `cursor` return only part of the ranking (see
+    `rank_page`). The ranked CSV files are only written for the full ranking, and
+    only if `write_output` is true; long-running callers such as the server pass
+    False and leave artifact generation to `artifacts`.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        page, fieldnames = _rank(input_file, config_file, engine, top_k, offset, limit, after)
+        ranked_lawyers = page['items']
+
+        if write_output and ranked_lawyers and is_full_ranking(top_k, offset, limit, after):
+            write_ranked_outputs(output_fieldnames(fieldnames, ranked_lawyers), ranked_lawyers)
 
-            # Write out a CSV that includes the score column so frontends can load it directly
-            output_path_root = 'ranked_lawyer_data.csv'
-            frontend_dir = os.path.join('frontend', 'public')
-            output_path_frontend = os.path.join(frontend_dir, 'ranked_lawyer_data.csv')
-
-            if lawyers:
-                # ensure deterministic field order: use normalized (trimmed, non-empty) fieldnames
-                # falling back to the lawyer dict keys if normalization produced nothing
-                fieldnames = normalized_fieldnames if normalized_fieldnames else list(lawyers[0].keys())
-                # Make a copy to avoid mutating the normalized list
-                fieldnames = list(fieldnames)
-                if 'score' not in fieldnames:
-                    fieldnames.append('score')
-
-                try:
-                    # write repo-root copy (backwards compatibility)
-                    with open(output_path_root, 'w', encoding='utf-8', newline='') as outcsv:
-                        writer = csv.DictWriter(outcsv, fieldnames=fieldnames)
-                        writer.writeheader()
-                        for row in ranked_lawyers:
-                            out_row = {k: row.get(k, '') for k in fieldnames}
-                            writer.writerow(out_row)
-                except Exception as e:
-                    print(f"Warning: failed to write {output_path_root}: {e}")
-
-                try:
-                    # ensure frontend public directory exists
-                    os.makedirs(frontend_dir, exist_ok=True)
-                    # write copy that Vite can serve from frontend/public
-                    with open(output_path_frontend, 'w', encoding='utf-8', newline='') as outcsv:
-                        writer = csv.DictWriter(outcsv, fieldnames=fieldnames)
-                        writer.writeheader()
-                        for row in ranked_lawyers:
-                            out_row = {k: row.get(k, '') for k in fieldnames}
-                            writer.writerow(out_row)
-                except Exception as e:
-                    print(f"Warning: failed to write {output_path_frontend}: {e}")
-
-            return ranked_lawyers
+        return ranked_lawyers
 
     except FileNotFoundError as e:
         print(f"Error: The file {e.filename} was not found.")
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def file_fingerprint(path):
+    """
+    Return a cheap identity for a file on disk: (absolute path, mtime_ns, size).
+
+    Any rewrite or append changes at least one of mtime/size, so the tuple can be
+    used as a cache key without reading the file. Missing files yield None.
+    """
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def config_fingerprint(config_file):
+    """
+    Return a short hash of a weights config file's contents.
+
+    `None` (no config) and unreadable files get stable sentinel values so they
+    still produce distinct, reusable cache keys.
+    """
+    if not config_file:
+        return 'default'
+    try:
+        with open(config_file, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return 'missing:' + str(config_file)
+
+
+class RankingCache:
+    """
+    Thread-safe LRU cache for ranking results.
+
+    Entries are bounded both by count (`max_entries`) and by the sum of their
+    reported sizes in bytes (`max_bytes`); the least recently used entries are
+    evicted first. Hit/miss/eviction counters are kept for monitoring.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for `key` or None, updating the counters."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        """
+        Store `value` under `key`. `size` defaults to len(value) for bytes-like
+        values; anything larger than `max_bytes` on its own is not cached.
+        """
+        if size is None:
+            size = len(value) if isinstance(value, (bytes, bytearray)) else 0
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, size_of=None):
+        """
+        Return the cached value for `key`, calling `compute()` and caching its
+        result on a miss. `size_of(value)` may be given for non-bytes values.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = compute()
+        if value is not None:
+            self.put(key, value, size_of(value) if size_of else None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
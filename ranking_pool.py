@@ -0,0 +1,175 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+from delivery import encode_variants
+from metrics import SAMPLE_INTERVAL, Sampler, capture, replay, stage
+from ranker import rank_lawyers, rank_page
+
+# Worker processes used for CPU-bound rankings; 0 runs them on the thread pool instead
+RANK_WORKERS = int(os.environ.get('RANK_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Distinct rankings computed at the same time; further requests wait for a slot
+RANK_CONCURRENCY = int(os.environ.get('RANK_CONCURRENCY', max(RANK_WORKERS, 1)))
+
+# Seconds a request waits (for a slot and for its result) before giving up
+RANK_TIMEOUT = float(os.environ.get('RANK_TIMEOUT', 30))
+
+
+def json_bytes(content):
+    """Serialize the same way JSONResponse does, so cached bytes can be served as-is."""
+    with stage('encode'):
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def project(rows, fields):
+    """Keep only `fields` of each row; raises ValueError naming the first unknown column."""
+    known = set(rows[0]) if rows else set()
+    unknown = [f for f in fields if f not in known]
+    if rows and unknown:
+        raise ValueError(f"Unknown column {unknown[0]!r}")
+    return [{f: row.get(f) for f in fields} for row in rows]
+
+
+def ranked_body(input_file, config_file=None, paged=False, top_k=None, offset=0, limit=None, cursor=None,
+                fields=None):
+    """
+    Rank a file and return the serialized JSON body of `/api/ranked`: the full
+    ranked list, or one page when `paged`. Runs in a worker process, so only
+    the bytes travel back.
+    """
+    if paged:
+        content = rank_page(input_file, config_file, top_k=top_k, offset=offset, limit=limit, cursor=cursor)
+        if fields:
+            content = dict(content, items=project(content['items'], fields))
+    else:
+        content = rank_lawyers(input_file, config_file, write_output=False)
+        if fields:
+            content = project(content, fields)
+    return json_bytes(content)
+
+
+def ranked_variants(*args):
+    """`ranked_body` plus its compressed variants (see `delivery.encode_variants`), built in the worker."""
+    return encode_variants(ranked_body(*args))
+
+
+def _instrumented(fn, *args):
+    """Call `fn`, capturing the metrics it records so the caller's process can replay them."""
+    with capture() as events:
+        result = fn(*args)
+    return result, events
+
+
+def _profiled(fn, interval, *args):
+    """`_instrumented`, while sampling the stack of the calling thread every `interval` seconds."""
+    with Sampler(interval=interval) as sampler:
+        result, events = _instrumented(fn, *args)
+    return result, events, sampler.collapsed()
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: while a call for a key runs, later
+    callers with the same key await its result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, start):
+        """Await the running call for `key`, or `start()` one. Cancelling a waiter does not cancel the call."""
+        future = self._calls.get(key)
+        if future is None:
+            future = self._calls[key] = asyncio.ensure_future(start())
+            future.add_done_callback(lambda f: self._calls.pop(key, None) if self._calls.get(key) is f else None)
+        return await asyncio.shield(future)
+
+
+class RankingExecutor:
+    """
+    Runs ranking work off the event loop.
+
+    Identical requests (same key) share one computation, at most `concurrency`
+    computations run at once, and a caller gives up after `timeout` seconds
+    with `asyncio.TimeoutError`. A computation whose callers all timed out
+    still finishes, and `on_result` (e.g. filling the response cache) still
+    runs, so a retry is answered from it. CPU-bound calls go to a pool of
+    `workers` processes so they don't contend for the GIL.
+    """
+
+    def __init__(self, workers=RANK_WORKERS, concurrency=RANK_CONCURRENCY, timeout=RANK_TIMEOUT):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # asyncio primitives belong to one event loop; keep a set per loop
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _process_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn, not fork: the server process runs threads (artifact writer, threadpool)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = (SingleFlight(), asyncio.Semaphore(self.concurrency))
+        return state
+
+    def in_flight(self):
+        """Distinct computations running or waiting for a slot on the current loop."""
+        return len(self._state()[0])
+
+    async def run(self, key, fn, *args, offload=True, on_result=None):
+        """
+        Return `fn(*args)`, computed once per key across concurrent callers.
+        `offload` sends it to the process pool (`fn` and `args` must pickle);
+        otherwise it runs on the default thread pool.
+        """
+        flights, slots = self._state()
+
+        async def start():
+            async with slots:
+                result, events = await self._call(offload, _instrumented, fn, *args)
+            # stage timings recorded by the worker count here, and in the leading request's Server-Timing
+            replay(events)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return await asyncio.wait_for(flights.do(key, start), self.timeout)
+
+    async def profile(self, fn, *args, offload=True, interval=SAMPLE_INTERVAL):
+        """
+        Run `fn(*args)` once, bypassing coalescing and the timeout, with a
+        sampling profiler on the thread that runs it. Returns `(result,
+        collapsed_stacks)`.
+        """
+        _, slots = self._state()
+        async with slots:
+            result, events, stacks = await self._call(offload, _profiled, fn, interval, *args)
+        replay(events)
+        return result, stacks
+
+    async def _call(self, offload, fn, *args):
+        loop = asyncio.get_running_loop()
+        executor = self._process_pool() if offload and self.workers > 0 else None
+        return await loop.run_in_executor(executor, fn, *args)
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from numpy_ranker import LawyerTable, rank_indices, score_table
+from ranker import DEFAULT_WEIGHTS, load_weights, scoring_weights
+from ranking_cache import config_fingerprint, file_fingerprint
+
+# Rows returned by a rescore when the caller does not ask for a specific count
+DEFAULT_TOP_K = 20
+
+
+class FeatureMatrix:
+    """
+    A lawyer CSV parsed once into float64 columns, plus its baseline ranking,
+    so new weights can be tried without re-reading or re-parsing the file.
+
+    A column is converted to floats the first time a weight refers to it and
+    kept, so text columns nobody weights are never converted.
+    `baseline_rank[i]` is the 1-based place of row `i` in the ranking under
+    the baseline config.
+    """
+
+    def __init__(self, table, weights, use_autodetect):
+        self.table = table
+        self.baseline_scores = score_table(table, weights, use_autodetect)
+        order = rank_indices(self.baseline_scores)
+        self.baseline_rank = np.empty(table.n_rows, dtype=np.int64)
+        self.baseline_rank[order] = np.arange(1, table.n_rows + 1)
+
+    @classmethod
+    def from_csv(cls, input_file, config_file=None):
+        weights, use_autodetect = load_weights(config_file)
+        return cls(LawyerTable.from_csv(input_file), weights, use_autodetect)
+
+    def scores(self, weights):
+        """
+        Score every row under `weights` (`{column: weight}`), exactly as
+        `ranker.rank_lawyers` would with a config file holding those weights.
+        """
+        use_autodetect = weights == DEFAULT_WEIGHTS
+        numeric_columns = self.table.detect_numeric_columns() if use_autodetect else []
+        pairs = scoring_weights(weights, use_autodetect, numeric_columns)
+        # same accumulation as numpy_ranker.compute_scores, straight from the cached column arrays
+        scores = np.zeros(self.table.n_rows, dtype=np.float64)
+        # huge weights may overflow; `rescore` rejects the non-finite result
+        with np.errstate(over='ignore', invalid='ignore'):
+            for column, weight in pairs:
+                # columns missing from the file contribute nothing (and are not cached as zeros)
+                if column in self.table.columns:
+                    scores += self.table.column_array(column) * weight
+        return scores
+
+    def rescore(self, weights, top_k=DEFAULT_TOP_K, fields=None):
+        """
+        Rank under `weights` and return the best `top_k` rows as
+        `{total, top_k, items}`. Each item carries its new `rank`, its
+        `baseline_rank` and `rank_delta` (positive when it moved up), and the
+        row's columns (only `fields` and `score` when `fields` is given).
+        Raises ValueError when the weights make any score infinite or NaN.
+        """
+        scores = self.scores(weights)
+        if not np.isfinite(scores).all():
+            raise ValueError('weights produce scores that are not finite numbers; use smaller weights')
+        order = rank_indices(scores, top_k)
+        items = self.table.rows(order, scores)
+        baseline = self.baseline_rank[order].tolist()
+        for rank, (item, was) in enumerate(zip(items, baseline), start=1):
+            if fields:
+                item = dict({f: item.get(f) for f in fields}, score=item['score'])
+            item.update(rank=rank, baseline_rank=was, rank_delta=was - rank)
+            items[rank - 1] = item
+        return {'total': self.table.n_rows, 'top_k': top_k, 'items': items}
+
+
+# Feature matrices kept, one per (file, config); the least recently used one is
+# dropped first. `config` comes from the request body, so this must stay bounded.
+MAX_MATRICES = 4
+
+# (file, config) -> (source fingerprints, matrix), most recently used last; an
+# entry is replaced when the file or config fingerprint changes
+_matrices = OrderedDict()
+_matrices_lock = threading.Lock()
+# (file, config) -> [build lock, callers using it], while a matrix for it is loaded
+_building = {}
+
+
+def _cached_matrix(slot, source):
+    with _matrices_lock:
+        cached = _matrices.get(slot)
+        if cached is None or cached[0] != source:
+            return None
+        _matrices.move_to_end(slot)
+        return cached[1]
+
+
+def load_feature_matrix(input_file, config_file=None):
+    """
+    The cached feature matrix of `input_file`, with the ranking under
+    `config_file` as its baseline. It is rebuilt only after the file or the
+    config changes.
+
+    As in `query.load_index`, builds run outside the global lock and
+    concurrent callers for the same (file, config) wait for a single build.
+    """
+    source = (file_fingerprint(input_file), config_fingerprint(config_file))
+    slot = (source[0][0], config_file)
+    matrix = _cached_matrix(slot, source)
+    if matrix is not None:
+        return matrix
+    with _matrices_lock:
+        building = _building.setdefault(slot, [threading.Lock(), 0])
+        building[1] += 1
+    try:
+        with building[0]:
+            # a caller that held the lock before us may have built it already
+            matrix = _cached_matrix(slot, source)
+            if matrix is None:
+                matrix = FeatureMatrix.from_csv(input_file, config_file)
+                with _matrices_lock:
+                    _matrices[slot] = (source, matrix)
+                    _matrices.move_to_end(slot)
+                    while len(_matrices) > MAX_MATRICES:
+                        _matrices.popitem(last=False)
+            return matrix
+    finally:
+        with _matrices_lock:
+            building[1] -= 1
+            if not building[1]:
+                del _building[slot]
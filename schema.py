@@ -0,0 +1,150 @@
+import csv
+import json
+import threading
+from itertools import islice
+
+from ranker import TEXT_COLUMNS, atomic_write, header_positions
+from ranking_cache import file_fingerprint
+
+# Bump when the inference rule or the layout of the schema file changes
+SCHEMA_VERSION = 1
+
+# Rows sampled from the top of the file to infer column types
+SAMPLE_ROWS = 10000
+
+# Share of a column's non-blank sampled cells that must parse as numbers for it to be numeric
+NUMERIC_THRESHOLD = 0.8
+
+# Schemas kept in memory, most recent last
+MEMO_ENTRIES = 64
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def schema_path(input_file):
+    """Where the inferred schema of `input_file` is persisted."""
+    return f"{input_file}.schema.json"
+
+
+def infer_column(values):
+    """
+    Infer the type of one column from its sampled cells.
+
+    Returns `{'type', 'null_rate', 'numeric_rate'}` where `type` is 'numeric'
+    when at least NUMERIC_THRESHOLD of the non-blank cells parse as floats,
+    'text' otherwise, or 'empty' when every cell is blank. A stray text cell
+    therefore no longer flips a numeric column.
+    """
+    total = nulls = numeric = 0
+    for v in values:
+        total += 1
+        if v is None or v == '':
+            nulls += 1
+            continue
+        try:
+            float(str(v))
+            numeric += 1
+        except (ValueError, TypeError):
+            pass
+    present = total - nulls
+    if not present:
+        kind = 'empty'
+    elif numeric >= NUMERIC_THRESHOLD * present:
+        kind = 'numeric'
+    else:
+        kind = 'text'
+    return {
+        'type': kind,
+        'null_rate': nulls / total if total else 0.0,
+        'numeric_rate': numeric / present if present else 0.0,
+    }
+
+
+def infer_schema(columns):
+    """Infer every column of `{name: values}` from its first SAMPLE_ROWS cells."""
+    return {name: infer_column(islice(values, SAMPLE_ROWS)) for name, values in columns.items()}
+
+
+def numeric_columns(fieldnames, schema):
+    """The autodetected scoring columns: numeric columns that are not known text columns."""
+    return [col for col in fieldnames
+            if col.lower() not in TEXT_COLUMNS and schema.get(col, {}).get('type') == 'numeric']
+
+
+def sample_columns(input_file):
+    """Read the first SAMPLE_ROWS rows of a CSV as `{name: values}`."""
+    with open(input_file, 'r', encoding='utf-8', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, [])
+        rows = [row for row in islice((row for row in reader if row), SAMPLE_ROWS)]
+    positions = header_positions(header)
+    return {name: [row[i] if i < len(row) else None for row in rows] for name, i in positions.items()}
+
+
+def _read_schema_file(path, fingerprint):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(saved, dict) or saved.get('version') != SCHEMA_VERSION:
+        return None
+    if saved.get('fingerprint') != list(fingerprint) or saved.get('sample_rows') != SAMPLE_ROWS:
+        return None
+    return saved.get('columns')
+
+
+def load_schema(input_file, columns=None):
+    """
+    Return the inferred schema of a CSV as `{column: {'type', 'null_rate',
+    'numeric_rate'}}`.
+
+    The schema is inferred once per version of the file and memoized in the
+    process, keyed on the file fingerprint, so it is only recomputed after the
+    file changes. A sidecar written by `save_schema` for the same fingerprint
+    is reused instead of sampling. Nothing is written here, so this is safe on
+    the request path. Callers that already hold the rows can pass them as
+    `columns` (`{name: values}`) to skip re-reading the sample.
+    """
+    fingerprint = file_fingerprint(input_file)
+    with _memo_lock:
+        schema = _memo.get(fingerprint)
+    if schema is not None:
+        return schema
+
+    schema = _read_schema_file(schema_path(input_file), fingerprint)
+    if schema is None:
+        schema = infer_schema(columns if columns is not None else sample_columns(input_file))
+
+    with _memo_lock:
+        _memo[fingerprint] = schema
+        while len(_memo) > MEMO_ENTRIES:
+            del _memo[next(iter(_memo))]
+    return schema
+
+
+def save_schema(input_file):
+    """
+    Persist the schema of `input_file` next to it, keyed on its fingerprint,
+    unless an up-to-date sidecar is already there. Called from artifact
+    generation and background work, never from a request. Returns True if
+    the file was written.
+    """
+    fingerprint = file_fingerprint(input_file)
+    path = schema_path(input_file)
+    if fingerprint is None or _read_schema_file(path, fingerprint) is not None:
+        return False
+    schema = load_schema(input_file)
+    try:
+        with atomic_write(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': SCHEMA_VERSION,
+                'fingerprint': list(fingerprint),
+                'sample_rows': SAMPLE_ROWS,
+                'columns': schema,
+            }, f, indent=2)
+    except OSError as e:
+        print(f"Warning: failed to write {path}: {e}")
+        return False
+    return True
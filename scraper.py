@@ -1,57 +1,249 @@
+import re
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import csv
 
-def scrape_lawyers(url):
-    """
-    Scrapes lawyer data from a given URL, extracts the information, and saves it to a CSV file.
-    """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+except ImportError:  # lxml is optional; the BeautifulSoup backends still work
+    lxml = None
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+FIELDNAMES = ['name', 'location', 'practice_areas', 'description_length']
+
+# Columns identifying a scraped lawyer when records are upserted into a database
+KEY_COLUMNS = ['name', 'location']
+
+# Seconds to wait for a directory page before giving up
+DEFAULT_TIMEOUT = 30
+
+
+def parse_card(card):
+    """Extract one lawyer record from a `div.jld-card` element."""
+    name_tag = card.select_one('strong.name a')
+    name = name_tag.text.strip() if name_tag else 'N/A'
+
+    location_tag = card.select_one('.rating span')
+    location = location_tag.text.split(' Attorney')[0].strip() if location_tag and 'Attorney' in location_tag.text else 'N/A'
+
+    practice_areas_tag = card.select_one('.outline')
+    practice_areas = practice_areas_tag.text.strip() if practice_areas_tag else 'N/A'
+
+    # A simple proxy for experience/reputation could be the length of the description
+    description_tag = card.select_one('.description') or card.select_one('div[data-nosnippet="true"]')
+    description = description_tag.text.strip() if description_tag else ''
+    description_length = len(description)
+
+    return {
+        'name': name,
+        'location': location,
+        'practice_areas': practice_areas,
+        'description_length': description_length
     }
-    lawyers_data = []
 
+
+def _parse_listing_soup(html):
+    """Reference backend: full html.parser tree plus CSS queries per card."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Find all lawyer cards
+    records = [parse_card(card) for card in soup.find_all('div', class_='jld-card')]
+
+    next_tag = soup.select_one('.pagination .next a[href]')
+    return records, next_tag['href'] if next_tag else None
+
+
+# Only the lawyer cards and the pagination block are built by the strainer backend
+_TARGET_CLASSES = re.compile(r'(^|\s)(jld-card|pagination)(\s|$)')
+
+
+def _first_within(card, inner, **outer):
+    """First `inner` tag inside any tag matching `outer`, in document order (like CSS `outer inner`)."""
+    for tag in card.find_all(**outer):
+        found = tag.find(inner)
+        if found is not None:
+            return found
+    return None
+
+
+def _parse_card_fast(card):
+    """`parse_card` with tree-walking lookups instead of CSS selector queries."""
+    name_tag = _first_within(card, 'a', name='strong', class_='name')
+    name = name_tag.text.strip() if name_tag else 'N/A'
+
+    location_tag = _first_within(card, 'span', class_='rating')
+    location = location_tag.text.split(' Attorney')[0].strip() if location_tag and 'Attorney' in location_tag.text else 'N/A'
+
+    practice_areas_tag = card.find(class_='outline')
+    practice_areas = practice_areas_tag.text.strip() if practice_areas_tag else 'N/A'
+
+    description_tag = card.find(class_='description') or card.find('div', attrs={'data-nosnippet': 'true'})
+    description = description_tag.text.strip() if description_tag else ''
+
+    return {
+        'name': name,
+        'location': location,
+        'practice_areas': practice_areas,
+        'description_length': len(description)
+    }
+
+
+def _parse_listing_strainer(html):
+    """Targeted parse: only the card and pagination subtrees are built."""
+    strainer = SoupStrainer('div', attrs={'class': _TARGET_CLASSES})
+    soup = BeautifulSoup(html, 'html.parser', parse_only=strainer)
+
+    records = [_parse_card_fast(card) for card in soup.find_all('div', class_='jld-card')]
+
+    for pagination in soup.find_all(class_='pagination'):
+        for next_button in pagination.find_all(class_='next'):
+            next_tag = next_button.find('a', href=True)
+            if next_tag is not None:
+                return records, next_tag['href']
+    return records, None
+
+
+def _has_class(name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+# XPath equivalents of the CSS queries used by `parse_card`
+_XPATH_CARDS = f'//div[{_has_class("jld-card")}]'
+_XPATH_NAME = f'.//strong[{_has_class("name")}]//a'
+_XPATH_LOCATION = f'.//*[{_has_class("rating")}]//span'
+_XPATH_PRACTICE_AREAS = f'.//*[{_has_class("outline")}]'
+_XPATH_DESCRIPTION = f'.//*[{_has_class("description")}]'
+_XPATH_NOSNIPPET = './/div[@data-nosnippet="true"]'
+_XPATH_NEXT = f'//*[{_has_class("pagination")}]//*[{_has_class("next")}]//a[@href]'
+
+
+def _xpath_first(element, query):
+    found = element.xpath(query)
+    return found[0] if found else None
+
+
+def _text(element):
+    return element.text_content() if element is not None else None
+
+
+def _parse_listing_lxml(html):
+    """Native lxml tree and XPath queries; by far the fastest backend."""
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        print("Successfully fetched the page.")
+        doc = lxml.html.fromstring(html)
+    except ValueError:
+        # str input with an XML encoding declaration must be parsed as bytes
+        doc = lxml.html.fromstring(html.encode('utf-8'))
+    except ParserError:
+        # empty document
+        return [], None
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+    # BeautifulSoup's `.text` leaves out script and style contents; drop them so both backends agree
+    for element in doc.xpath('//script|//style'):
+        element.drop_tree()
 
-        # Find all lawyer cards
-        lawyer_cards = soup.find_all('div', class_='jld-card')
+    records = []
+    for card in doc.xpath(_XPATH_CARDS):
+        name = _text(_xpath_first(card, _XPATH_NAME))
+        location = _text(_xpath_first(card, _XPATH_LOCATION))
+        practice_areas = _text(_xpath_first(card, _XPATH_PRACTICE_AREAS))
+        description_tag = _xpath_first(card, _XPATH_DESCRIPTION)
+        if description_tag is None:
+            description_tag = _xpath_first(card, _XPATH_NOSNIPPET)
+        description = _text(description_tag)
 
-        for card in lawyer_cards:
-            name_tag = card.select_one('strong.name a')
-            name = name_tag.text.strip() if name_tag else 'N/A'
+        records.append({
+            'name': name.strip() if name is not None else 'N/A',
+            'location': location.split(' Attorney')[0].strip() if location is not None and 'Attorney' in location else 'N/A',
+            'practice_areas': practice_areas.strip() if practice_areas is not None else 'N/A',
+            'description_length': len(description.strip()) if description is not None else 0
+        })
 
-            location_tag = card.select_one('.rating span')
-            location = location_tag.text.split(' Attorney')[0].strip() if location_tag and 'Attorney' in location_tag.text else 'N/A'
+    next_tag = _xpath_first(doc, _XPATH_NEXT)
+    return records, next_tag.get('href') if next_tag is not None else None
 
-            practice_areas_tag = card.select_one('.outline')
-            practice_areas = practice_areas_tag.text.strip() if practice_areas_tag else 'N/A'
 
-            # A simple proxy for experience/reputation could be the length of the description
-            description_tag = card.select_one('.description') or card.select_one('div[data-nosnippet="true"]')
-            description = description_tag.text.strip() if description_tag else ''
-            description_length = len(description)
+PARSERS = {
+    'html.parser': _parse_listing_soup,
+    'strainer': _parse_listing_strainer,
+}
+if lxml is not None:
+    PARSERS['lxml'] = _parse_listing_lxml
 
-            lawyers_data.append({
-                'name': name,
-                'location': location,
-                'practice_areas': practice_areas,
-                'description_length': description_length
-            })
+# Fastest backend available in this environment
+DEFAULT_PARSER = 'lxml' if 'lxml' in PARSERS else 'strainer'
 
-        # Save the data to a CSV file
-        with open('lawyers.csv', 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['name', 'location', 'practice_areas', 'description_length']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
-            writer.writeheader()
-            writer.writerows(lawyers_data)
+def parse_listing(html, parser=None):
+    """
+    Parse a Justia listing page. Returns `(records, next_href)` where `next_href`
+    is the (possibly relative) link of the "Next" pagination button, or None.
+
+    `parser` picks the backend: 'html.parser' (full BeautifulSoup tree, the
+    reference implementation), 'strainer' (BeautifulSoup building only the card
+    subtrees) or 'lxml' (native lxml + XPath, used by default when installed).
+    All backends return identical records.
+    """
+    backend = PARSERS.get(parser or DEFAULT_PARSER)
+    if backend is None:
+        raise ValueError(f"Unknown or unavailable parser {parser!r}; choose from {sorted(PARSERS)}")
+    return backend(html)
+
+
+def extract_lawyers(html, parser=None):
+    """Extract lawyer records from the HTML of a Justia listing page."""
+    return parse_listing(html, parser)[0]
+
+
+def save_lawyers_csv(lawyers_data, path='lawyers.csv'):
+    """Save scraped lawyer records to a CSV file."""
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+
+        writer.writeheader()
+        writer.writerows(lawyers_data)
+
+
+def save_lawyers_db(lawyers_data, path):
+    """
+    Upsert scraped lawyer records into a `lawyer_db` database (created if
+    needed), keyed on KEY_COLUMNS, so scraping a page again updates its
+    lawyers instead of adding them twice.
+    """
+    from lawyer_db import LawyerStore
+    with LawyerStore(path, FIELDNAMES, KEY_COLUMNS) as store:
+        return store.upsert(lawyers_data)
+
+
+def scrape_lawyers(url, cache=None, db_path=None):
+    """
+    Scrapes lawyer data from a given URL, extracts the information, and saves it to a CSV file.
+
+    With a `http_cache.PageCache`, the page is revalidated with a conditional
+    GET and its records are reused when it has not changed. With `db_path`,
+    the records are also upserted into that database (see `save_lawyers_db`).
+    """
+    try:
+        if cache is not None:
+            lawyers_data, _ = cache.listing(
+                url, lambda extra: requests.get(url, headers={**HEADERS, **extra}, timeout=DEFAULT_TIMEOUT))
+            cache.prune()
+        else:
+            response = requests.get(url, headers=HEADERS, timeout=DEFAULT_TIMEOUT)
+            response.raise_for_status()
+            lawyers_data = extract_lawyers(response.text)
+        print("Successfully fetched the page.")
+
+        # Save the data to a CSV file
+        save_lawyers_csv(lawyers_data)
 
         print(f"Scraped and saved data for {len(lawyers_data)} lawyers to lawyers.csv")
+        if db_path:
+            save_lawyers_db(lawyers_data, db_path)
+            print(f"Upserted them into {db_path}")
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching the URL: {e}")
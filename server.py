@@ -1,13 +1,60 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from pydantic import BaseModel, Field, confloat
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+import asyncio
+import math
 import os
+import time
 import uvicorn
-from ranker import rank_lawyers
+from artifacts import ArtifactWriter, artifact_stamp, read_stamp
+from delivery import (
+    available_encodings,
+    choose_encoding,
+    encode_variants,
+    http_date,
+    iter_json_array,
+    iter_ndjson,
+    make_etag,
+    not_modified,
+    precompressed_path,
+    variant_etag,
+    variants_size,
+)
+from lawyer_db import is_database, iter_ranked as iter_ranked_db, query_file, read_fieldnames as db_fieldnames
+from metrics import REGISTRY, request_timings, server_timing
+from precompute import Precomputer
+from query import load_index, parse_filter
+from ranker import decode_cursor, is_full_ranking, output_fieldnames, rank_lawyers
+from ranking_pool import RankingExecutor, json_bytes, project, ranked_variants
+from stream_ranker import iter_ranked, read_fieldnames
+from ranking_cache import RankingCache, config_fingerprint, file_fingerprint
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Start ranking the served data in the background as soon as the server is up."""
+    path = os.path.join(os.getcwd(), LAWYER_DB or 'lawyer_data.csv')
+    if PRECOMPUTE and os.path.exists(path) and not is_database(path):
+        precomputer.watch(path)
+    yield
+    # nothing outlives the app: stop the polling thread and the ranking worker processes
+    precomputer.close()
+    ranking_executor.shutdown()
+
+
+app = FastAPI(title="Lawyer Ranking API", lifespan=lifespan)
 
-app = FastAPI(title="Lawyer Ranking API")
+# Process-level cache of serialized rankings, keyed on the CSV and config fingerprints
+ranking_cache = RankingCache()
+
+# Ranked CSV artifacts are written on a background thread, never in a request
+artifact_writer = ArtifactWriter()
 
 # Enable CORS so Vite dev server (localhost:5173) can call /api endpoints
 app.add_middleware(
@@ -23,35 +70,444 @@ if os.path.isdir('frontend/dist'):
     app.mount('/', StaticFiles(directory='frontend/dist', html=True), name='frontend')
 
 
+# Off-loop execution for /api/ranked: coalesces identical requests, bounds concurrency, times out
+ranking_executor = RankingExecutor()
+
+# Add a Server-Timing header (per-stage durations) to every response
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+# Allow `profile=true` on /api/ranked to return a sampled profile instead of data
+ALLOW_PROFILING = os.environ.get('ALLOW_PROFILING', '0') == '1'
+
+# Rank a SQLite database (see `lawyer_db`) instead of lawyer_data.csv
+LAWYER_DB = os.environ.get('LAWYER_DB')
+
+# Serve CSV data from rankings kept precomputed in the background (see `precompute`)
+PRECOMPUTE = os.environ.get('PRECOMPUTE', '1') == '1'
+
+# Re-ranks the served data and configs when their files change, off the request path
+precomputer = Precomputer()
+
+
+def _data_path():
+    """The data `/api/ranked` serves: the LAWYER_DB database if set, else lawyer_data.csv; 404 if missing."""
+    path = os.path.join(os.getcwd(), LAWYER_DB or 'lawyer_data.csv')
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f'{os.path.basename(path)} not found')
+    return path
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    """FastAPI's 422 body, with rejected NaN or infinite inputs echoed as text, since JSON cannot encode them."""
+    errors = []
+    for error in exc.errors():
+        value = error.get('input')
+        if isinstance(value, float) and not math.isfinite(value):
+            error = dict(error, input=str(value))
+        errors.append(error)
+    return JSONResponse(status_code=422, content={'detail': jsonable_encoder(errors)})
+
+
+@app.middleware('http')
+async def record_request_metrics(request: Request, call_next):
+    """Record the latency of every request and, if enabled, expose its stage timings."""
+    start = time.perf_counter()
+    with request_timings() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get('route')
+    # label by route template, never by raw path, to keep the number of series bounded
+    REGISTRY.observe('lawyer_http_request_seconds', elapsed, route=getattr(route, 'path', 'unmatched'),
+                     status=str(response.status_code))
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing(timings, elapsed)
+    return response
+
+
+def _indexed_variants(csv_path, config, sort_by, descending, filters, top_k, offset, limit, fields):
+    """Answer a sorted/filtered query from the in-process index (or the database), serialized and compressed."""
+    if is_database(csv_path):
+        content = query_file(csv_path, config, sort_by, descending, filters, top_k, offset, limit, fields)
+    else:
+        content = load_index(csv_path, config).query(sort_by, descending, filters, top_k, offset, limit, fields)
+    return encode_variants(json_bytes(content))
+
+
+def _precomputed_variants(ranking, sort_by, descending, filters, top_k, offset, limit, after, fields):
+    """Answer `/api/ranked` from a precomputed ranking, serialized and compressed; nothing is ranked."""
+    if sort_by or filters:
+        content = ranking.index.query(sort_by, descending, filters, top_k, offset, limit, fields)
+    elif is_full_ranking(top_k, offset, limit, after):
+        content = project(ranking.rows, fields) if fields else ranking.rows
+    else:
+        content = ranking.page(top_k, offset, limit, after)
+        if fields:
+            content = dict(content, items=project(content['items'], fields))
+    return encode_variants(json_bytes(content))
+
+
+def _precompute(csv_path, config_path):
+    """`precomputer.load`, or None if the data cannot be ranked."""
+    try:
+        return precomputer.load(csv_path, config_path)
+    except Exception as e:
+        # fall back to ranking per request, which reports unreadable data as an empty ranking
+        print(f"Warning: precomputing the ranking of {csv_path} failed: {e}")
+        return None
+
+
+async def _load_ranking(csv_path, config_path):
+    """
+    The precomputed ranking to serve, or None for data that is not precomputed
+    (databases, or files that failed to rank). Raises `asyncio.TimeoutError`
+    if the first ranking of a file and config takes too long.
+    """
+    if not PRECOMPUTE or is_database(csv_path):
+        return None
+    ranking = precomputer.current(csv_path, config_path)
+    if ranking is None:
+        # only the first request for a file and config waits; later ones get the background result
+        ranking = await ranking_executor.run(('precompute', csv_path, config_path), _precompute, csv_path,
+                                             config_path, offload=False)
+    return ranking
+
+
+def _data_headers(ranking, csv_path, config_path):
+    """Which version of the data a response was built from, and for how many seconds it has been stale."""
+    if ranking is None:
+        return {}
+    staleness = precomputer.staleness(ranking, csv_path, config_path)
+    return {'X-Data-Version': ranking.version, 'X-Data-Stale': f'{staleness:.3f}'}
+
+
+def _last_modified(*paths):
+    """Latest mtime of the given files (missing ones are ignored), or None."""
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except (OSError, TypeError):
+            continue
+    return max(mtimes) if mtimes else None
+
+
+def _validators(etag, last_modified):
+    headers = {'ETag': etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def _variant_response(request, variants, etag, last_modified, media_type, headers=None):
+    """
+    Serve the precompressed variant the client accepts, with validators. A
+    conditional request whose ETag still matches gets an empty 304.
+    """
+    encoding = choose_encoding(request.headers.get('accept-encoding'), variants)
+    headers = dict(headers or {}, **_validators(variant_etag(etag, encoding), last_modified))
+    if not_modified(request.headers, headers['ETag'], last_modified):
+        return Response(status_code=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(content=variants[encoding], media_type=media_type, headers=headers)
+
+
 @app.get('/api/ranked')
-def get_ranked(config: Optional[str] = None):
+async def get_ranked(
+    request: Request,
+    config: Optional[str] = None,
+    top_k: Optional[int] = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    order: str = Query('desc', pattern='^(asc|desc)$'),
+    filter_expressions: List[str] = Query([], alias='filter'),
+    fields: Optional[str] = None,
+    format: str = Query('json', pattern='^(json|ndjson)$'),
+    stream: bool = False,
+    profile: bool = False,
+):
     """
     Return the ranked lawyers as JSON. If `config` is provided it is treated as
     a path to a JSON weights file; otherwise ranking uses default weights.
+
+    Without paging parameters the full ranked list is returned. With `top_k`,
+    `offset`/`limit` or `cursor`, only that page is selected (without a full sort)
+    and returned as `{total, offset, limit, next_cursor, items}`.
+
+    `sort_by` (with `order`) re-sorts by another column and each `filter`
+    (e.g. `Firm=Kirkland & Ellis`, `Years PE>=5`) narrows the rows; such queries
+    are answered from a cached index of the ranking as a page (paged with
+    `offset`/`limit`, `total` counting the matches). `fields=Name,Firm,score`
+    returns only those columns.
+
+    Ranking runs off the event loop (see `ranking_pool`): identical concurrent
+    requests share one computation, and a request that cannot be answered
+    within RANK_TIMEOUT gets a 503.
+
+    `format=ndjson` (one row per line) or `stream=true` (a JSON array) stream
+    the rows in rank order as they are encoded instead of building the whole
+    body first; server memory stays bounded (see `stream_ranker.iter_ranked`).
+    Streams honor `top_k`, `offset`, `limit` and `fields` and always carry a
+    bare list of rows.
+
+    With ALLOW_PROFILING set, `profile=true` computes the response once more,
+    bypassing caches, under a sampling profiler and returns the collapsed
+    stacks (flamegraph input) as text instead.
+
+    With LAWYER_DB set, the rows come from that SQLite database: pages,
+    filters and sorts are indexed queries over its stored scores, so only the
+    rows returned are read.
+
+    Otherwise every response is built from a ranking precomputed in the
+    background (see `precompute`); only the first request for a data file and
+    config waits for it. When the files change, requests keep getting the
+    previous ranking until the new one is swapped in: `X-Data-Version` names
+    the version served and `X-Data-Stale` the seconds it has been out of date.
+    """
+    csv_path = _data_path()
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+        filters = [parse_filter(expression) for expression in filter_expressions]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    indexed = bool(sort_by or filters)
+    if indexed and cursor:
+        raise HTTPException(status_code=400, detail='cursor cannot be combined with sort_by or filter; use offset')
+    paged = not is_full_ranking(top_k, offset, limit, after)
+    # worker processes may run in another directory
+    config_path = os.path.abspath(config) if config else None
+    if profile:
+        if not ALLOW_PROFILING:
+            raise HTTPException(status_code=403, detail='profiling is disabled; set ALLOW_PROFILING=1')
+        try:
+            if indexed:
+                _, stacks = await ranking_executor.profile(_indexed_variants, csv_path, config, sort_by,
+                                                           order == 'desc', filters, top_k, offset, limit,
+                                                           field_list, offload=False)
+            else:
+                _, stacks = await ranking_executor.profile(ranked_variants, csv_path, config_path, paged, top_k,
+                                                           offset, limit, cursor, field_list)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return Response(content=stacks, media_type='text/plain')
+
+    try:
+        ranking = await _load_ranking(csv_path, config_path)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail='ranking is taking too long; retry shortly',
+                            headers={'Retry-After': '1'})
+    data_headers = _data_headers(ranking, csv_path, config_path)
+
+    streamed = format == 'ndjson' or stream
+    if streamed:
+        if indexed or cursor:
+            raise HTTPException(status_code=400, detail='streams support top_k, offset, limit and fields only')
+        if ranking is not None:
+            known = ranking.fieldnames or read_fieldnames(csv_path) + ['score']
+        else:
+            known = (db_fieldnames if is_database(csv_path) else read_fieldnames)(csv_path) + ['score']
+        unknown = [f for f in field_list or [] if f not in known]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown column {unknown[0]!r}")
+
+    # the data a response is built from: the precomputed version, else the file and config as they are now
+    data = ranking.version if ranking is not None else (file_fingerprint(csv_path), config_fingerprint(config))
+    key = ('ranked', data, top_k, offset, limit, cursor, sort_by, order, tuple(filter_expressions), fields, format,
+           streamed)
+    # the key pins the data and the query, so a matching ETag needs no ranking at all
+    etag = make_etag(*key)
+    last_modified = ranking.last_modified if ranking is not None else _last_modified(csv_path, config)
+    for encoding in ('identity',) + available_encodings():
+        if not_modified(request.headers, variant_etag(etag, encoding), last_modified):
+            headers = {**data_headers, **_validators(variant_etag(etag, encoding), last_modified)}
+            return Response(status_code=304, headers=headers)
+
+    if streamed:
+        if ranking is not None:
+            rows = ranking.iter_rows(top_k, offset, limit)
+        else:
+            rows = (iter_ranked_db if is_database(csv_path) else iter_ranked)(csv_path, config, top_k, offset, limit)
+        if format == 'ndjson':
+            body, media_type = iter_ndjson(rows, field_list), 'application/x-ndjson'
+        else:
+            body, media_type = iter_json_array(rows, field_list), 'application/json'
+        # a sync iterator: Starlette pulls each chunk on the thread pool
+        return StreamingResponse(body, media_type=media_type,
+                                 headers={**data_headers, **_validators(etag, last_modified)})
+
+    variants = ranking_cache.get(key)
+    if variants is not None:
+        return _variant_response(request, variants, etag, last_modified, 'application/json',
+                                 {**data_headers, 'X-Cache': 'HIT'})
+
+    def cache_variants(variants):
+        ranking_cache.put(key, variants, variants_size(variants))
+
+    try:
+        if ranking is not None:
+            # only serialization is left to do, on a thread
+            variants = await ranking_executor.run(key, _precomputed_variants, ranking, sort_by, order == 'desc',
+                                                  filters, top_k, offset, limit, after, field_list, offload=False,
+                                                  on_result=cache_variants)
+            if not indexed and not paged and ranking.rows:
+                # the writer skips the files if they were already generated from this version
+                artifact_writer.submit(csv_path, config, ranking.rows, ranking.stamp)
+        elif indexed:
+            # the index lives in this process, so it is queried on a thread
+            variants = await ranking_executor.run(key, _indexed_variants, csv_path, config, sort_by,
+                                                  order == 'desc', filters, top_k, offset, limit, field_list,
+                                                  offload=False, on_result=cache_variants)
+        else:
+            # the ranked CSV artifacts are generated from lawyer_data.csv, never from a database
+            stamp = None if paged or is_database(csv_path) else artifact_stamp(csv_path, config)
+            variants = await ranking_executor.run(key, ranked_variants, csv_path, config_path, paged, top_k,
+                                                  offset, limit, cursor, field_list, on_result=cache_variants)
+            if stamp is not None and variants['identity'] != b'[]':
+                # the rows stay in the worker; the writer re-ranks in the background if the files are stale
+                artifact_writer.submit(csv_path, config, None, stamp)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail='ranking is taking too long; retry shortly',
+                            headers={'Retry-After': '1'})
+    return _variant_response(request, variants, etag, last_modified, 'application/json',
+                             {**data_headers, 'X-Cache': 'MISS'})
+
+
+class RescoreRequest(BaseModel):
+    """Body of `/api/rescore`: weights to try and how many rows to return."""
+    weights: Dict[str, confloat(allow_inf_nan=False)]
+    top_k: int = Field(20, ge=0)
+    config: Optional[str] = None
+    fields: Optional[List[str]] = None
+
+
+@app.post('/api/rescore')
+def rescore(request: RescoreRequest):
+    """
+    Re-rank with the weights in the request body without touching the CSV.
+
+    The file is parsed once into a cached feature matrix (see `rescore`); each
+    call only recombines its columns. Returns the new top `top_k` rows, each
+    with `rank`, `baseline_rank` (its place under `config`, default weights if
+    omitted) and `rank_delta` (positive when it moved up). Answers 501 when
+    the server serves a database (LAWYER_DB).
+    """
+    csv_path = _data_path()
+    if is_database(csv_path):
+        # the feature matrix is parsed from a CSV; rescoring would otherwise use other data than /api/ranked
+        raise HTTPException(status_code=501, detail='rescoring is not available when serving a database (LAWYER_DB)')
+    try:
+        from rescore import load_feature_matrix
+    except ImportError:
+        raise HTTPException(status_code=501, detail='numpy is required for rescoring')
+
+    matrix = load_feature_matrix(csv_path, request.config)
+    unknown = [f for f in request.fields or [] if f not in matrix.table.columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown column {unknown[0]!r}")
+    try:
+        content = matrix.rescore(request.weights, request.top_k, request.fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content=content)
+
+
+def _snapshot_body(ranking, csv_path, config):
+    """The snapshot bytes of the precomputed ranking, or of ranking the file now if there is none."""
+    from snapshot import rows_to_columns, snapshot_bytes
+    ranked = ranking.rows if ranking is not None else rank_lawyers(csv_path, config, write_output=False)
+    fieldnames = output_fieldnames([], ranked) if ranked else []
+    return snapshot_bytes(fieldnames, rows_to_columns(fieldnames, ranked), len(ranked))
+
+
+@app.get('/api/snapshot')
+async def get_snapshot(config: Optional[str] = None):
+    """
+    Return the full ranking as a binary columnar snapshot (see `snapshot`):
+    typed float64 columns and dictionary-encoded strings that clients can load
+    without parsing CSV or JSON. Like `/api/ranked`, it is built from the
+    precomputed ranking and carries the same data version headers.
     """
-    csv_path = os.path.join(os.getcwd(), 'lawyer_data.csv')
-    if not os.path.exists(csv_path):
-        raise HTTPException(status_code=404, detail='lawyer_data.csv not found')
+    csv_path = _data_path()
+    try:
+        import snapshot  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail='numpy is required for snapshots')
+    config_path = os.path.abspath(config) if config else None
 
-    ranked = rank_lawyers(csv_path, config)
-    return JSONResponse(content=ranked)
+    try:
+        ranking = await _load_ranking(csv_path, config_path)
+        if ranking is not None:
+            key = ('snapshot', ranking.version)
+        else:
+            key = ('snapshot', file_fingerprint(csv_path), config_fingerprint(config))
+        body = ranking_cache.get(key)
+        cache_status = 'HIT'
+        if body is None:
+            body = await ranking_executor.run(key, _snapshot_body, ranking, csv_path, config, offload=False,
+                                              on_result=lambda body: ranking_cache.put(key, body))
+            cache_status = 'MISS'
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail='ranking is taking too long; retry shortly',
+                            headers={'Retry-After': '1'})
+    headers = {**_data_headers(ranking, csv_path, config_path), 'X-Cache': cache_status}
+    return Response(content=body, media_type='application/octet-stream', headers=headers)
 
 
-from fastapi.responses import FileResponse
+@app.get('/metrics')
+def get_metrics():
+    """Stage timings, row and byte counters, request latencies and cache counters in Prometheus text format."""
+    stats = ranking_cache.stats()
+    lines = [REGISTRY.render()]
+    for name, kind, value, help_text in (
+        ('lawyer_cache_hits_total', 'counter', stats['hits'], 'Ranking cache hits.'),
+        ('lawyer_cache_misses_total', 'counter', stats['misses'], 'Ranking cache misses.'),
+        ('lawyer_cache_evictions_total', 'counter', stats['evictions'], 'Ranking cache evictions.'),
+        ('lawyer_cache_entries', 'gauge', stats['entries'], 'Entries in the ranking cache.'),
+        ('lawyer_cache_bytes', 'gauge', stats['bytes'], 'Bytes held by the ranking cache.'),
+    ):
+        lines.append(f'# HELP {name} {help_text}\n# TYPE {name} {kind}\n{name} {value}\n')
+    return Response(content=''.join(lines), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/api/cache')
+def get_cache_stats():
+    """Report hit/miss counters and occupancy of the ranking cache."""
+    return JSONResponse(content=ranking_cache.stats())
 
 
 @app.get('/ranked_lawyer_data.csv')
-def get_ranked_csv():
-    """Serve the generated CSV file if present."""
+def get_ranked_csv(request: Request):
+    """
+    Serve the generated CSV file if present, as its precompressed gzip/brotli
+    copy when the client accepts one. The ETag is derived from the ranking the
+    file was generated from, so unchanged data is answered with a 304.
+    """
     frontend_path = os.path.join(os.getcwd(), 'frontend', 'public', 'ranked_lawyer_data.csv')
     root_path = os.path.join(os.getcwd(), 'ranked_lawyer_data.csv')
 
-    if os.path.exists(frontend_path):
-        return FileResponse(frontend_path, media_type='text/csv')
-    if os.path.exists(root_path):
-        return FileResponse(root_path, media_type='text/csv')
+    for path in (frontend_path, root_path):
+        if os.path.exists(path):
+            break
+    else:
+        raise HTTPException(status_code=404, detail='ranked_lawyer_data.csv not found')
 
-    raise HTTPException(status_code=404, detail='ranked_lawyer_data.csv not found')
+    etag = make_etag(read_stamp(), file_fingerprint(path))
+    last_modified = _last_modified(path)
+    offered = [e for e in available_encodings() if precompressed_path(path, e)]
+    encoding = choose_encoding(request.headers.get('accept-encoding'), offered)
+    headers = _validators(variant_etag(etag, encoding), last_modified)
+    if not_modified(request.headers, headers['ETag'], last_modified):
+        return Response(status_code=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return FileResponse(precompressed_path(path, encoding), media_type='text/csv', headers=headers)
 
 
 if __name__ == '__main__':
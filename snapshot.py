@@ -0,0 +1,519 @@
+"""
+Binary columnar snapshots of lawyer data.
+
+A snapshot holds the same table as a lawyer CSV (raw or ranked) without any
+text parsing on load:
+
+    magic (8 bytes) | header length (uint32 LE) | JSON header | padding
+    | column blocks, each 8-byte aligned
+
+The JSON header lists the field names, the row count and, per column, its type
+and the byte ranges of its blocks (relative to the first block):
+
+  * 'int32' columns hold integer text ('12') as one little-endian int32 per
+    row, with INT32_BLANK for a blank cell.
+  * 'float64' columns hold one little-endian double per row (NaN for a blank
+    cell). `text` names the style numeric strings are restored in ('int' for
+    '12', 'repr' for '12.0'); it is null when the cells were numbers.
+  * 'dict' columns hold one int32 code per row (-1 for a cell missing from a
+    short row) plus a dictionary: int64 end offsets into a UTF-8 blob.
+
+Blocks are read with `numpy.frombuffer` over an `mmap`, so loading a snapshot
+is zero-copy. Every column also carries its inferred schema (see `schema`), so
+autodetection needs no scan.
+
+    python snapshot.py lawyer_data.csv              # -> lawyer_data.lrsnap
+    python snapshot.py lawyer_data.lrsnap -o out.csv
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from itertools import islice
+
+import numpy as np
+
+from ranker import SNAPSHOT_SUFFIX, atomic_write
+from schema import SAMPLE_ROWS, infer_column, numeric_columns
+
+MAGIC = b'LRSNAP\x00\x01'
+FORMAT_VERSION = 2
+
+_LENGTH = struct.Struct('<I')
+_ALIGN = 8
+
+# Marks a blank cell in an 'int32' column
+INT32_BLANK = -2 ** 31
+
+
+def _int_style(x):
+    """'12' for integral values, repr otherwise ('3.5')."""
+    if x.is_integer() and abs(x) < 1e16:
+        return str(int(x))
+    return repr(x)
+
+
+# How numeric text is restored; a column qualifies if every cell matches one style
+TEXT_STYLES = {'int': _int_style, 'repr': repr}
+
+
+def _float_cells(values):
+    """
+    Return `(array, text_style)` if every cell of a column can be stored as a
+    double and restored exactly, else None. Cells qualify if they are blank,
+    finite numbers (`text_style` None), or strings that a single entry of
+    TEXT_STYLES reproduces (e.g. '12' and '3.5', or '12.0' and '3.5').
+    """
+    out = np.empty(len(values), dtype='<f8')
+    text = None
+    styles = set(TEXT_STYLES)
+    for i, v in enumerate(values):
+        if v is None:
+            return None
+        if v == '':
+            out[i] = np.nan
+            continue
+        is_text = isinstance(v, str)
+        if text is None:
+            text = is_text
+        elif text != is_text:
+            return None
+        if is_text:
+            try:
+                x = float(v)
+            except ValueError:
+                return None
+            if not math.isfinite(x):
+                return None
+            styles = {style for style in styles if TEXT_STYLES[style](x) == v}
+            if not styles:
+                return None
+        elif isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v):
+            x = float(v)
+        else:
+            return None
+        out[i] = x
+    return out, min(styles) if text else None
+
+
+def _dict_cells(values):
+    """Dictionary-encode a column: `(codes, end_offsets, blob)`."""
+    index = {}
+    codes = np.empty(len(values), dtype='<i4')
+    for i, v in enumerate(values):
+        if v is None:
+            codes[i] = -1
+            continue
+        v = v if isinstance(v, str) else str(v)
+        code = index.get(v)
+        if code is None:
+            code = index[v] = len(index)
+        codes[i] = code
+    encoded = [s.encode('utf-8') for s in index]
+    ends = np.cumsum([len(b) for b in encoded], dtype='<i8') if encoded else np.empty(0, dtype='<i8')
+    return codes, ends, b''.join(encoded)
+
+
+def write_snapshot(f, fieldnames, columns, n_rows):
+    """
+    Write a snapshot to the binary file object `f`. `columns` maps each column
+    name to its `n_rows` cell values, in column order.
+    """
+    metas = []
+    blocks = []
+    position = 0
+
+    def add_block(data):
+        nonlocal position
+        start = position
+        blocks.append(data)
+        position += len(data)
+        pad = -position % _ALIGN
+        if pad:
+            blocks.append(b'\x00' * pad)
+            position += pad
+        return [start, len(data)]
+
+    for name, values in columns.items():
+        meta = {'name': name, 'schema': infer_column(islice(values, SAMPLE_ROWS))}
+        floats = _float_cells(values)
+        if floats is not None:
+            array, text = floats
+            blank = np.isnan(array)
+            values = array[~blank]
+            integral = np.all((values == np.floor(values)) & (values > INT32_BLANK) & (values < 2 ** 31))
+            if text == 'int' and integral:
+                ints = np.where(blank, INT32_BLANK, array).astype('<i4')
+                meta.update(type='int32', data=add_block(ints.tobytes()))
+            else:
+                meta.update(type='float64', text=text, data=add_block(array.tobytes()))
+        else:
+            codes, ends, blob = _dict_cells(values)
+            meta.update(type='dict', size=len(ends), data=add_block(codes.tobytes()),
+                        ends=add_block(ends.tobytes()), blob=add_block(blob))
+        metas.append(meta)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'n_rows': n_rows,
+        'fieldnames': list(fieldnames),
+        'columns': metas,
+    }, separators=(',', ':')).encode('utf-8')
+    prefix = MAGIC + _LENGTH.pack(len(header)) + header
+    f.write(prefix + b'\x00' * (-len(prefix) % _ALIGN))
+    for block in blocks:
+        f.write(block)
+
+
+def save_snapshot(path, fieldnames, columns, n_rows):
+    """Atomically write a snapshot file."""
+    with atomic_write(path, 'wb') as f:
+        write_snapshot(f, fieldnames, columns, n_rows)
+
+
+def snapshot_bytes(fieldnames, columns, n_rows):
+    buf = io.BytesIO()
+    write_snapshot(buf, fieldnames, columns, n_rows)
+    return buf.getvalue()
+
+
+class SnapshotWriter:
+    """
+    Write a snapshot chunk by chunk, for tables too large to hold in memory.
+    `append` takes `{name: cells}` for the next rows of every column: a numpy
+    integer array makes an 'int32' column, any other sequence a 'dict' column
+    (None for a missing cell). Blocks are spooled to temporary files and
+    assembled behind the header on `close`, which replaces `path` atomically.
+
+    Dictionaries deduplicate up to `dict_limit` distinct values; past that new
+    values are appended as they come, so a column of unique names does not
+    keep an index of every row in memory.
+    """
+
+    def __init__(self, path, fieldnames, dict_limit=65536):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.dict_limit = dict_limit
+        self.n_rows = 0
+        self._columns = {}
+
+    def _column(self, name, values):
+        column = self._columns.get(name)
+        if column is None:
+            kind = 'int32' if isinstance(values, np.ndarray) and values.dtype.kind in 'iu' else 'dict'
+            column = self._columns[name] = {
+                'type': kind,
+                'sample': [],
+                'data': tempfile.TemporaryFile(),
+                'ends': tempfile.TemporaryFile() if kind == 'dict' else None,
+                'blob': tempfile.TemporaryFile() if kind == 'dict' else None,
+                'index': {},
+                'size': 0,
+                'blob_size': 0,
+            }
+        return column
+
+    def append(self, columns):
+        n = None
+        for name in self.fieldnames:
+            values = columns[name]
+            if n is None:
+                n = len(values)
+            elif len(values) != n:
+                raise ValueError(f"Column {name!r} has {len(values)} cells, expected {n}")
+            column = self._column(name, values)
+            room = SAMPLE_ROWS - len(column['sample'])
+            if room > 0:
+                head = values[:room]
+                column['sample'].extend(head.tolist() if isinstance(head, np.ndarray) else head)
+            if column['type'] == 'int32':
+                if not (isinstance(values, np.ndarray) and values.dtype.kind in 'iu'):
+                    raise ValueError(f"Column {name!r} changed type between chunks")
+                if len(values) and (values.min() <= INT32_BLANK or values.max() >= 2 ** 31):
+                    raise ValueError(f"Column {name!r} does not fit in int32")
+                column['data'].write(values.astype('<i4').tobytes())
+            else:
+                self._append_dict(column, values)
+        self.n_rows += n or 0
+
+    def _append_dict(self, column, values):
+        index = column['index']
+        codes = np.empty(len(values), dtype='<i4')
+        encoded = []
+        for i, v in enumerate(values):
+            if v is None:
+                codes[i] = -1
+                continue
+            v = v if isinstance(v, str) else str(v)
+            code = index.get(v)
+            if code is None:
+                code = column['size']
+                column['size'] += 1
+                if len(index) < self.dict_limit:
+                    index[v] = code
+                encoded.append(v.encode('utf-8'))
+            codes[i] = code
+        column['data'].write(codes.tobytes())
+        if encoded:
+            ends = np.cumsum([len(b) for b in encoded], dtype='<i8') + column['blob_size']
+            column['ends'].write(ends.tobytes())
+            column['blob'].write(b''.join(encoded))
+            column['blob_size'] = int(ends[-1])
+
+    def close(self):
+        """Write the snapshot to `path`; returns the path."""
+        metas = []
+        blocks = []
+        position = 0
+
+        def add_block(spool):
+            nonlocal position
+            nbytes = spool.tell()
+            start = position
+            blocks.append((spool, nbytes))
+            position += nbytes + (-nbytes % _ALIGN)
+            return [start, nbytes]
+
+        for name in self.fieldnames:
+            column = self._columns.get(name) or self._column(name, [])
+            meta = {'name': name, 'schema': infer_column(column['sample']), 'type': column['type']}
+            meta['data'] = add_block(column['data'])
+            if column['type'] == 'dict':
+                meta.update(size=column['size'], ends=add_block(column['ends']), blob=add_block(column['blob']))
+            metas.append(meta)
+
+        header = json.dumps({
+            'version': FORMAT_VERSION,
+            'n_rows': self.n_rows,
+            'fieldnames': self.fieldnames,
+            'columns': metas,
+        }, separators=(',', ':')).encode('utf-8')
+        prefix = MAGIC + _LENGTH.pack(len(header)) + header
+        try:
+            with atomic_write(self.path, 'wb') as f:
+                f.write(prefix + b'\x00' * (-len(prefix) % _ALIGN))
+                for spool, nbytes in blocks:
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, f)
+                    f.write(b'\x00' * (-nbytes % _ALIGN))
+        finally:
+            self._discard()
+        return self.path
+
+    def _discard(self):
+        for column in self._columns.values():
+            for key in ('data', 'ends', 'blob'):
+                if column[key] is not None:
+                    column[key].close()
+        self._columns.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+
+def rows_to_columns(fieldnames, rows):
+    """Column-wise view of row dicts (e.g. a ranking), missing keys as ''."""
+    return {name: [row.get(name, '') for row in rows] for name in dict.fromkeys(fieldnames)}
+
+
+class Snapshot:
+    """
+    A memory-mapped snapshot. Offers the same interface as
+    `numpy_ranker.LawyerTable`, so the columnar scorer runs on it unchanged.
+    Numeric arrays are views of the mapping; strings are decoded on access.
+    """
+
+    def __init__(self, buffer, closer=None):
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError('Not a lawyer snapshot (bad magic)')
+        (length,) = _LENGTH.unpack_from(buffer, len(MAGIC))
+        start = len(MAGIC) + _LENGTH.size
+        header = json.loads(bytes(buffer[start:start + length]).decode('utf-8'))
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {header.get('version')!r}")
+        base = start + length
+        base += -base % _ALIGN
+
+        self._buffer = buffer
+        self._closer = closer
+        self._base = base
+        self.fieldnames = header['fieldnames']
+        self.n_rows = header['n_rows']
+        self.meta = {col['name']: col for col in header['columns']}
+        self._arrays = {}
+        self._strings = {}
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, mapped.close)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(memoryview(data))
+
+    def close(self):
+        self._arrays.clear()
+        self._strings.clear()
+        self._buffer = None
+        if self._closer is not None:
+            try:
+                self._closer()
+            except BufferError:
+                # arrays handed out still reference the mapping; it is freed with them
+                pass
+            self._closer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _block(self, extent, dtype):
+        start, nbytes = extent
+        return np.frombuffer(self._buffer, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize,
+                             offset=self._base + start)
+
+    def _dictionary(self, meta):
+        """Decoded dictionary of a 'dict' column (cached)."""
+        strings = self._strings.get(meta['name'])
+        if strings is None:
+            ends = self._block(meta['ends'], '<i8').tolist()
+            start, nbytes = meta['blob']
+            blob = bytes(self._buffer[self._base + start:self._base + start + nbytes])
+            strings = []
+            prev = 0
+            for end in ends:
+                strings.append(blob[prev:end].decode('utf-8'))
+                prev = end
+            self._strings[meta['name']] = strings
+        return strings
+
+    def detect_numeric_columns(self):
+        """Numeric columns per the schema inferred when the snapshot was written."""
+        return numeric_columns(self.fieldnames, {name: meta['schema'] for name, meta in self.meta.items()})
+
+    def column_array(self, name):
+        """Float64 scores of a column (blank, missing and non-numeric cells are 0.0)."""
+        arr = self._arrays.get(name)
+        if arr is not None:
+            return arr
+        meta = self.meta.get(name)
+        if meta is None:
+            arr = np.zeros(self.n_rows)
+        elif meta['type'] == 'int32':
+            data = self._block(meta['data'], '<i4')
+            arr = np.where(data == INT32_BLANK, 0.0, data.astype(np.float64))
+        elif meta['type'] == 'float64':
+            data = self._block(meta['data'], '<f8')
+            arr = np.where(np.isnan(data), 0.0, data)
+        else:
+            from numpy_ranker import _to_float
+            # one conversion per distinct value; code -1 picks the trailing 0.0
+            values = np.array([_to_float(s) for s in self._dictionary(meta)] + [0.0])
+            arr = values[self._block(meta['data'], '<i4')]
+        self._arrays[name] = arr
+        return arr
+
+    def feature_matrix(self, names):
+        matrix = np.empty((self.n_rows, len(names)), dtype=np.float64, order='F')
+        for j, name in enumerate(names):
+            matrix[:, j] = self.column_array(name)
+        return matrix
+
+    def cells(self, name, indices=None):
+        """Original cell values of a column, for all rows or the given row indices."""
+        meta = self.meta[name]
+        if meta['type'] == 'int32':
+            data = self._block(meta['data'], '<i4')
+            values = (data if indices is None else data[indices]).tolist()
+            return ['' if x == INT32_BLANK else str(x) for x in values]
+        if meta['type'] == 'float64':
+            data = self._block(meta['data'], '<f8')
+            values = (data if indices is None else data[indices]).tolist()
+            fmt = TEXT_STYLES[meta['text']] if meta['text'] else float
+            return ['' if x != x else fmt(x) for x in values]
+        codes = self._block(meta['data'], '<i4')
+        codes = (codes if indices is None else codes[indices]).tolist()
+        strings = self._dictionary(meta)
+        return [strings[c] if c >= 0 else None for c in codes]
+
+    def columns(self):
+        """All columns as `{name: [cell, ...]}`."""
+        return {name: self.cells(name) for name in self.meta}
+
+    def rows(self, order, scores=None):
+        """Rebuild row dicts (plus `score`, if given) in the given index order."""
+        names = list(self.meta)
+        cols = [self.cells(name, order) for name in names]
+        out = [dict(zip(names, values)) for values in zip(*cols)] if cols else [{} for _ in order]
+        if scores is not None:
+            for row, score in zip(out, scores[order].tolist()):
+                row['score'] = score
+        return out
+
+
+def csv_to_snapshot(csv_path, snapshot_path=None):
+    """Convert a lawyer CSV to a snapshot; returns the snapshot path."""
+    from numpy_ranker import LawyerTable
+    snapshot_path = snapshot_path or os.path.splitext(csv_path)[0] + SNAPSHOT_SUFFIX
+    table = LawyerTable.from_csv(csv_path)
+    save_snapshot(snapshot_path, table.fieldnames, table.columns, table.n_rows)
+    return snapshot_path
+
+
+def snapshot_to_csv(snapshot_path, csv_path=None):
+    """Convert a snapshot back to CSV; returns the CSV path."""
+    csv_path = csv_path or os.path.splitext(snapshot_path)[0] + '.csv'
+    with Snapshot.open(snapshot_path) as snap:
+        names = list(snap.meta)
+        columns = snap.columns()
+        with atomic_write(csv_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for values in zip(*(columns[name] for name in names)):
+                writer.writerow(values)
+    return csv_path
+
+
+def rank_file_snapshot(input_file, config_file=None, top_k=None, offset=0, limit=None, after=None):
+    """
+    Rank a snapshot file with the columnar scorer; returns the same
+    `(page, fieldnames)` pair as the CSV engines, with identical scores and
+    tie order.
+    """
+    from numpy_ranker import rank_table_page
+    from ranker import load_weights
+    weights, use_autodetect = load_weights(config_file)
+    snap = Snapshot.open(input_file)
+    try:
+        page = rank_table_page(snap, weights, use_autodetect, top_k, offset, limit, after)
+    finally:
+        snap.close()
+    return page, snap.fieldnames
+
+
+if __name__ == '__main__':
+    cli = argparse.ArgumentParser(description='Convert lawyer data between CSV and binary snapshots.')
+    cli.add_argument('input', help=f'a .csv file, or a {SNAPSHOT_SUFFIX} file to convert back to CSV')
+    cli.add_argument('-o', '--output', default=None)
+    args = cli.parse_args()
+
+    if args.input.endswith(SNAPSHOT_SUFFIX):
+        print(f"Wrote {snapshot_to_csv(args.input, args.output)}")
+    else:
+        print(f"Wrote {csv_to_snapshot(args.input, args.output)}")
@@ -0,0 +1,266 @@
+import argparse
+import csv
+import heapq
+import os
+import pickle
+import tempfile
+from contextlib import closing
+
+from ranker import (
+    OUTPUT_PATH_ROOT,
+    atomic_write,
+    build_page,
+    header_positions,
+    load_weights,
+    normalize_fieldnames,
+    output_fieldnames,
+    page_size,
+    score_lawyer,
+    scoring_weights,
+)
+from schema import load_schema, numeric_columns
+
+# Rows held in memory before a sorted run is spilled to disk
+DEFAULT_RUN_SIZE = 100000
+
+# Maximum number of runs merged at once (bounds open file handles)
+MAX_MERGE_FAN_IN = 64
+
+# Rows per pickled batch inside a run file
+RUN_BATCH_SIZE = 1024
+
+
+def read_fieldnames(input_file):
+    """Return the normalized header of a CSV without reading any rows."""
+    with open(input_file, 'r', encoding='utf-8', newline='') as csvfile:
+        return normalize_fieldnames(next(csv.reader(csvfile), []))
+
+
+def iter_rows(input_file):
+    """
+    Yield normalized row dicts one at a time.
+
+    Headers are normalized once up front; rows match what `csv.DictReader` plus
+    `ranker.normalize_row` produce (blank lines skipped, short rows padded with None).
+    """
+    with open(input_file, 'r', encoding='utf-8', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        yield from row_dicts(reader, next(reader, []))
+
+
+def row_dicts(reader, header):
+    """Normalized row dicts for the rows of a `csv.reader`, given the file's raw header."""
+    items = list(header_positions(header).items())
+    width = len(header)
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row = row + [None] * (width - len(row))
+        yield {name: row[i] for name, i in items}
+
+
+def detect_numeric_columns_streaming(input_file, fieldnames):
+    """
+    Numeric columns per the inferred schema of the file (see `schema`), which
+    only reads a bounded sample of leading rows and is cached per file version.
+    """
+    return numeric_columns(fieldnames, load_schema(input_file))
+
+
+def stream_weight_pairs(input_file, config_file=None):
+    """Resolve the `(column, weight)` pairs used for scoring without loading the file."""
+    weights, use_autodetect = load_weights(config_file)
+    numeric_columns = []
+    if use_autodetect:
+        numeric_columns = detect_numeric_columns_streaming(input_file, read_fieldnames(input_file))
+    return scoring_weights(weights, use_autodetect, numeric_columns)
+
+
+def iter_scored(input_file, weight_pairs):
+    """Yield `(row_index, row)` pairs with `row['score']` filled in, as they are read."""
+    for i, row in enumerate(iter_rows(input_file)):
+        row['score'] = score_lawyer(row, weight_pairs)
+        yield i, row
+
+
+def _rank_key(item):
+    # descending score, ties in original row order
+    return (-item[1]['score'], item[0])
+
+
+def _spill_run(items, tmp_dir):
+    """Sort `items` and write them to a temporary run file."""
+    items.sort(key=_rank_key)
+    fd, path = tempfile.mkstemp(prefix='rankrun-', suffix='.run', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as f:
+        _write_run(f, items)
+    return path
+
+
+def _write_run(f, items):
+    # a run file is a sequence of independently pickled batches of `(row_index, row)` pairs
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= RUN_BATCH_SIZE:
+            pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+            batch = []
+    if batch:
+        pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_run(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def _merge_runs(paths, readers):
+    """Lazily k-way merge run files, registering the open readers for cleanup."""
+    runs = [_read_run(path) for path in paths]
+    readers.extend(runs)
+    return heapq.merge(*runs, key=_rank_key)
+
+
+def sorted_stream(items, run_size=DEFAULT_RUN_SIZE, tmp_dir=None):
+    """
+    External merge sort of `(row_index, row)` pairs by rank.
+
+    At most `run_size` rows are held in memory: each full chunk is sorted and
+    spilled to a temporary run file, and the runs are then k-way merged (in
+    several passes if there are more than MAX_MERGE_FAN_IN of them). Inputs that
+    fit in a single run are sorted in memory. Temporary files are removed when
+    the generator finishes or is closed.
+    """
+    runs = []
+    readers = []
+    try:
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= run_size:
+                runs.append(_spill_run(chunk, tmp_dir))
+                chunk = []
+        if not runs:
+            chunk.sort(key=_rank_key)
+            yield from chunk
+            return
+        if chunk:
+            runs.append(_spill_run(chunk, tmp_dir))
+        chunk = None
+
+        while len(runs) > MAX_MERGE_FAN_IN:
+            group, runs = runs[:MAX_MERGE_FAN_IN], runs[MAX_MERGE_FAN_IN:]
+            fd, merged_path = tempfile.mkstemp(prefix='rankrun-', suffix='.run', dir=tmp_dir)
+            runs.append(merged_path)
+            with os.fdopen(fd, 'wb') as f:
+                _write_run(f, _merge_runs(group, readers))
+            for path in group:
+                os.remove(path)
+
+        yield from _merge_runs(runs, readers)
+    finally:
+        for reader in readers:
+            reader.close()
+        for path in runs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def rank_file_stream(input_file, config_file=None, top_k=None, offset=0, limit=None, after=None,
+                     run_size=DEFAULT_RUN_SIZE, tmp_dir=None):
+    """
+    Streaming counterpart of the row-wise ranking in `ranker`: returns the same
+    `(page, fieldnames)` pair. Rows are scored as they are read; pages are
+    selected with a heap bounded by the page size, and unbounded requests go
+    through `sorted_stream`.
+    """
+    fieldnames = read_fieldnames(input_file)
+    pairs = stream_weight_pairs(input_file, config_file)
+    counts = {'total': 0, 'remaining': 0}
+
+    def candidates():
+        after_key = (-after[0], after[1]) if after is not None else None
+        for item in iter_scored(input_file, pairs):
+            counts['total'] += 1
+            if after_key is not None and _rank_key(item) <= after_key:
+                continue
+            counts['remaining'] += 1
+            yield item
+
+    count = page_size(top_k, offset, limit, after)
+    if count is None:
+        selected = list(sorted_stream(candidates(), run_size, tmp_dir))
+    else:
+        selected = heapq.nsmallest(count, candidates(), key=_rank_key)
+    selected = selected[offset:]
+
+    items = [row for _, row in selected]
+    last_index = selected[-1][0] if selected else None
+    page = build_page(items, counts['total'], counts['remaining'], top_k, offset, limit, after, last_index)
+    return page, fieldnames
+
+
+def iter_ranked(input_file, config_file=None, top_k=None, offset=0, limit=None,
+                run_size=DEFAULT_RUN_SIZE, tmp_dir=None):
+    """
+    Yield ranked row dicts one at a time, in rank order, with bounded memory:
+    a heap bounded by the page size when `top_k`/`limit` cap the output,
+    `sorted_stream` otherwise. Rows equal those of `ranker.rank_lawyers`.
+    """
+    pairs = stream_weight_pairs(input_file, config_file)
+    count = page_size(top_k, offset, limit)
+    if count is not None:
+        for _, row in heapq.nsmallest(count, iter_scored(input_file, pairs), key=_rank_key)[offset:]:
+            yield row
+        return
+    with closing(sorted_stream(iter_scored(input_file, pairs), run_size, tmp_dir)) as ranked:
+        for i, (_, row) in enumerate(ranked):
+            if i >= offset:
+                yield row
+
+
+def write_stream_ranking(input_file, config_file=None, output_file=OUTPUT_PATH_ROOT,
+                         run_size=DEFAULT_RUN_SIZE, tmp_dir=None):
+    """
+    Atomically write the full ranked CSV for `input_file` to `output_file` with
+    bounded memory, regardless of input size. Returns the number of rows written.
+    """
+    fieldnames = read_fieldnames(input_file)
+    pairs = stream_weight_pairs(input_file, config_file)
+    written = 0
+    with closing(sorted_stream(iter_scored(input_file, pairs), run_size, tmp_dir)) as ranked:
+        with atomic_write(output_file, 'w', encoding='utf-8', newline='') as outcsv:
+            writer = None
+            for _, row in ranked:
+                if writer is None:
+                    writer = csv.DictWriter(outcsv, fieldnames=output_fieldnames(fieldnames, [row]))
+                    writer.writeheader()
+                writer.writerow({k: row.get(k, '') for k in writer.fieldnames})
+                written += 1
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rank a lawyer CSV with bounded memory.')
+    parser.add_argument('input_file')
+    parser.add_argument('--config', default=None, help='JSON weights file')
+    parser.add_argument('--top-k', type=int, default=None, help='only print the best K lawyers')
+    parser.add_argument('--output', default=OUTPUT_PATH_ROOT, help='ranked CSV to write')
+    parser.add_argument('--run-size', type=int, default=DEFAULT_RUN_SIZE)
+    args = parser.parse_args()
+
+    if args.top_k is not None:
+        page, _ = rank_file_stream(args.input_file, args.config, top_k=args.top_k)
+        for i, lawyer in enumerate(page['items']):
+            print(f"{i+1}. {lawyer.get('Name', lawyer.get('name', ''))} (Score: {lawyer['score']})")
+    else:
+        n = write_stream_ranking(args.input_file, args.config, args.output, args.run_size)
+        print(f"Wrote {n} ranked rows to {args.output}")
@@ -67,7 +67,7 @@ def test_ranker_sorts_correctly():
         writer.writerow({'name': 'Lawyer C', 'location': 'City C', 'practice_areas': 'Area C', 'description_length': 50})
 
     # Run the ranker
-    ranked_list = rank_lawyers(dummy_csv_file)
+    ranked_list = rank_lawyers(dummy_csv_file, write_output=False)
 
     # Check that the list is sorted correctly
     assert len(ranked_list) == 3
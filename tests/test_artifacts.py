@@ -0,0 +1,74 @@
+import os
+import shutil
+from fastapi.testclient import TestClient
+import ranker
+import server
+from artifacts import ArtifactWriter, STAMP_PATH, generate_artifacts
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FRONTEND_COPY = os.path.join('frontend', 'public', 'ranked_lawyer_data.csv')
+
+
+def setup_workdir(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(REPO_ROOT, 'lawyer_data.csv'), tmp_path / 'lawyer_data.csv')
+    monkeypatch.chdir(tmp_path)
+
+
+def test_generate_artifacts_writes_once_and_skips_unchanged_inputs(tmp_path, monkeypatch):
+    setup_workdir(tmp_path, monkeypatch)
+
+    assert generate_artifacts('lawyer_data.csv') is True
+    assert os.path.exists('ranked_lawyer_data.csv')
+    assert os.path.exists(STAMP_PATH)
+    with open('ranked_lawyer_data.csv', 'rb') as a, open(FRONTEND_COPY, 'rb') as b:
+        assert a.read() == b.read()
+    # no temporary files are left behind
+    assert not [name for name in os.listdir('.') if name.endswith('.tmp')]
+
+    mtime = os.stat('ranked_lawyer_data.csv').st_mtime_ns
+    assert generate_artifacts('lawyer_data.csv') is False
+    assert os.stat('ranked_lawyer_data.csv').st_mtime_ns == mtime
+
+    with open('lawyer_data.csv', 'a', encoding='utf-8', newline='') as f:
+        f.write('New Lawyer,Skadden,5,20,5,1,100,50,20,5,10,5,5,5\n')
+    assert generate_artifacts('lawyer_data.csv') is True
+    with open('ranked_lawyer_data.csv', encoding='utf-8') as f:
+        assert 'New Lawyer' in f.read()
+
+
+def test_failed_write_does_not_record_the_inputs(tmp_path, monkeypatch):
+    setup_workdir(tmp_path, monkeypatch)
+
+    def fail(*args):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(ranker, 'write_ranked_csv', fail)
+    assert generate_artifacts('lawyer_data.csv') is False
+    assert not os.path.exists(STAMP_PATH)
+    monkeypatch.undo()
+    monkeypatch.chdir(tmp_path)
+    # the next call writes them instead of skipping
+    assert generate_artifacts('lawyer_data.csv') is True
+    assert os.path.exists('ranked_lawyer_data.csv')
+
+
+def test_artifact_writer_runs_in_background(tmp_path, monkeypatch):
+    setup_workdir(tmp_path, monkeypatch)
+    writer = ArtifactWriter()
+    writer.submit('lawyer_data.csv')
+    writer.submit('lawyer_data.csv')
+    writer.wait(10)
+    assert os.path.exists('ranked_lawyer_data.csv')
+    assert os.path.exists(FRONTEND_COPY)
+
+
+def test_api_ranked_does_not_write_files(tmp_path, monkeypatch):
+    setup_workdir(tmp_path, monkeypatch)
+    submitted = []
+    monkeypatch.setattr(server.artifact_writer, 'submit', lambda *args: submitted.append(args))
+    server.ranking_cache.clear()
+
+    resp = TestClient(server.app).get('/api/ranked')
+    assert resp.status_code == 200
+    assert sorted(os.listdir('.')) == ['lawyer_data.csv']
+    assert len(submitted) == 1
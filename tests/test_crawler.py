@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from crawler import HostRateLimiter, crawl
+from scraper import extract_lawyers
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def read_fixture(name):
+    with open(os.path.join(REPO_ROOT, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def stub_server():
+    """Local HTTP server serving the bundled Justia fixtures.
+
+    /lawyers/california      -> justia_california.html (links to ?page=2)
+    /lawyers/california?page=2 -> justia.html (no cards, no next link)
+    /lawyers/flaky           -> 503 twice, then justia_california.html
+    anything else            -> 404
+    """
+    pages = {
+        '/lawyers/california': read_fixture('justia_california.html'),
+        '/lawyers/california?page=2': read_fixture('justia.html'),
+    }
+    hits = []
+    failures = {'/lawyers/flaky': 2}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                hits.append((self.path, time.monotonic()))
+                remaining = failures.get(self.path, 0)
+                if remaining:
+                    failures[self.path] = remaining - 1
+            if remaining:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = pages.get(self.path) or (pages['/lawyers/california'] if self.path == '/lawyers/flaky' else None)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.hits = hits
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_crawl_follows_pagination(stub_server):
+    expected = extract_lawyers(read_fixture('justia_california.html').decode('utf-8'))
+
+    records = crawl([stub_server.base_url + '/lawyers/california'], min_interval=0)
+
+    assert records == expected
+    paths = [path for path, _ in stub_server.hits]
+    assert paths == ['/lawyers/california', '/lawyers/california?page=2']
+
+
+def test_crawl_max_pages_retries_and_failures(stub_server):
+    base = stub_server.base_url
+    records = crawl(
+        [base + '/lawyers/flaky', base + '/lawyers/missing'],
+        max_pages=1, min_interval=0, backoff=0.01,
+    )
+
+    # flaky listing succeeds on the third attempt; the missing one is skipped
+    assert len(records) == len(extract_lawyers(read_fixture('justia_california.html').decode('utf-8')))
+    paths = [path for path, _ in stub_server.hits]
+    assert paths.count('/lawyers/flaky') == 3
+    assert paths.count('/lawyers/missing') == 1
+    assert '/lawyers/california?page=2' not in paths
+
+
+def test_crawl_rate_limits_per_host(stub_server):
+    base = stub_server.base_url
+    crawl([base + '/lawyers/california', base + '/lawyers/california?page=2', base + '/lawyers/x'],
+          max_pages=1, max_workers=4, min_interval=0.1)
+
+    times = sorted(t for _, t in stub_server.hits)
+    assert len(times) == 3
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert min(gaps) >= 0.08
+
+
+def test_host_rate_limiter_does_not_block_other_hosts():
+    limiter = HostRateLimiter(min_interval=0.5)
+    start = time.monotonic()
+    limiter.wait('http://a.example/1')
+    limiter.wait('http://b.example/1')
+    assert time.monotonic() - start < 0.2
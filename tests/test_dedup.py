@@ -0,0 +1,84 @@
+import csv
+
+from dedup import dedup_files, dedup_rows, find_duplicates, normalize_firm, normalize_name
+
+FIELDS = ['name', 'location', 'practice_areas', 'description_length', 'Firm']
+
+
+def _row(name, location='', areas='', length='', firm=''):
+    return dict(zip(FIELDS, (name, location, areas, length, firm)))
+
+
+def test_normalization():
+    assert normalize_name('Smith, John A. Jr.') == normalize_name('john a smith') == ('john', 'a', 'smith')
+    assert normalize_name('Dr. José Álvarez, Esq.') == ('jose', 'alvarez')
+    assert normalize_name('') == ()
+    assert normalize_firm('The Smith Law Firm, P.C.') == normalize_firm('SMITH LLC') == 'smith'
+    assert normalize_firm('Kirkland & Ellis LLP') == 'kirkland and ellis'
+    assert normalize_firm('Law Offices') == 'law offices'
+
+
+def test_same_lawyer_across_listings_is_merged():
+    rows = [
+        _row('John A. Smith', 'Baltimore, MD', 'DUI, Criminal Law', '120'),
+        _row('Jane Doe', 'Austin, TX', 'Tax', '50'),
+        _row('Smith, John', 'Washington, DC', 'criminal law', 90, 'Smith Law Firm, LLC'),
+        _row('J. Smith', 'Towson, MD', 'Criminal Law', '400'),
+        _row('John B. Smith', 'Towson, MD', 'Criminal Law', '1'),
+        _row(''),
+        _row(''),
+    ]
+    deduped, groups = dedup_rows(rows, FIELDS)
+    assert groups == [[0, 2, 3], [1], [4], [5], [6]]
+    assert deduped[0] == {
+        'name': 'John A. Smith',
+        'location': 'Baltimore, MD; Washington, DC; Towson, MD',
+        'practice_areas': 'DUI, Criminal Law',
+        'description_length': '400',
+        'Firm': 'Smith Law Firm, LLC',
+    }
+    assert deduped[1] is rows[1]
+
+
+def test_chains_through_blank_fields_do_not_join_different_lawyers():
+    rows = [
+        _row('John Smith', areas='Tax', firm='Alpha'),
+        _row('John Smith'),
+        _row('John Smith', areas='Family Law'),
+        _row('John Smith', areas='Tax', firm='Beta LLP'),
+        _row('J Smith', firm='Alpha LLP'),
+    ]
+    groups = find_duplicates(rows, FIELDS)
+    assert groups == [[0, 4], [1, 2], [3]]
+    # the result does not depend on the input order
+    order = [3, 1, 4, 0, 2]
+    shuffled = find_duplicates([rows[i] for i in order], FIELDS)
+    assert sorted(sorted(order[i] for i in g) for g in shuffled) == sorted(groups)
+
+
+def test_window_bounds_comparisons():
+    rows = [_row('Ann Lee', firm='F'), _row('A Lee', firm='G'), _row('A Lee', firm='H'), _row('Ann Lee', firm='F')]
+    # identical keys are grouped exactly, whatever the window
+    assert find_duplicates(rows, FIELDS, window=1) == [[0, 3], [1], [2]]
+    rows = [_row(f'Ann {chr(97 + i)} Lee') for i in range(5)] + [_row('Ann Lee')]
+    assert find_duplicates(rows, FIELDS, window=1) == [[0], [1], [2], [3], [4, 5]]
+    assert len(find_duplicates(rows, FIELDS)) == 5
+
+
+def test_files_with_different_headers_are_combined(tmp_path):
+    scraped = tmp_path / 'lawyers.csv'
+    scraped.write_text('name,location,practice_areas,description_length\n'
+                       'Jane Roe,"Baltimore, MD",Tax,10\n'
+                       'Jane Roe,"Richmond, VA",Tax,30\n', encoding='utf-8')
+    data = tmp_path / 'lawyer_data.csv'
+    data.write_text('Name,Firm,Years PE\nJane Roe,Roe LLP,4\nJ. Roe,Other,2\n', encoding='utf-8')
+    out = tmp_path / 'combined.csv'
+    assert dedup_files([str(scraped), str(data)], str(out)) == (4, 2)
+    with open(out, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert rows == [
+        {'name': 'Jane Roe', 'location': 'Baltimore, MD; Richmond, VA', 'practice_areas': 'Tax',
+         'description_length': '30', 'Firm': 'Roe LLP', 'Years PE': '4'},
+        {'name': 'J. Roe', 'location': '', 'practice_areas': '', 'description_length': '', 'Firm': 'Other',
+         'Years PE': '2'},
+    ]
@@ -0,0 +1,78 @@
+import gzip
+import os
+import shutil
+from fastapi.testclient import TestClient
+import server
+from artifacts import generate_artifacts
+from delivery import choose_encoding, encode_variants, not_modified
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_choose_encoding_and_conditionals():
+    assert choose_encoding('gzip, deflate', ('gzip',)) == 'gzip'
+    assert choose_encoding('gzip;q=0, identity', ('gzip',)) == 'identity'
+    assert choose_encoding('*', ('gzip',)) == 'gzip'
+    assert choose_encoding(None, ('gzip',)) == 'identity'
+    assert choose_encoding('gzip', ()) == 'identity'
+
+    assert not_modified({'if-none-match': '"a", W/"b"'}, '"b"')
+    assert not_modified({'if-none-match': '*'}, '"b"')
+    assert not not_modified({'if-none-match': '"a"'}, '"b"', last_modified=0)
+    assert not_modified({'if-modified-since': 'Thu, 01 Jan 2026 00:00:00 GMT'}, '"b"', last_modified=1700000000)
+    assert not not_modified({'if-modified-since': 'Thu, 01 Jan 2026 00:00:00 GMT'}, '"b"', last_modified=1800000000)
+
+    body = b'Name,score\n' * 100
+    variants = encode_variants(body)
+    assert gzip.decompress(variants['gzip']) == body
+    assert encode_variants(b'[]') == {'identity': b'[]'}
+
+
+def test_api_ranked_is_compressed_and_revalidated():
+    client = TestClient(server.app)
+    first = client.get('/api/ranked', headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200
+    assert first.headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in first.headers['vary']
+    etag = first.headers['etag']
+
+    plain = client.get('/api/ranked', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in plain.headers
+    assert plain.headers['etag'] != etag
+    assert plain.json() == first.json()
+
+    # revalidation is answered without ranking or sending the body
+    server.ranking_cache.clear()
+    again = client.get('/api/ranked', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.content == b''
+    assert again.headers['etag'] == etag
+    assert server.ranking_cache.stats()['entries'] == 0
+
+
+def test_ranked_csv_served_precompressed_with_etag(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(REPO_ROOT, 'lawyer_data.csv'), tmp_path / 'lawyer_data.csv')
+    monkeypatch.chdir(tmp_path)
+    assert generate_artifacts('lawyer_data.csv') is True
+    assert os.path.exists('ranked_lawyer_data.csv.gz')
+    assert os.path.exists(os.path.join('frontend', 'public', 'ranked_lawyer_data.csv.gz'))
+    with open('ranked_lawyer_data.csv', 'rb') as f:
+        expected = f.read()
+
+    client = TestClient(server.app)
+    resp = client.get('/ranked_lawyer_data.csv', headers={'Accept-Encoding': 'gzip'})
+    assert resp.status_code == 200
+    assert resp.headers['content-encoding'] == 'gzip'
+    assert resp.content == expected
+    etag = resp.headers['etag']
+    assert client.get('/ranked_lawyer_data.csv', headers={'Accept-Encoding': 'gzip',
+                                                          'If-None-Match': etag}).status_code == 304
+    assert client.get('/ranked_lawyer_data.csv', headers={'Accept-Encoding': 'identity'}).content == expected
+
+    with open('lawyer_data.csv', 'a', encoding='utf-8', newline='') as f:
+        f.write('New Lawyer,Skadden,5,20,5,1,100,50,20,5,10,5,5,5\n')
+    assert generate_artifacts('lawyer_data.csv') is True
+    changed = client.get('/ranked_lawyer_data.csv', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['etag'] != etag
+    assert b'New Lawyer' in changed.content
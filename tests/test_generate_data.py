@@ -0,0 +1,55 @@
+import csv
+
+import pytest
+from ranker import rank_lawyers
+
+np = pytest.importorskip('numpy')
+from generate_data import FIELDNAMES, generate_columns, write_dataset  # noqa: E402
+from snapshot import Snapshot  # noqa: E402
+
+
+def test_columns_are_seeded_and_within_original_ranges():
+    a = generate_columns(7, 0, 5000)
+    b = generate_columns(7, 0, 5000)
+    assert list(a) == FIELDNAMES
+    for name in FIELDNAMES:
+        assert np.array_equal(np.asarray(a[name]), np.asarray(b[name]))
+    assert not np.array_equal(a['Law360 News'], generate_columns(8, 0, 5000)['Law360 News'])
+    assert a['Name'][42].endswith(' 42')
+    assert a['Chambers Rank'].min() >= 1 and a['Chambers Rank'].max() <= 5
+    assert a['Years PE'].min() >= 1 and a['Years PE'].max() <= 20
+    assert a['Law360 News'].max() <= 100 and a['Google News'].max() <= 20
+    # press coverage follows seniority
+    assert np.corrcoef(a['Years PE'], a['Law360 News'])[0, 1] > 0.2
+
+
+def test_csv_is_identical_across_processes_and_matches_snapshot(tmp_path):
+    one = write_dataset(str(tmp_path / 'one.csv'), 2500, seed=3, chunk_rows=1000)
+    two = write_dataset(str(tmp_path / 'two.csv'), 2500, seed=3, chunk_rows=1000, processes=2)
+    assert open(one, 'rb').read() == open(two, 'rb').read()
+    with open(one, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2500 and rows[1999]['Name'].endswith(' 1999')
+
+    snap = write_dataset(str(tmp_path / 'data.lrsnap'), 2500, seed=3, chunk_rows=1000)
+    with Snapshot.open(snap) as s:
+        assert s.n_rows == 2500
+        assert s.meta['Years PE']['type'] == 'int32' and s.meta['Firm']['type'] == 'dict'
+        assert s.meta['Years PE']['schema']['type'] == 'numeric'
+    assert rank_lawyers(snap, write_output=False) == rank_lawyers(one, write_output=False)
+
+    # databases are upserted on Name, so writing the same rows twice keeps one copy
+    db = write_dataset(str(tmp_path / 'data.db'), 2500, seed=3, chunk_rows=1000)
+    write_dataset(db, 2500, seed=3, chunk_rows=1000)
+    assert rank_lawyers(db, write_output=False) == rank_lawyers(one, write_output=False)
+
+
+def test_snapshot_writer_stops_deduplicating_past_dict_limit(tmp_path):
+    from snapshot import SnapshotWriter
+    path = str(tmp_path / 'names.lrsnap')
+    with SnapshotWriter(path, ['Name'], dict_limit=2) as writer:
+        writer.append({'Name': ['a', 'b', 'a', None]})
+        writer.append({'Name': ['c', 'c', 'b']})
+    with Snapshot.open(path) as s:
+        assert s.cells('Name') == ['a', 'b', 'a', None, 'c', 'c', 'b']
+        assert s.meta['Name']['size'] == 4
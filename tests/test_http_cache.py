@@ -0,0 +1,117 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_cache
+from crawler import crawl
+from http_cache import PageCache
+from scraper import extract_lawyers
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def read_fixture(name):
+    with open(os.path.join(REPO_ROOT, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def stub_server():
+    """Serves `server.pages[path] = (body, etag)`, honouring If-None-Match when the page has an ETag."""
+    pages = {
+        '/lawyers/california': (read_fixture('justia_california.html'), '"v1"'),
+        '/lawyers/california?page=2': (read_fixture('justia.html'), None),
+    }
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append((self.path, self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')))
+            body, etag = pages[self.path]
+            if etag is not None and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if etag is not None:
+                self.send_header('ETag', etag)
+            self.send_header('Last-Modified', 'Wed, 01 Jan 2025 00:00:00 GMT')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.pages = pages
+    server.requests_seen = requests_seen
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+    real = http_cache.parse_listing
+
+    def counting(html, parser=None):
+        calls.append(parser)
+        return real(html, parser)
+
+    monkeypatch.setattr(http_cache, 'parse_listing', counting)
+    return calls
+
+
+def test_revalidates_and_reuses_records(stub_server, parse_calls, tmp_path):
+    url = stub_server.base_url + '/lawyers/california'
+    expected = extract_lawyers(read_fixture('justia_california.html').decode('utf-8'))
+
+    first = PageCache(str(tmp_path / 'cache'))
+    assert crawl([url], min_interval=0, cache=first) == expected
+    assert len(parse_calls) == 2 and first.stats['fetched'] == 2
+
+    stub_server.requests_seen.clear()
+    second = PageCache(str(tmp_path / 'cache'))
+    assert crawl([url], min_interval=0, cache=second) == expected
+    # page 1 answers 304; page 2 has no ETag, is re-downloaded, but hashes the same
+    assert stub_server.requests_seen == [
+        ('/lawyers/california', '"v1"', 'Wed, 01 Jan 2025 00:00:00 GMT'),
+        ('/lawyers/california?page=2', None, 'Wed, 01 Jan 2025 00:00:00 GMT'),
+    ]
+    assert len(parse_calls) == 2
+    assert second.stats == {'fetched': 1, 'not_modified': 1, 'unchanged': 1, 'parsed': 0, 'reused': 2}
+
+    # a changed body is parsed again
+    stub_server.pages['/lawyers/california'] = (read_fixture('justia.html') + b'<!-- v2 -->', '"v2"')
+    assert crawl([url], max_pages=1, min_interval=0, cache=PageCache(str(tmp_path / 'cache'))) == []
+    assert len(parse_calls) == 3
+
+
+def test_age_and_size_limits(stub_server, parse_calls, tmp_path):
+    url = stub_server.base_url + '/lawyers/california'
+    crawl([url], min_interval=0, cache=PageCache(str(tmp_path / 'cache')))
+
+    stub_server.requests_seen.clear()
+    expired = PageCache(str(tmp_path / 'cache'), max_age=-1)
+    assert expired.entry(url) is None
+    crawl([url], max_pages=1, min_interval=0, cache=expired)
+    assert stub_server.requests_seen == [('/lawyers/california', None, None)]
+    assert os.listdir(tmp_path / 'cache' / 'entries') == []
+
+    crawl([url], min_interval=0, cache=PageCache(str(tmp_path / 'cache')))
+    body = read_fixture('justia_california.html')
+    small = PageCache(str(tmp_path / 'cache'), max_bytes=len(body) // 2)
+    assert small.prune() >= len(body)
+    # the large page is evicted; the small second page still fits
+    assert os.listdir(tmp_path / 'cache' / 'bodies') == [http_cache.body_hash(read_fixture('justia.html'))]
+    assert small.entry(url) is None
+    assert small.entry(url + '?page=2') is not None
@@ -0,0 +1,128 @@
+import csv
+import os
+import pickle
+import pytest
+import incremental
+from incremental import rank_file_incremental, state_path
+from ranker import rank_lawyers as _rank_lawyers, rank_page
+
+FIELDNAMES = ['Name', 'Firm', 'Law360 News', 'Years PE']
+
+
+def rank_lawyers(*args, **kwargs):
+    # the repo's ranked CSV artifacts are never overwritten with fixture data
+    return _rank_lawyers(*args, write_output=False, **kwargs)
+
+
+def write_rows(path, rows, mode='w', header=True):
+    with open(path, mode, newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(FIELDNAMES)
+        writer.writerows(rows)
+
+
+def make_rows(start, n):
+    return [[f'Lawyer {i}', f'Firm {i % 4}', (i * 13) % 17, (i * 5) % 7] for i in range(start, start + n)]
+
+
+@pytest.fixture
+def data_csv(tmp_path):
+    path = tmp_path / 'lawyer_data.csv'
+    write_rows(path, make_rows(0, 50))
+    return str(path)
+
+
+def test_appended_rows_are_merged_into_existing_ranking(data_csv, monkeypatch):
+    assert rank_lawyers(data_csv, engine='incremental') == rank_lawyers(data_csv)
+    assert os.path.exists(state_path(data_csv))
+
+    size_before = os.path.getsize(data_csv)
+    write_rows(data_csv, make_rows(50, 30), mode='a', header=False)
+    appended = os.path.getsize(data_csv) - size_before
+
+    parsed = []
+    real_update = incremental.update_state
+
+    def spy(input_file, config_file=None, state=None):
+        offset = state['offset'] if state else 0
+        new_state, complete = real_update(input_file, config_file, state)
+        parsed.append(new_state['offset'] - offset)
+        return new_state, complete
+
+    monkeypatch.setattr(incremental, 'update_state', spy)
+    assert rank_lawyers(data_csv, engine='incremental') == rank_lawyers(data_csv)
+    # only the appended tail was read and parsed
+    assert parsed == [appended]
+
+    page = rank_page(data_csv, engine='incremental', offset=5, limit=10)
+    assert page == rank_page(data_csv, offset=5, limit=10)
+
+
+def test_rewritten_or_truncated_file_triggers_rebuild(data_csv):
+    rank_lawyers(data_csv, engine='incremental')
+
+    # rewrite with different contents of a larger size
+    write_rows(data_csv, make_rows(100, 60))
+    assert rank_lawyers(data_csv, engine='incremental') == rank_lawyers(data_csv)
+
+    # truncate
+    write_rows(data_csv, make_rows(0, 5))
+    assert rank_lawyers(data_csv, engine='incremental') == rank_lawyers(data_csv)
+
+
+def test_config_and_autodetect_changes_are_handled(tmp_path):
+    path = tmp_path / 'sparse.csv'
+    cfg = tmp_path / 'cfg.json'
+    cfg.write_text('{"Law360 News": 2, "Years PE": -1}', encoding='utf-8')
+    # 'Years PE' is blank at first, so autodetect only knows about it once appended rows fill it
+    write_rows(path, [['A', 'F', 3, ''], ['B', 'F', 9, '']])
+    for config in (None, str(cfg)):
+        assert rank_lawyers(str(path), config, engine='incremental') == rank_lawyers(str(path), config)
+
+    write_rows(path, [['C', 'F', 1, 20], ['D', 'F', '', 4]], mode='a', header=False)
+    for config in (None, str(cfg)):
+        assert rank_lawyers(str(path), config, engine='incremental') == rank_lawyers(str(path), config)
+
+
+def test_incomplete_last_line_is_not_persisted(data_csv):
+    rank_file_incremental(data_csv)
+    saved = incremental.load_state(state_path(data_csv))
+
+    with open(data_csv, 'a', encoding='utf-8', newline='') as f:
+        f.write('Partial Lawyer,Firm 1,5')
+    page, _ = rank_file_incremental(data_csv)
+    assert page['total'] == 51
+    assert incremental.load_state(state_path(data_csv))['offset'] == saved['offset']
+
+    with open(data_csv, 'a', encoding='utf-8', newline='') as f:
+        f.write('0,3\r\n')
+    assert rank_lawyers(data_csv, engine='incremental') == rank_lawyers(data_csv)
+
+
+def test_quoted_multiline_fields_are_read_back_by_offset(tmp_path):
+    path = tmp_path / 'quoted.csv'
+    write_rows(path, [['A "Ace", Esq.', 'Firm\nwith newline', 3, 1], ['B', 'F', 9, 2]])
+    assert rank_lawyers(str(path), engine='incremental') == rank_lawyers(str(path))
+
+    write_rows(path, [['C', '"Quoted"\r\nFirm', 5, 7]], mode='a', header=False)
+    assert rank_page(str(path), engine='incremental', limit=2) == rank_page(str(path), limit=2)
+    assert rank_lawyers(str(path), engine='incremental') == rank_lawyers(str(path))
+
+
+def test_state_round_trips_without_pickle(data_csv):
+    rank_file_incremental(data_csv)
+    path = state_path(data_csv)
+    state = incremental.load_state(path)
+    expected, _ = incremental.update_state(data_csv)
+    assert state == expected
+    with open(path, 'rb') as f:
+        assert f.read(len(incremental.STATE_MAGIC)) == incremental.STATE_MAGIC
+
+    # a state from an older (pickled) or damaged file is ignored and rebuilt
+    for data in (pickle.dumps(state), open(path, 'rb').read()[:-4]):
+        with open(path, 'wb') as f:
+            f.write(data)
+        assert incremental.load_state(path) is None
+        assert rank_lawyers(data_csv, engine='incremental') == rank_lawyers(data_csv)
+        assert incremental.load_state(path) == expected
@@ -0,0 +1,120 @@
+import csv
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+import server
+from lawyer_db import LawyerStore, export_csv, import_csv, query_file
+from query import build_index, parse_filter
+from ranker import rank_lawyers, rank_page
+
+# blank, non-numeric and missing cells, a quoted newline, and ties on 12.0
+CSV_TEXT = (
+    'Name, Metric1 ,,Metric2,Firm\n'
+    'A,10,x,0.1,F1\n'
+    'B,,y,n/a,F2\n'
+    '"C, Esq.",5,,2.5,"F1\nLLP"\n'
+    'D,10,z,0.1\n'
+    'E,abc,,1e1,F3\n'
+    'F,7\n'
+    + ''.join(f'G{i},10,x,0.1,F{i % 2 + 1}\n' for i in range(6))
+)
+
+
+def _files(tmp_path):
+    csv_path = tmp_path / 'lawyers.csv'
+    csv_path.write_text(CSV_TEXT, encoding='utf-8')
+    cfg_path = tmp_path / 'cfg.json'
+    cfg_path.write_text(json.dumps({'Metric1': 0.5, 'Metric2': -1.0}), encoding='utf-8')
+    db_path = tmp_path / 'lawyers.db'
+    assert import_csv(str(csv_path), str(db_path)) == 12
+    return str(csv_path), str(cfg_path), str(db_path)
+
+
+def test_database_ranks_like_the_csv(tmp_path):
+    csv_path, cfg_path, db_path = _files(tmp_path)
+    for config in (None, cfg_path):
+        assert rank_lawyers(db_path, config, write_output=False) == rank_lawyers(csv_path, config,
+                                                                                  write_output=False)
+        for params in ({'top_k': 5}, {'offset': 2, 'limit': 4, 'top_k': 7}, {'limit': 3}):
+            expected = rank_page(csv_path, config, **params)
+            assert rank_page(db_path, config, **params) == expected
+            # cursors carry the row order, so they resume the other engine's pages too
+            while expected['next_cursor']:
+                cursor = expected['next_cursor']
+                expected = rank_page(csv_path, config, limit=3, cursor=cursor)
+                assert rank_page(db_path, config, limit=3, cursor=cursor) == expected
+
+
+def test_queries_match_the_ranked_index(tmp_path):
+    csv_path, cfg_path, db_path = _files(tmp_path)
+    index = build_index(csv_path, cfg_path)
+    for sort_by, descending, filters, top_k in [
+        (None, True, [], None),
+        ('Name', False, [], None),
+        ('Metric1', True, ['Firm=F1'], 8),
+        ('Firm', True, ['Metric2>=0.1'], None),
+        ('score', False, ['Firm='], None),
+        ('Metric2', False, ['Firm=F1', 'Firm=F3'], None),
+    ]:
+        filters = [parse_filter(f) for f in filters]
+        assert (query_file(db_path, cfg_path, sort_by, descending, filters, top_k, 1, 5, ['Name', 'score'])
+                == index.query(sort_by, descending, filters, top_k, 1, 5, ['Name', 'score']))
+
+
+def test_upserts_replace_rows_in_place_and_rescore(tmp_path):
+    db_path = str(tmp_path / 'scraped.db')
+    with LawyerStore(db_path, ['name', 'location', 'score_me'], ['name', 'location'], batch_rows=2) as store:
+        store.upsert([{'name': 'A', 'location': 'X', 'score_me': '1'},
+                      {'name': 'B', 'location': 'X', 'score_me': '3'},
+                      {'name': 'A', 'location': 'Y', 'score_me': '2'}])
+    assert [r['name'] + r['location'] for r in rank_lawyers(db_path, write_output=False)] == ['BX', 'AY', 'AX']
+
+    with LawyerStore(db_path, key_columns=['name', 'location']) as store:
+        # stored scores are updated with the rows; new columns are added
+        store.upsert([{'name': 'A', 'location': 'X', 'score_me': '5', 'firm': 'F'}])
+        assert store.count() == 3 and store.fieldnames == ['name', 'location', 'score_me', 'firm']
+    ranked = rank_lawyers(db_path, write_output=False)
+    assert [(r['name'] + r['location'], r['score']) for r in ranked] == [('AX', 5.0), ('BX', 3.0), ('AY', 2.0)]
+    assert ranked[0]['firm'] == 'F' and ranked[1]['firm'] is None
+
+
+def test_export_round_trip(tmp_path):
+    csv_path, _, db_path = _files(tmp_path)
+    out = str(tmp_path / 'out.csv')
+    assert export_csv(db_path, out) == 12
+    with open(csv_path, newline='', encoding='utf-8') as a, open(out, newline='', encoding='utf-8') as b:
+        original = [{k.strip(): v for k, v in r.items() if k and k.strip()} for r in csv.DictReader(a)]
+        assert [{k: v or None for k, v in r.items()} for r in csv.DictReader(b)] == \
+            [{k: v or None for k, v in r.items()} for r in original]
+
+
+def test_missing_database_is_reported(tmp_path):
+    assert rank_lawyers(str(tmp_path / 'missing.db'), write_output=False) == []
+    assert not os.path.exists(tmp_path / 'missing.db')
+
+
+def test_api_serves_the_database(tmp_path, monkeypatch):
+    client = TestClient(server.app)
+    db_path = str(tmp_path / 'lawyer_data.db')
+    import_csv('lawyer_data.csv', db_path)
+    params = {'sort_by': 'Years PE', 'filter': ['Years PE>=5'], 'fields': 'Name,Years PE', 'limit': 3}
+    expected = [client.get('/api/ranked', params=p).json() for p in ({'limit': 3}, params)]
+
+    monkeypatch.setattr(server, 'LAWYER_DB', db_path)
+    assert [client.get('/api/ranked', params=p).json() for p in ({'limit': 3}, params)] == expected
+    assert client.get('/api/ranked', params={'format': 'ndjson', 'top_k': 3}).text.count('\n') == 3
+    monkeypatch.setattr(server, 'LAWYER_DB', str(tmp_path / 'missing.db'))
+    assert client.get('/api/ranked').status_code == 404
+
+
+def test_api_does_not_generate_artifacts_from_the_database(tmp_path, monkeypatch):
+    csv_path, _, db_path = _files(tmp_path)
+    submitted = []
+    monkeypatch.setattr(server.artifact_writer, 'submit', lambda *args: submitted.append(args))
+    monkeypatch.setattr(server, 'LAWYER_DB', db_path)
+    resp = TestClient(server.app).get('/api/ranked')
+    assert resp.status_code == 200
+    assert resp.json() == rank_lawyers(csv_path, write_output=False)
+    assert submitted == []
@@ -0,0 +1,68 @@
+import time
+from fastapi.testclient import TestClient
+import server
+from metrics import REGISTRY, Registry, Sampler, capture, replay, request_timings, stage
+from ranker import rank_lawyers
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    registry.inc('lawyer_rows_ranked_total', 5, engine='python')
+    registry.inc('lawyer_rows_ranked_total', 2, engine='python')
+    registry.observe('lawyer_rank_stage_seconds', 0.02, stage='parse')
+    text = registry.render()
+    assert '# TYPE lawyer_rows_ranked_total counter' in text
+    assert 'lawyer_rows_ranked_total{engine="python"} 7' in text
+    assert 'lawyer_rank_stage_seconds_bucket{stage="parse",le="0.01"} 0' in text
+    assert 'lawyer_rank_stage_seconds_bucket{stage="parse",le="0.025"} 1' in text
+    assert 'lawyer_rank_stage_seconds_count{stage="parse"} 1' in text
+
+
+def test_captured_metrics_are_replayed_once():
+    before = REGISTRY.value('lawyer_rows_ranked_total', engine='python')
+    with capture() as events:
+        rank_lawyers('lawyer_data.csv', write_output=False)
+    assert REGISTRY.value('lawyer_rows_ranked_total', engine='python') == before
+    assert {name for kind, name, _, _ in events if kind == 'stage'} == {'parse', 'score', 'sort'}
+
+    with request_timings() as timings:
+        replay(events)
+    assert [name for name, _ in timings] == ['parse', 'score', 'sort']
+    assert REGISTRY.value('lawyer_rows_ranked_total', engine='python') > before
+
+
+def test_sampler_collects_stacks():
+    def busy():
+        end = time.perf_counter() + 0.1
+        while time.perf_counter() < end:
+            pass
+
+    with Sampler(interval=0.002) as sampler:
+        with stage('busy'):
+            busy()
+    assert 'busy (test_metrics.py' in sampler.collapsed()
+
+
+def test_server_timing_metrics_and_profiling(monkeypatch):
+    monkeypatch.setattr(server, 'SERVER_TIMING', True)
+    # rank inside the request, so its stages show up in the header
+    monkeypatch.setattr(server, 'PRECOMPUTE', False)
+    server.ranking_cache.clear()
+    client = TestClient(server.app)
+
+    resp = client.get('/api/ranked', params={'top_k': 3, 'fields': 'Name'})
+    assert resp.status_code == 200
+    timing = resp.headers['server-timing']
+    for name in ('parse;dur=', 'score;dur=', 'sort;dur=', 'encode;dur=', 'total;dur='):
+        assert name in timing
+
+    text = client.get('/metrics').text
+    assert 'lawyer_rank_stage_seconds_count{stage="parse"}' in text
+    assert 'lawyer_http_request_seconds_count{route="/api/ranked",status="200"}' in text
+    assert 'lawyer_cache_misses_total' in text
+
+    assert client.get('/api/ranked', params={'profile': 'true'}).status_code == 403
+    monkeypatch.setattr(server, 'ALLOW_PROFILING', True)
+    resp = client.get('/api/ranked', params={'profile': 'true', 'top_k': 3})
+    assert resp.status_code == 200
+    assert resp.headers['content-type'].startswith('text/plain')
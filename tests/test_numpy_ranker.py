@@ -0,0 +1,55 @@
+import json
+import os
+import pytest
+from ranker import rank_lawyers
+
+np = pytest.importorskip('numpy')
+from numpy_ranker import rank_indices  # noqa: E402
+
+
+def write_csv(path, text):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def test_numpy_engine_matches_python_engine_on_messy_data(tmp_path):
+    """Blanks, non-numeric cells, short rows, empty headers and ties must all
+    produce exactly the same ranking as the row-wise engine."""
+    csv_path = tmp_path / 'messy.csv'
+    write_csv(csv_path, (
+        'Name, Metric1 ,,Metric2,Firm\n'
+        'A,10,x,0.1,F1\n'
+        'B,,y,n/a,F2\n'
+        'C,5,,2.5,F1\n'
+        '\n'
+        'D,10,z,0.1\n'
+        'E,abc,,1e1,F3\n'
+        'F,7\n'
+    ))
+    cfg_path = tmp_path / 'cfg.json'
+    with open(cfg_path, 'w', encoding='utf-8') as f:
+        json.dump({'Metric1': 0.3, 'Metric2': -1.7, 'Missing': 4}, f)
+
+    for cfg in (None, str(cfg_path)):
+        expected = rank_lawyers(str(csv_path), cfg, write_output=False)
+        actual = rank_lawyers(str(csv_path), cfg, engine='numpy', write_output=False)
+        assert actual == expected
+        assert json.dumps(actual) == json.dumps(expected)
+
+
+def test_numpy_engine_matches_on_repo_data():
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    csv_path = os.path.join(repo_root, 'lawyer_data.csv')
+    cfg_path = os.path.join(repo_root, 'config.json')
+
+    for cfg in (None, cfg_path):
+        assert (rank_lawyers(csv_path, cfg, engine='numpy', write_output=False)
+                == rank_lawyers(csv_path, cfg, write_output=False))
+
+
+def test_rank_indices_top_k_is_prefix_of_full_order():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 20, size=500).astype(float)  # plenty of ties
+    full = rank_indices(scores)
+    for k in (0, 1, 7, 50, 499, 500, 1000):
+        assert rank_indices(scores, top_k=k).tolist() == full[:k].tolist()
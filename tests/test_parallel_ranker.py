@@ -0,0 +1,62 @@
+import json
+
+import parallel_ranker
+from parallel_ranker import shard_ranges
+from ranker import rank_lawyers, rank_page
+
+# quoted newlines and doubled quotes must not be mistaken for record ends; ties on 12.0 and 0.0
+MESSY_CSV = (
+    'Name, Metric1 ,,Metric2,Firm\n'
+    'A,10,x,0.1,F1\n'
+    'B,,y,n/a,F2\n'
+    '"C, Esq.",5,,2.5,"F1\nLLP ""East""\n"\n'
+    '\n'
+    'D,10,z,0.1\n'
+    'E,abc,,1e1,F3\n'
+    'F,7\n'
+    + ''.join(f'G{i},10,x,0.1,F1\r\n' for i in range(6))
+)
+
+
+def test_shards_start_on_record_boundaries(tmp_path):
+    csv_path = tmp_path / 'messy.csv'
+    csv_path.write_bytes(MESSY_CSV.encode('utf-8'))
+    data = csv_path.read_bytes()
+    ranges = shard_ranges(str(csv_path), 40)
+    assert ranges[0][0] == data.index(b'\n') + 1 and ranges[-1][1] == len(data)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    for start, _ in ranges:
+        assert data[start - 1:start] == b'\n'
+        assert data[:start].count(b'"') % 2 == 0
+
+
+def test_parallel_engine_matches_python_engine(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'messy.csv'
+    csv_path.write_bytes(MESSY_CSV.encode('utf-8'))
+    cfg_path = tmp_path / 'cfg.json'
+    cfg_path.write_text(json.dumps({'Metric1': 0.5, 'Metric2': -1.0}), encoding='utf-8')
+    monkeypatch.setattr(parallel_ranker, 'MIN_SHARD_BYTES', 1)
+    monkeypatch.setattr(parallel_ranker, 'PARALLEL_WORKERS', 5)
+    monkeypatch.setattr(parallel_ranker, '_map_shards', lambda tasks, workers: [
+        parallel_ranker.rank_shard(*task) for task in tasks])
+
+    for cfg in (None, str(cfg_path)):
+        expected = rank_lawyers(str(csv_path), cfg, write_output=False)
+        assert rank_lawyers(str(csv_path), cfg, engine='parallel', write_output=False) == expected
+        assert (rank_page(str(csv_path), cfg, engine='parallel', top_k=7, offset=2, limit=3)
+                == rank_page(str(csv_path), cfg, top_k=7, offset=2, limit=3))
+        cursor = None
+        while True:
+            page = rank_page(str(csv_path), cfg, engine='parallel', limit=2, cursor=cursor)
+            assert page == rank_page(str(csv_path), cfg, limit=2, cursor=cursor)
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+
+def test_parallel_engine_on_a_process_pool(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'lawyers.csv'
+    csv_path.write_text('Name,Metric\n' + ''.join(f'L{i},{i % 4}\n' for i in range(200)), encoding='utf-8')
+    monkeypatch.setattr(parallel_ranker, 'MIN_SHARD_BYTES', 1)
+    page, _ = parallel_ranker.rank_file_parallel(str(csv_path), workers=2)
+    assert page['items'] == rank_lawyers(str(csv_path), write_output=False)
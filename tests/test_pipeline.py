@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import crawl
+from pipeline import CrawlOrder, run_pipeline
+from ranker import rank_lawyers
+from scraper import save_lawyers_csv
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def read_fixture(name):
+    with open(os.path.join(REPO_ROOT, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def stub_server():
+    """/slow and /fast serve the California listing (linking to ?page=2, an empty page); /slow answers late."""
+    listing, empty = read_fixture('justia_california.html'), read_fixture('justia.html')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/slow':
+                time.sleep(0.3)
+            body = empty if '?page=' in self.path else listing
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pipeline_matches_scrape_then_rank(stub_server, tmp_path):
+    # identical records in both listings: ties must follow crawl order, not completion order
+    urls = [stub_server.base_url + '/slow', stub_server.base_url + '/fast', stub_server.base_url + '/slow']
+    sequential_csv = str(tmp_path / 'sequential.csv')
+    save_lawyers_csv(crawl(urls, min_interval=0), sequential_csv)
+    expected = rank_lawyers(sequential_csv, write_output=False)
+    assert expected
+
+    lines = []
+    pipeline_csv = str(tmp_path / 'pipeline.csv')
+    ranked = run_pipeline(urls, top_k=3, csv_path=pipeline_csv, write_output=False, progress=lines.append,
+                          min_interval=0)
+    assert ranked == expected
+    assert [row['name'] for row in ranked] == [row['name'] for row in expected]
+    with open(pipeline_csv, 'rb') as a, open(sequential_csv, 'rb') as b:
+        assert a.read() == b.read()
+    assert any(line.strip().startswith('rank: ') for line in lines)
+    summary = lines[-5].splitlines()
+    assert f"{len(expected)} records ranked" in summary[0]
+    # the running top-K, best first
+    assert [line.split(None, 1)[1] for line in summary[1:]] == \
+        [f"{row['name']} ({row['score']})" for row in expected[:3]]
+
+    assert run_pipeline(urls, csv_path=None, write_output=False, progress=None, min_interval=0) == expected
+
+
+def test_crawl_order_holds_back_early_pages():
+    from crawler import CrawledPage
+
+    def page(listing, number, last=False):
+        return CrawledPage(listing, number, '', [], last, 0.0, 0.0)
+
+    order = CrawlOrder()
+    assert order.push(page(1, 0, last=True)) == []
+    assert order.push(page(0, 1, last=True)) == []
+    released = order.push(page(0, 0))
+    assert [(p.listing, p.page) for p in released] == [(0, 0), (0, 1), (1, 0)]
@@ -0,0 +1,127 @@
+import json
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+import server
+from precompute import Precomputer, build_ranking
+from ranker import decode_cursor, rank_lawyers, rank_page
+from ranking_pool import RankingExecutor
+from stream_ranker import iter_ranked
+
+# ties on 12, blank and non-numeric cells
+DATA = 'Name,Firm,Years PE,Ratio\n' + ''.join(
+    f'L{i},F{i % 3},{(i * 7) % 5 * 3},{"x" if i % 4 == 0 else i % 3}\n' for i in range(17))
+
+
+def test_ranking_pages_match_the_ranker(tmp_path):
+    csv_path = tmp_path / 'lawyers.csv'
+    csv_path.write_text(DATA, encoding='utf-8')
+    cfg_path = tmp_path / 'cfg.json'
+    cfg_path.write_text(json.dumps({'Years PE': 1.0, 'Ratio': -2.0}), encoding='utf-8')
+    for config in (None, str(cfg_path)):
+        ranking = build_ranking(str(csv_path), config)
+        assert ranking.rows == rank_lawyers(str(csv_path), config, write_output=False)
+        assert list(ranking.iter_rows(7, 2, 3)) == list(iter_ranked(str(csv_path), config, 7, 2, 3))
+        for params in ({'top_k': 5}, {'offset': 2, 'limit': 4, 'top_k': 11}, {'limit': 3}):
+            expected = rank_page(str(csv_path), config, **params)
+            after = None
+            while True:
+                assert ranking.page(after=after, **params) == expected
+                if not expected['next_cursor']:
+                    break
+                after = decode_cursor(expected['next_cursor'])
+                expected = rank_page(str(csv_path), config, cursor=expected['next_cursor'], **params)
+
+
+def test_stale_ranking_is_served_until_the_new_one_is_swapped_in(tmp_path):
+    csv_path = tmp_path / 'lawyers.csv'
+    csv_path.write_text(DATA, encoding='utf-8')
+    precomputer = Precomputer(interval=3600)
+    try:
+        old = precomputer.load(str(csv_path))
+        assert precomputer.staleness(old, str(csv_path)) == 0.0
+        assert not precomputer.refresh(str(csv_path))
+
+        csv_path.write_text(DATA + 'New,F9,99,0\n', encoding='utf-8')
+        assert precomputer.current(str(csv_path)) is old
+        assert precomputer.staleness(old, str(csv_path)) >= 0.0 and old.rows[0]['Name'] != 'New'
+        # the staleness check woke the background thread; refreshing here waits for it if it is building
+        precomputer.refresh(str(csv_path))
+        new = precomputer.current(str(csv_path))
+        assert new.version != old.version and new.rows[0]['Name'] == 'New'
+
+        # a file that cannot be ranked keeps the last good ranking
+        bad_path = tmp_path / 'bad.csv'
+        bad_path.write_bytes(b'Name,Years PE\n\xff\xfe,1\n')
+        os.replace(bad_path, csv_path)
+        assert not precomputer.refresh(str(csv_path))
+        assert precomputer.current(str(csv_path)) is new
+    finally:
+        precomputer.close()
+
+
+def test_api_serves_the_previous_version_while_stale(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'lawyer_data.csv').write_text(DATA, encoding='utf-8')
+    precomputer = Precomputer(interval=3600)
+    monkeypatch.setattr(server, 'precomputer', precomputer)
+    monkeypatch.setattr(server, 'PRECOMPUTE', True)
+    client = TestClient(server.app)
+    try:
+        first = client.get('/api/ranked', params={'limit': 3})
+        assert first.headers['x-data-stale'] == '0.000'
+        version = first.headers['x-data-version']
+        assert client.get('/api/ranked', params={'sort_by': 'Name'}).headers['x-data-version'] == version
+        assert client.get('/api/snapshot').headers['x-data-version'] == version
+
+        (tmp_path / 'lawyer_data.csv').write_text(DATA + 'New,F9,99,0\n', encoding='utf-8')
+        stale = client.get('/api/ranked', params={'limit': 3})
+        assert stale.headers['x-data-version'] == version
+        assert float(stale.headers['x-data-stale']) >= 0.0
+        assert stale.json() == first.json()
+
+        # as above, the stale request already woke the background thread
+        precomputer.refresh(str(tmp_path / 'lawyer_data.csv'))
+        fresh = client.get('/api/ranked', params={'limit': 3})
+        assert fresh.headers['x-data-version'] != version and fresh.headers['x-data-stale'] == '0.000'
+        assert fresh.json()['items'][0]['Name'] == 'New'
+    finally:
+        precomputer.close()
+
+
+def test_shutdown_stops_background_work(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'lawyer_data.csv').write_text(DATA, encoding='utf-8')
+    precomputer = Precomputer(interval=3600)
+    monkeypatch.setattr(server, 'precomputer', precomputer)
+    monkeypatch.setattr(server, 'PRECOMPUTE', True)
+    with TestClient(server.app) as client:
+        assert client.get('/api/ranked', params={'limit': 1}).status_code == 200
+        assert precomputer._thread is not None
+    assert precomputer._thread is None and server.ranking_executor._pool is None
+
+
+def test_slow_first_ranking_is_503_and_failed_one_falls_back(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'lawyer_data.csv').write_text(DATA, encoding='utf-8')
+    precomputer = Precomputer(interval=3600)
+    monkeypatch.setattr(server, 'precomputer', precomputer)
+    monkeypatch.setattr(server, 'PRECOMPUTE', True)
+    monkeypatch.setattr(server, 'ranking_executor', RankingExecutor(workers=0, concurrency=2, timeout=0.05))
+    client = TestClient(server.app)
+    try:
+        monkeypatch.setattr(precomputer, 'load', lambda *args: time.sleep(0.3))
+        assert client.get('/api/ranked', params={'limit': 1}).status_code == 503
+
+        def fail(*args):
+            raise ValueError('cannot rank')
+
+        # a ranking that fails is served by ranking per request instead
+        monkeypatch.setattr(precomputer, 'load', fail)
+        resp = client.get('/api/ranked', params={'limit': 1})
+        expected = rank_lawyers(str(tmp_path / 'lawyer_data.csv'), write_output=False)
+        assert resp.status_code == 200 and resp.json()['items'] == expected[:1]
+    finally:
+        precomputer.close()
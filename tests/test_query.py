@@ -0,0 +1,156 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+import query
+from query import RankedIndex, parse_filter
+from ranker import parse_cell
+from server import app
+
+FIELDS = ['Name', 'Firm', 'Years PE', 'score']
+
+
+def make_rows(n=200):
+    rows = []
+    for i in range(n):
+        years = '' if i % 11 == 0 else str((i * 7) % 13)
+        rows.append({'Name': f'L{i}', 'Firm': f'Firm {i % 5}', 'Years PE': years, 'score': float(100 - i // 3)})
+    return rows
+
+
+def reference(rows, column, descending, keep=lambda row: True, key=parse_cell):
+    """Stable sort of the kept rank positions by `column`, blanks last."""
+    kept = [p for p, row in enumerate(rows) if keep(row)]
+    present = [p for p in kept if key(rows[p][column]) is not None]
+    blanks = [p for p in kept if key(rows[p][column]) is None]
+    present.sort(key=lambda p: key(rows[p][column]), reverse=descending)
+    return [rows[p] for p in present + blanks]
+
+
+def test_parse_filter():
+    assert parse_filter('Firm=Kirkland & Ellis') == ('Firm', '=', 'Kirkland & Ellis')
+    assert parse_filter('Years PE >= 5') == ('Years PE', '>=', 5.0)
+    assert parse_filter('Years PE<3.5') == ('Years PE', '<', 3.5)
+    for bad in ('Firm', '=x', 'Years PE>=many'):
+        with pytest.raises(ValueError):
+            parse_filter(bad)
+
+
+def test_sorting_and_filtering_match_a_full_sort():
+    rows = make_rows()
+    index = RankedIndex(rows, FIELDS, ['Years PE'])
+
+    for descending in (True, False):
+        page = index.query('Years PE', descending, limit=30, offset=10)
+        assert page['items'] == reference(rows, 'Years PE', descending)[10:40]
+        assert page['total'] == len(rows)
+
+    # sparse match (sorted directly) and dense match (permutation scan)
+    sparse = [parse_filter('Firm=Firm 3'), parse_filter('Years PE>=4'), parse_filter('Years PE<10')]
+    expected = reference(rows, 'Years PE', True,
+                         lambda r: r['Firm'] == 'Firm 3' and r['Years PE'] != '' and 4 <= float(r['Years PE']) < 10)
+    assert index.query('Years PE', True, sparse)['items'] == expected
+    dense = [parse_filter('Years PE>0')]
+    expected = reference(rows, 'Name', False, lambda r: r['Years PE'] != '' and float(r['Years PE']) > 0,
+                         key=str.casefold)
+    page = index.query('Name', False, dense, limit=25, offset=5)
+    assert page['items'] == expected[5:30]
+    assert page['total'] == len(expected)
+
+    # OR within a column, rank order without sort_by, top_k and projection
+    page = index.query(None, True, [parse_filter('Firm=Firm 1'), parse_filter('Firm=Firm 2')], top_k=50,
+                       fields=['Name', 'Firm'])
+    assert page['items'] == [{'Name': r['Name'], 'Firm': r['Firm']} for r in rows[:50]
+                             if r['Firm'] in ('Firm 1', 'Firm 2')]
+
+    with pytest.raises(ValueError):
+        index.query('Nope')
+    with pytest.raises(ValueError):
+        index.query(None, True, [parse_filter('Firm>=2')])
+
+
+def test_api_sort_filter_and_projection():
+    client = TestClient(app)
+    ranked = client.get('/api/ranked').json()
+    firm = ranked[0]['Firm']
+
+    resp = client.get('/api/ranked', params={
+        'sort_by': 'Years PE', 'order': 'asc', 'filter': [f'Firm={firm}', 'Years PE>=5'],
+        'fields': 'Name,Years PE', 'limit': 3,
+    })
+    assert resp.status_code == 200
+    page = resp.json()
+    expected = reference(ranked, 'Years PE', False,
+                         lambda r: r['Firm'] == firm and r['Years PE'] != '' and float(r['Years PE']) >= 5)
+    assert page['total'] == len(expected)
+    assert page['items'] == [{'Name': r['Name'], 'Years PE': r['Years PE']} for r in expected[:3]]
+
+    assert client.get('/api/ranked', params={'fields': 'Name'}).json() == [{'Name': r['Name']} for r in ranked]
+    assert client.get('/api/ranked', params={'sort_by': 'Nope'}).status_code == 400
+    assert client.get('/api/ranked', params={'filter': 'Firm'}).status_code == 400
+    assert client.get('/api/ranked', params={'fields': 'Nope'}).status_code == 400
+
+
+def test_precomputed_permutations_match_list_fallback(monkeypatch):
+    rows = make_rows(300)
+    index = RankedIndex(rows, FIELDS, ['Years PE']).precompute()
+    assert {('Years PE', False), ('Years PE', True), ('score', False), ('score', True)} <= set(index._permutations)
+    assert 'Firm' in index._inverted
+
+    monkeypatch.setattr(query, 'np', None)
+    fallback = RankedIndex(rows, FIELDS, ['Years PE'])
+    for descending in (True, False):
+        assert list(index.permutation('Years PE', descending)) == fallback.permutation('Years PE', descending)
+        filters = [parse_filter('Years PE>2'), parse_filter('Years PE<=9'), parse_filter('Firm=Firm 4')]
+        assert index.query('Years PE', descending, filters) == fallback.query('Years PE', descending, filters)
+
+
+def test_load_index_rebuilds_only_when_source_changes(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text('Name,Firm,Years PE\nA,F1,3\nB,F2,9\n', encoding='utf-8')
+    builds = []
+    real_build = query.build_index
+    monkeypatch.setattr(query, 'build_index', lambda *args: builds.append(args) or real_build(*args))
+
+    first = query.load_index(str(csv_path))
+    assert query.load_index(str(csv_path)) is first
+    assert len(builds) == 1
+
+    csv_path.write_text('Name,Firm,Years PE\nA,F1,3\nB,F2,9\nC,F1,12\n', encoding='utf-8')
+    second = query.load_index(str(csv_path))
+    assert second is not first and len(builds) == 2
+    assert [r['Name'] for r in second.query('Years PE', True, [parse_filter('Firm=F1')])['items']] == ['C', 'A']
+
+
+def test_load_index_builds_each_file_once_without_blocking_others(tmp_path, monkeypatch):
+    paths = []
+    for name in ('a', 'b', 'c'):
+        path = tmp_path / f'{name}.csv'
+        path.write_text(f'Name,Firm,Years PE\n{name},F1,3\n', encoding='utf-8')
+        paths.append(str(path))
+    release = threading.Event()
+    builds = []
+    real_build = query.build_index
+
+    def build(input_file, config_file=None):
+        builds.append(input_file)
+        if input_file == paths[0]:
+            assert release.wait(10)
+        return real_build(input_file, config_file)
+
+    monkeypatch.setattr(query, 'build_index', build)
+    monkeypatch.setattr(query, '_indexes', query.OrderedDict())
+    monkeypatch.setattr(query, 'MAX_INDEXES', 2)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        slow = [pool.submit(query.load_index, paths[0]) for _ in range(2)]
+        # another file is indexed while the first one is still building
+        assert query.load_index(paths[1]).rows[0]['Name'] == 'b'
+        release.set()
+        assert slow[0].result() is slow[1].result()
+    assert builds.count(paths[0]) == 1 and not query._building
+
+    # bounded: the least recently used index is dropped
+    query.load_index(paths[0])
+    query.load_index(paths[2])
+    assert [slot[0] for slot in query._indexes] == [paths[0], paths[2]]
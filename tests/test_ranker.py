@@ -41,7 +41,7 @@ class TestRanker(unittest.TestCase):
         # Lawyer B: (5 * 2) + (25 * 1) = 35
         # Expected order: Lawyer A, Lawyer B
 
-        ranked_lawyers = rank_lawyers(self.test_data_file, self.test_config_file)
+        ranked_lawyers = rank_lawyers(self.test_data_file, self.test_config_file, write_output=False)
 
         self.assertIsNotNone(ranked_lawyers)
         self.assertEqual(len(ranked_lawyers), 2)
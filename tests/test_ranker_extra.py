@@ -25,7 +25,7 @@ def test_ranker_defaults_no_config(tmp_path):
     ]
     write_dummy_csv(dummy_csv, rows)
 
-    ranked = rank_lawyers(str(dummy_csv))
+    ranked = rank_lawyers(str(dummy_csv), write_output=False)
 
     assert len(ranked) == 3
     assert ranked[0]['name'] == 'Lawyer B'
@@ -52,7 +52,7 @@ def test_ranker_with_config_file(tmp_path):
     with open(config_file, 'w', encoding='utf-8') as f:
         json.dump(weights, f)
 
-    ranked = rank_lawyers(str(dummy_csv), str(config_file))
+    ranked = rank_lawyers(str(dummy_csv), str(config_file), write_output=False)
 
     assert len(ranked) == 3
     # With negative weight, the smallest description_length should be ranked first
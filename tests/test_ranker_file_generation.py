@@ -3,7 +3,10 @@ import csv
 from ranker import rank_lawyers
 
 
-def test_ranker_normalizes_headers_and_writes_files(tmp_path):
+def test_ranker_normalizes_headers_and_writes_files(tmp_path, monkeypatch):
+    # write the copies into tmp_path rather than over the repo's tracked ones
+    monkeypatch.chdir(tmp_path)
+
     # Create CSV with an empty header column and numeric metric columns
     csv_path = tmp_path / 'weird_headers.csv'
     fieldnames = ['Name', '', 'Metric1']
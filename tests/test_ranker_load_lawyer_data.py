@@ -18,7 +18,7 @@ def test_ranker_loads_and_ranks_lawyer_data(tmp_path):
     with open(cfg_path, 'w', encoding='utf-8') as f:
         json.dump(weights, f)
 
-    ranked = rank_lawyers(csv_path, str(cfg_path))
+    ranked = rank_lawyers(csv_path, str(cfg_path), write_output=False)
 
     # Basic sanity checks
     assert isinstance(ranked, list)
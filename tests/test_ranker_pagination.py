@@ -0,0 +1,87 @@
+import csv
+import pytest
+from fastapi.testclient import TestClient
+from ranker import rank_lawyers, rank_page
+from server import app
+
+ENGINES = ['python']
+try:
+    import numpy  # noqa: F401
+    ENGINES.append('numpy')
+except ImportError:
+    pass
+
+
+@pytest.fixture
+def ranked_csv(tmp_path):
+    """40 rows with many tied scores so tie order is exercised."""
+    path = tmp_path / 'lawyers.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Name', 'Metric'])
+        for i in range(40):
+            writer.writerow([f'Lawyer {i}', (i * 7) % 5])
+    return str(path)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_top_k_and_offset_limit_slice_full_ranking(ranked_csv, engine):
+    full = rank_lawyers(ranked_csv, engine=engine, write_output=False)
+    names = [r['Name'] for r in full]
+
+    assert [r['Name'] for r in rank_lawyers(ranked_csv, engine=engine, top_k=5, write_output=False)] == names[:5]
+
+    page = rank_page(ranked_csv, engine=engine, offset=10, limit=7)
+    assert page['total'] == 40
+    assert [r['Name'] for r in page['items']] == names[10:17]
+
+    capped = rank_page(ranked_csv, engine=engine, top_k=12, offset=10, limit=7)
+    assert [r['Name'] for r in capped['items']] == names[10:12]
+    assert capped['next_cursor'] is None
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_cursor_walks_whole_ranking(ranked_csv, engine):
+    names = [r['Name'] for r in rank_lawyers(ranked_csv, engine=engine, write_output=False)]
+
+    seen, cursor = [], None
+    while True:
+        page = rank_page(ranked_csv, engine=engine, limit=6, cursor=cursor)
+        seen.extend(r['Name'] for r in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == names
+
+    # top_k keeps applying across cursor pages
+    seen, cursor = [], None
+    while True:
+        page = rank_page(ranked_csv, engine=engine, top_k=15, limit=6, cursor=cursor)
+        seen.extend(r['Name'] for r in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == names[:15]
+
+
+def test_invalid_cursor_raises(ranked_csv):
+    with pytest.raises(ValueError):
+        rank_page(ranked_csv, limit=5, cursor='not-a-cursor')
+
+
+def test_api_ranked_pagination():
+    client = TestClient(app)
+    full = client.get('/api/ranked').json()
+
+    resp = client.get('/api/ranked', params={'offset': 3, 'limit': 4})
+    assert resp.status_code == 200
+    page = resp.json()
+    assert page['total'] == len(full)
+    assert page['items'] == full[3:7]
+
+    nxt = client.get('/api/ranked', params={'limit': 4, 'cursor': page['next_cursor']}).json()
+    assert nxt['items'] == full[7:11]
+
+    assert client.get('/api/ranked', params={'top_k': 2}).json()['items'] == full[:2]
+    assert client.get('/api/ranked', params={'limit': 4, 'cursor': 'bogus'}).status_code == 400
+    assert client.get('/api/ranked', params={'limit': -1}).status_code == 422
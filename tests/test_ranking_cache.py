@@ -0,0 +1,66 @@
+import os
+from fastapi.testclient import TestClient
+from ranking_cache import RankingCache, config_fingerprint, file_fingerprint
+from server import app, ranking_cache
+
+
+def test_cache_lru_eviction_and_counters():
+    cache = RankingCache(max_entries=2, max_bytes=1024)
+    cache.put('a', b'1')
+    cache.put('b', b'22')
+    assert cache.get('a') == b'1'  # 'a' is now most recently used
+    cache.put('c', b'333')        # evicts 'b'
+
+    assert cache.get('b') is None
+    assert cache.get('c') == b'333'
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+    assert stats['entries'] == 2
+    assert stats['bytes'] == 4
+
+
+def test_cache_respects_byte_bound():
+    cache = RankingCache(max_entries=10, max_bytes=5)
+    cache.put('a', b'xxx')
+    cache.put('b', b'yyy')
+    assert cache.get('a') is None
+    assert cache.get('b') == b'yyy'
+    # values larger than the whole budget are never stored
+    cache.put('big', b'z' * 6)
+    assert cache.get('big') is None
+
+
+def test_fingerprints_track_file_changes(tmp_path):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text('Name,Metric\nA,1\n', encoding='utf-8')
+    before = file_fingerprint(str(csv_path))
+    with open(csv_path, 'a', encoding='utf-8') as f:
+        f.write('B,2\n')
+    assert file_fingerprint(str(csv_path)) != before
+    assert file_fingerprint(str(tmp_path / 'missing.csv')) is None
+
+    cfg = tmp_path / 'cfg.json'
+    cfg.write_text('{"Metric": 1}', encoding='utf-8')
+    first = config_fingerprint(str(cfg))
+    cfg.write_text('{"Metric": 2}', encoding='utf-8')
+    assert config_fingerprint(str(cfg)) != first
+    assert config_fingerprint(None) == 'default'
+
+
+def test_api_ranked_serves_repeat_requests_from_cache():
+    assert os.path.exists('lawyer_data.csv')
+    ranking_cache.clear()
+    client = TestClient(app)
+
+    first = client.get('/api/ranked')
+    second = client.get('/api/ranked')
+    assert first.status_code == second.status_code == 200
+    assert first.headers['x-cache'] == 'MISS'
+    assert second.headers['x-cache'] == 'HIT'
+    assert first.content == second.content
+
+    stats = client.get('/api/cache').json()
+    assert stats['hits'] >= 1
+    assert stats['entries'] >= 1
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi.testclient import TestClient
+import server
+from ranker import rank_lawyers
+from ranking_pool import RankingExecutor, ranked_body, ranked_variants
+
+
+def slow_call(calls, delay=0.1):
+    lock = threading.Lock()
+    running = [0, 0]  # current, peak
+
+    def fn(value):
+        with lock:
+            calls.append(value)
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(delay)
+        with lock:
+            running[0] -= 1
+        return value * 2
+    return fn, running
+
+
+def test_identical_requests_share_one_computation():
+    calls = []
+    fn, _ = slow_call(calls)
+    executor = RankingExecutor(workers=0, concurrency=4, timeout=5)
+
+    async def burst():
+        same = [executor.run('a', fn, 21) for _ in range(8)]
+        other = executor.run('b', fn, 1)
+        return await asyncio.gather(*same, other)
+
+    assert asyncio.run(burst()) == [42] * 8 + [2]
+    assert sorted(calls) == [1, 21]
+
+
+def test_concurrency_limit_and_timeout():
+    calls = []
+    fn, running = slow_call(calls, delay=0.2)
+    results = []
+    executor = RankingExecutor(workers=0, concurrency=1, timeout=0.05)
+
+    async def go():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.gather(executor.run('a', fn, 1, on_result=results.append),
+                                 executor.run('b', fn, 2, on_result=results.append))
+        # the abandoned computations still complete and report their results
+        while executor.in_flight():
+            await asyncio.sleep(0.05)
+
+    asyncio.run(go())
+    assert running[1] == 1
+    assert sorted(results) == [2, 4]
+
+
+def test_ranked_body_in_worker_process(tmp_path):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text('Name,Firm,Years PE\nA,F1,3\nB,F2,9\nC,F1,\n', encoding='utf-8')
+    executor = RankingExecutor(workers=1, concurrency=1, timeout=60)
+    try:
+        body = asyncio.run(executor.run('k', ranked_body, str(csv_path)))
+        page = asyncio.run(executor.run('p', ranked_body, str(csv_path), None, True, 2, 0, None, None, ['Name']))
+    finally:
+        executor.shutdown()
+    assert json.loads(body) == rank_lawyers(str(csv_path), write_output=False)
+    assert json.loads(page)['items'] == [{'Name': 'B'}, {'Name': 'A'}]
+
+
+def test_api_coalesces_a_burst_of_identical_requests(monkeypatch):
+    calls = []
+
+    def counting_variants(*args):
+        calls.append(args)
+        time.sleep(0.2)
+        return ranked_variants(*args)
+
+    monkeypatch.setattr(server, 'ranking_executor', RankingExecutor(workers=0, concurrency=2, timeout=10))
+    monkeypatch.setattr(server, 'ranked_variants', counting_variants)
+    monkeypatch.setattr(server, 'PRECOMPUTE', False)
+    server.ranking_cache.clear()
+    with TestClient(server.app) as client:
+        with ThreadPoolExecutor(6) as pool:
+            responses = list(pool.map(lambda _: client.get('/api/ranked', params={'top_k': 3}), range(6)))
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.content for r in responses}) == 1
+    assert len(calls) == 1
@@ -0,0 +1,104 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from ranker import rank_lawyers
+
+np = pytest.importorskip('numpy')
+import rescore  # noqa: E402
+from rescore import FeatureMatrix, load_feature_matrix  # noqa: E402
+import server  # noqa: E402
+from server import app  # noqa: E402
+
+DATA = (
+    'Name,Firm,Law360 News,Years PE,Notes\n'
+    'A,F1,5,3,x\n'
+    'B,F2,12,,y\n'
+    'C,F1,7,5,\n'
+    'D,F3,n/a,9,z\n'
+    'E,F2,4,1,w\n'
+    'F,F3,7,5,v\n'
+)
+
+
+def test_rescore_matches_ranking_with_config(tmp_path):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text(DATA, encoding='utf-8')
+    baseline = [r['Name'] for r in rank_lawyers(str(csv_path), write_output=False)]
+    matrix = FeatureMatrix.from_csv(str(csv_path))
+    # text columns are never converted unless a weight refers to them
+    assert not {'Name', 'Firm', 'Notes'} & set(matrix.table._arrays)
+
+    for weights in ({'Years PE': 2.0, 'Law360 News': -0.5}, {'Law360 News': 1, 'Missing': 3}, {}):
+        config = tmp_path / 'config.json'
+        config.write_text(json.dumps(weights), encoding='utf-8')
+        expected = rank_lawyers(str(csv_path), str(config), write_output=False)
+        result = matrix.rescore(weights, top_k=4)
+        assert result['total'] == 6
+        assert [{k: v for k, v in item.items() if k not in ('rank', 'baseline_rank', 'rank_delta')}
+                for item in result['items']] == expected[:4]
+        for rank, item in enumerate(result['items'], start=1):
+            assert item['rank'] == rank
+            assert item['baseline_rank'] == baseline.index(item['Name']) + 1
+            assert item['rank_delta'] == item['baseline_rank'] - rank
+
+    projected = matrix.rescore({'Years PE': 1}, top_k=2, fields=['Name'])['items']
+    assert projected[0] == {'Name': 'D', 'score': 9.0, 'rank': 1, 'baseline_rank': 4, 'rank_delta': 3}
+    assert 'Missing' not in matrix.table._arrays
+
+
+def test_feature_matrix_is_cached_until_the_file_changes(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text(DATA, encoding='utf-8')
+    builds = []
+    real_from_csv = FeatureMatrix.from_csv
+    monkeypatch.setattr(FeatureMatrix, 'from_csv', lambda *args: builds.append(args) or real_from_csv(*args))
+
+    first = load_feature_matrix(str(csv_path))
+    assert load_feature_matrix(str(csv_path)) is first
+    csv_path.write_text(DATA + 'G,F1,99,0,u\n', encoding='utf-8')
+    assert load_feature_matrix(str(csv_path)).table.n_rows == 7
+    assert len(builds) == 2
+    rescore._matrices.clear()
+
+
+def test_feature_matrices_are_bounded(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text(DATA, encoding='utf-8')
+    monkeypatch.setattr(rescore, '_matrices', rescore.OrderedDict())
+    monkeypatch.setattr(rescore, 'MAX_MATRICES', 2)
+    configs = []
+    for i in range(3):
+        config = tmp_path / f'config{i}.json'
+        config.write_text(json.dumps({'Years PE': i + 1}), encoding='utf-8')
+        configs.append(str(config))
+        load_feature_matrix(str(csv_path), str(config))
+    # one matrix per config sent by clients, but only the most recent ones are kept
+    assert [slot[1] for slot in rescore._matrices] == configs[1:]
+    assert not rescore._building
+
+
+def test_api_rescore():
+    client = TestClient(app)
+    weights = {'Google News': 1.0, 'Years PE': 0.5}
+    resp = client.post('/api/rescore', json={'weights': weights, 'top_k': 5, 'fields': ['Name', 'Firm']})
+    assert resp.status_code == 200
+    result = resp.json()
+    assert len(result['items']) == 5
+    assert set(result['items'][0]) == {'Name', 'Firm', 'score', 'rank', 'baseline_rank', 'rank_delta'}
+    scores = [item['score'] for item in result['items']]
+    assert scores == sorted(scores, reverse=True)
+
+    assert client.post('/api/rescore', json={'weights': weights, 'fields': ['Nope']}).status_code == 400
+    assert client.post('/api/rescore', json={'weights': {'Years PE': 'lots'}}).status_code == 422
+    # non-finite weights are rejected up front; finite weights that overflow are rejected after scoring
+    for raw in ('{"weights": {"Years PE": NaN}}', '{"weights": {"Years PE": Infinity}}'):
+        assert client.post('/api/rescore', content=raw, headers={'Content-Type': 'application/json'}).status_code == 422
+    assert client.post('/api/rescore', json={'weights': {'Years PE': 1e308, 'Google News': 1e308}}).status_code == 400
+
+
+def test_api_rescore_honors_the_served_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'LAWYER_DB', str(tmp_path / 'lawyers.db'))
+    client = TestClient(app)
+    assert client.post('/api/rescore', json={'weights': {'Years PE': 1}}).status_code == 404
+    (tmp_path / 'lawyers.db').write_bytes(b'')
+    assert client.post('/api/rescore', json={'weights': {'Years PE': 1}}).status_code == 501
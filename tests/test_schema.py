@@ -0,0 +1,77 @@
+import json
+import os
+import pytest
+import schema
+from ranker import rank_lawyers, score_lawyer, score_rows
+from schema import infer_column, load_schema, save_schema, schema_path
+
+STRAY = (
+    'Name,Firm,Law360 News,Years PE,Notes\n'
+    'A,F1,n/a,3,x\n'
+    'B,F2,12,,y\n'
+    'C,F1,7,5,1\n'
+    'D,F3,9,1,z\n'
+    'E,F2,4,,w\n'
+)
+
+
+def test_stray_cell_does_not_flip_column_type():
+    assert infer_column(['n/a', '12', '7', '9', '4'])['type'] == 'numeric'
+    assert infer_column(['1', 'x', 'y', 'z'])['type'] == 'text'
+    assert infer_column(['', None])['type'] == 'empty'
+    info = infer_column(['3', '', '5', '1', ''])
+    assert info == {'type': 'numeric', 'null_rate': 0.4, 'numeric_rate': 1.0}
+
+
+def test_schema_is_persisted_and_keyed_on_fingerprint(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text(STRAY, encoding='utf-8')
+
+    inferred = load_schema(str(csv_path))
+    assert inferred['Law360 News']['type'] == 'numeric'
+    assert inferred['Notes']['type'] == 'text'
+    # loading never writes; only save_schema persists the sidecar
+    assert not os.path.exists(schema_path(str(csv_path)))
+    assert save_schema(str(csv_path)) and not save_schema(str(csv_path))
+    with open(schema_path(str(csv_path)), encoding='utf-8') as f:
+        assert json.load(f)['columns'] == inferred
+
+    # a fresh process reuses the file; nothing is sampled again
+    schema._memo.clear()
+    monkeypatch.setattr(schema, 'sample_columns', lambda path: pytest.fail('schema was re-inferred'))
+    assert load_schema(str(csv_path)) == inferred
+    monkeypatch.undo()
+
+    # changing the file invalidates it
+    csv_path.write_text(STRAY.replace('n/a', 'none').replace(',12,', ',ab,').replace(',7,', ',cd,'), encoding='utf-8')
+    os.utime(csv_path, ns=(1, 1))
+    assert load_schema(str(csv_path))['Law360 News']['type'] == 'text'
+
+
+def test_engines_agree_on_inferred_schema(tmp_path):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text(STRAY, encoding='utf-8')
+
+    expected = rank_lawyers(str(csv_path), write_output=False)
+    # 'n/a' no longer hides Law360 News from autodetection
+    assert [r['Name'] for r in expected[:2]] == ['B', 'C']
+    assert expected[0]['score'] == 12.0
+    for engine in ('stream', 'incremental'):
+        assert rank_lawyers(str(csv_path), engine=engine, write_output=False) == expected
+
+
+def test_columnar_engines_agree_on_inferred_schema(tmp_path):
+    pytest.importorskip('numpy')
+    from snapshot import csv_to_snapshot
+
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text(STRAY, encoding='utf-8')
+    expected = rank_lawyers(str(csv_path), write_output=False)
+    assert rank_lawyers(str(csv_path), engine='numpy', write_output=False) == expected
+    assert rank_lawyers(csv_to_snapshot(str(csv_path)), write_output=False) == expected
+
+
+def test_score_rows_matches_score_lawyer():
+    rows = [{'a': '1.5', 'b': 'x'}, {'a': '', 'b': '2'}, {'b': None}, {'a': '1e3', 'b': '-0.5'}]
+    pairs = [('b', -2.0), ('a', 0.3), ('missing', 1.0)]
+    assert score_rows(rows, pairs) == [score_lawyer(r, pairs) for r in rows]
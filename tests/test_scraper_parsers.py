@@ -0,0 +1,66 @@
+import os
+import pytest
+from scraper import PARSERS, parse_listing
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CARDS_HTML = """
+<html><body>
+    <div class="jld-card -organic">
+        <strong class="name"><a href="#">Lawyer &amp; One</a></strong>
+        <div class="rating"><span>San Diego, CA Attorney</span></div>
+        <div class="outline">Criminal <b>Law</b></div>
+        <div data-nosnippet="true">This is a short description.</div>
+    </div>
+    <div class="jld-card">
+        <strong class="name">No link</strong>
+        <div class="rating"><span>Somewhere</span></div>
+        <div class="description"> Described </div>
+        <div data-nosnippet="true">ignored because .description wins</div>
+    </div>
+    <div id="pagination" class="pagination"><span class="next"><a href="?page=2">Next</a></span></div>
+</body></html>
+"""
+
+
+def read_fixture(name):
+    with open(os.path.join(REPO_ROOT, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('parser', sorted(PARSERS))
+@pytest.mark.parametrize('fixture', ['justia.html', 'justia_california.html'])
+def test_backends_match_reference_on_fixtures(parser, fixture):
+    html = read_fixture(fixture)
+    assert parse_listing(html, parser) == parse_listing(html, 'html.parser')
+
+
+@pytest.mark.parametrize('parser', sorted(PARSERS))
+def test_backends_handle_edge_cases(parser):
+    records, next_href = parse_listing(CARDS_HTML, parser)
+    assert next_href == '?page=2'
+    assert records == [
+        {'name': 'Lawyer & One', 'location': 'San Diego, CA', 'practice_areas': 'Criminal Law',
+         'description_length': len('This is a short description.')},
+        {'name': 'N/A', 'location': 'N/A', 'practice_areas': 'N/A', 'description_length': len('Described')},
+    ]
+    assert parse_listing('', parser) == ([], None)
+
+
+@pytest.mark.parametrize('parser', sorted(PARSERS))
+def test_backends_ignore_script_and_style_text(parser):
+    html = """
+    <div class="jld-card">
+        <strong class="name"><a href="#">X<script>var x=1</script></a></strong>
+        <div class="rating"><span>Austin, TX <style>.a{}</style>Attorney</span></div>
+        <div class="description">Short<script>track()</script> bio</div>
+    </div>
+    """
+    assert parse_listing(html, parser) == parse_listing(html, 'html.parser') == ([
+        {'name': 'X', 'location': 'Austin, TX', 'practice_areas': 'N/A', 'description_length': len('Short bio')},
+    ], None)
+
+
+def test_unknown_parser_is_rejected():
+    with pytest.raises(ValueError):
+        parse_listing('<html></html>', 'no-such-parser')
@@ -0,0 +1,78 @@
+import csv
+import json
+import pytest
+from fastapi.testclient import TestClient
+from ranker import rank_lawyers, rank_page
+
+np = pytest.importorskip('numpy')
+from snapshot import Snapshot, csv_to_snapshot, snapshot_to_csv  # noqa: E402
+from server import app  # noqa: E402
+
+MESSY = (
+    'Name, Metric1 ,,Metric2,Firm,Score\n'
+    'A,10,x,0.1,F1,12.0\n'
+    'B,,y,n/a,F2,3.5\n'
+    '"C, Esq.",5,,2.5,"F1\nLLP",-1.0\n'
+    '\n'
+    'D,10,z,0.1\n'
+    'E,abc,,1e1,F3,007\n'
+    'F,7\n'
+)
+
+
+def read_rows(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_snapshot_ranks_like_csv_and_round_trips(tmp_path):
+    csv_path = tmp_path / 'messy.csv'
+    csv_path.write_text(MESSY, encoding='utf-8')
+    cfg_path = tmp_path / 'cfg.json'
+    cfg_path.write_text(json.dumps({'Metric1': 0.3, 'Metric2': -1.7, 'Missing': 4}), encoding='utf-8')
+
+    snap_path = csv_to_snapshot(str(csv_path))
+    assert snap_path.endswith('.lrsnap')
+    with Snapshot.open(snap_path) as snap:
+        assert snap.meta['Metric1']['type'] == 'dict'   # 'abc' keeps it textual
+        assert snap.meta['Firm']['type'] == 'dict'
+        assert snap.n_rows == 6
+
+    for cfg in (None, str(cfg_path)):
+        expected = rank_lawyers(str(csv_path), cfg, write_output=False)
+        assert rank_lawyers(snap_path, cfg, write_output=False) == expected
+        assert rank_page(snap_path, cfg, offset=1, limit=2) == rank_page(str(csv_path), cfg, offset=1, limit=2)
+
+    back = snapshot_to_csv(snap_path, str(tmp_path / 'back.csv'))
+    original = [row for row in read_rows(csv_path) if row]
+    restored = read_rows(back)
+    # header loses the empty column name; short rows come back padded with blanks
+    assert restored[0] == ['Name', 'Metric1', 'Metric2', 'Firm', 'Score']
+    assert [r[0] for r in restored[1:]] == [r[0] for r in original[1:]]
+    assert restored[3] == ['C, Esq.', '5', '2.5', 'F1\nLLP', '-1.0']
+
+
+def test_typed_columns_restore_exact_text(tmp_path):
+    csv_path = tmp_path / 'typed.csv'
+    csv_path.write_text('Name,Years PE,Ratio,score\nA,12,0.5,61.0\nB,,3,7.25\nC,4,1e-07,0.0\n', encoding='utf-8')
+    with Snapshot.open(csv_to_snapshot(str(csv_path))) as snap:
+        assert snap.meta['Years PE']['type'] == 'int32'
+        assert snap.meta['Ratio']['type'] == 'float64'
+        assert snap.meta['score'] == {**snap.meta['score'], 'type': 'float64', 'text': 'repr'}
+        assert snap.cells('Years PE') == ['12', '', '4']
+        assert snap.cells('Ratio') == ['0.5', '3', '1e-07']
+        assert snap.cells('score') == ['61.0', '7.25', '0.0']
+        assert snap.column_array('Years PE').tolist() == [12.0, 0.0, 4.0]
+
+
+def test_snapshot_endpoint_serves_ranked_snapshot():
+    client = TestClient(app)
+    ranked = client.get('/api/ranked').json()
+
+    resp = client.get('/api/snapshot')
+    assert resp.status_code == 200
+    assert resp.headers['content-type'] == 'application/octet-stream'
+    snap = Snapshot.from_bytes(resp.content)
+    assert snap.meta['score']['type'] == 'float64'
+    assert snap.rows(np.arange(snap.n_rows)) == ranked
+    assert client.get('/api/snapshot').headers['x-cache'] == 'HIT'
@@ -0,0 +1,68 @@
+import csv
+import os
+import stream_ranker
+from ranker import rank_lawyers, rank_page, write_ranked_csv, output_fieldnames
+from stream_ranker import rank_file_stream, write_stream_ranking
+
+
+MESSY_CSV = (
+    'Name, Metric1 ,,Metric2,Firm\n'
+    'A,10,x,0.1,F1\n'
+    'B,,y,n/a,F2\n'
+    'C,5,,2.5,F1\n'
+    '\n'
+    'D,10,z,0.1\n'
+    'E,abc,,1e1,F3\n'
+    'F,7\n'
+)
+
+
+def write_rows(path, n):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Name', 'Firm', 'Metric'])
+        for i in range(n):
+            writer.writerow([f'Lawyer {i}', f'Firm {i % 3}', (i * 37) % 11])
+
+
+def test_stream_engine_matches_python_engine(tmp_path):
+    csv_path = tmp_path / 'messy.csv'
+    csv_path.write_text(MESSY_CSV, encoding='utf-8')
+    cfg_path = tmp_path / 'cfg.json'
+    cfg_path.write_text('{"Metric1": 0.3, "Metric2": -1.7}', encoding='utf-8')
+
+    for cfg in (None, str(cfg_path)):
+        expected = rank_lawyers(str(csv_path), cfg, write_output=False)
+        assert rank_lawyers(str(csv_path), cfg, engine='stream', write_output=False) == expected
+        page = rank_page(str(csv_path), cfg, engine='stream', top_k=3)
+        assert page['items'] == expected[:3]
+        assert page['total'] == len(expected)
+
+
+def test_spilled_runs_merge_in_rank_order_and_are_cleaned_up(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'many.csv'
+    write_rows(csv_path, 500)
+    runs_dir = tmp_path / 'runs'
+    runs_dir.mkdir()
+    # force several runs and more than one merge pass
+    monkeypatch.setattr(stream_ranker, 'MAX_MERGE_FAN_IN', 3)
+
+    expected = rank_lawyers(str(csv_path), write_output=False)
+    page, _ = rank_file_stream(str(csv_path), run_size=40, tmp_dir=str(runs_dir))
+    assert page['items'] == expected
+    assert os.listdir(runs_dir) == []
+
+
+def test_write_stream_ranking_matches_in_memory_csv(tmp_path):
+    csv_path = tmp_path / 'many.csv'
+    write_rows(csv_path, 300)
+    expected_path = tmp_path / 'expected.csv'
+    streamed_path = tmp_path / 'streamed.csv'
+
+    expected = rank_lawyers(str(csv_path), write_output=False)
+    write_ranked_csv(str(expected_path), output_fieldnames(['Name', 'Firm', 'Metric'], expected), expected)
+    written = write_stream_ranking(str(csv_path), output_file=str(streamed_path), run_size=64,
+                                   tmp_dir=str(tmp_path))
+
+    assert written == 300
+    assert streamed_path.read_bytes() == expected_path.read_bytes()
@@ -0,0 +1,49 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from delivery import iter_json_array, iter_ndjson
+from ranker import rank_lawyers
+from server import app
+from stream_ranker import iter_ranked
+
+DATA = 'Name,Firm,Years PE,Law360 News\n' + ''.join(f'L{i},F{i % 3},{(i * 7) % 11},{i % 4}\n' for i in range(57))
+
+
+def test_iter_ranked_matches_rank_lawyers(tmp_path):
+    csv_path = tmp_path / 'data.csv'
+    csv_path.write_text(DATA, encoding='utf-8')
+    expected = rank_lawyers(str(csv_path), write_output=False)
+
+    # small runs force the external merge
+    assert list(iter_ranked(str(csv_path), run_size=10, tmp_dir=str(tmp_path))) == expected
+    assert list(iter_ranked(str(csv_path), offset=5, run_size=10, tmp_dir=str(tmp_path))) == expected[5:]
+    assert list(iter_ranked(str(csv_path), top_k=20, offset=3, limit=10)) == expected[3:13]
+    assert not list(tmp_path.glob('rankrun-*'))
+
+
+@pytest.mark.parametrize('batch_rows', [1, 4, 1000])
+def test_stream_encoders(batch_rows):
+    rows = [{'Name': f'L{i}', 'Firm': 'Ünïcode & Co', 'score': i / 3} for i in range(10)]
+    array = b''.join(iter_json_array(iter(rows), batch_rows=batch_rows))
+    assert json.loads(array) == rows
+    assert json.loads(b''.join(iter_json_array(iter([]), batch_rows=batch_rows))) == []
+
+    lines = b''.join(iter_ndjson(iter(rows), ['Name'], batch_rows=batch_rows)).splitlines()
+    assert [json.loads(line) for line in lines] == [{'Name': r['Name']} for r in rows]
+
+
+def test_api_streaming_modes():
+    client = TestClient(app)
+    ranked = client.get('/api/ranked').json()
+
+    resp = client.get('/api/ranked', params={'format': 'ndjson'})
+    assert resp.status_code == 200
+    assert resp.headers['content-type'].startswith('application/x-ndjson')
+    assert [json.loads(line) for line in resp.text.splitlines()] == ranked
+
+    resp = client.get('/api/ranked', params={'stream': 'true', 'fields': 'Name,score', 'offset': 2, 'limit': 5})
+    assert resp.json() == [{'Name': r['Name'], 'score': r['score']} for r in ranked[2:7]]
+
+    assert client.get('/api/ranked', params={'format': 'ndjson', 'sort_by': 'Name'}).status_code == 400
+    assert client.get('/api/ranked', params={'format': 'ndjson', 'fields': 'Nope'}).status_code == 400
+    assert client.get('/api/ranked', params={'format': 'xml'}).status_code == 422